@@ -0,0 +1,279 @@
+"""
+Benchmarks of the availability entry points (Availability.get_availability_slots, days_available and
+free_slot_availability) and of the engine underneath them (utils.common.availability_engine, the weekly
+templates and, when numpy is installed, the numpy kernel) on synthetic schedules.
+
+Everything runs in memory: schedules are generated from a seed and fed in as plain rows, so no database
+or network is needed. Django settings are configured with their defaults when nothing else did. Run from src/:
+
+    python -m benchmarks.availability --output baseline.json
+    python -m benchmarks.availability --baseline baseline.json --tolerance 0.25
+
+The second form exits with status 1 when a benchmark's median is more than tolerance slower than the baseline.
+"""
+import argparse
+import json
+import platform
+import random
+import statistics
+import sys
+import timeit
+from dataclasses import dataclass, field
+from datetime import date, datetime, time, timedelta
+from enum import Enum
+from types import ModuleType, SimpleNamespace
+from typing import Dict, List, Tuple
+from unittest.mock import patch
+from zoneinfo import ZoneInfo
+
+WEEKDAYS = ["MONDAY", "TUESDAY", "WEDNESDAY", "THURSDAY", "FRIDAY", "SATURDAY", "SUNDAY"]
+
+SIZES = {
+    "small": dict(courts=2, days=7),
+    "medium": dict(courts=10, days=31),
+    "large": dict(courts=25, days=365),
+}
+
+# (pattern, share of the open minutes that is booked)
+SCENARIOS = [
+    ("contiguous", 0.3),
+    ("contiguous", 0.8),
+    ("fragmented", 0.3),
+    ("fragmented", 0.8),
+]
+
+# The range starts a week before the European spring DST change and, at the large size, crosses the autumn one
+START_DATE = date(2024, 3, 24)
+TIMEZONE = "Europe/London"
+
+
+@dataclass
+class Schedule:
+    dates: List[date]
+    timezone: str
+    # Availability rows as days_available reads them: day, date, opening_time, closing_time
+    availability: List[SimpleNamespace]
+    # (start_time, end_time) aware datetimes of every court
+    bookings: Dict[int, List[Tuple[datetime, datetime]]] = field(default_factory=dict)
+
+    def windows(self, day: date) -> List[Tuple[time, time]]:
+        weekday = WEEKDAYS[day.weekday()]
+        return [(row.opening_time, row.closing_time) for row in self.availability if row.day == weekday]
+
+
+def _minute(value: int) -> time:
+    return time(value // 60, value % 60)
+
+
+def weekday_availability(rng: random.Random) -> List[SimpleNamespace]:
+    """One to three opening windows per weekday between 06:00 and 23:00."""
+    rows = []
+    for weekday in WEEKDAYS:
+        count = rng.randint(1, 3)
+        edges = sorted(rng.sample(range(6 * 60, 23 * 60, 30), count * 2))
+        for opening, closing in zip(edges[::2], edges[1::2]):
+            rows.append(SimpleNamespace(day=weekday, date=None,
+                                        opening_time=_minute(opening), closing_time=_minute(closing)))
+    return rows
+
+
+def day_bookings(rng: random.Random, windows: List[Tuple[time, time]], pattern: str,
+                 density: float) -> List[Tuple[int, int]]:
+    """
+    Bookings of one day as minute intervals.
+    Contiguous days book back to back blocks from the start of each window, fragmented days scatter
+    30 minute bookings across the window.
+    """
+    bookings = []
+    for opening, closing in windows:
+        start = opening.hour * 60 + opening.minute
+        end = closing.hour * 60 + closing.minute
+        budget = int((end - start) * density)
+        if pattern == "contiguous":
+            while budget > 0:
+                length = min(rng.choice([60, 90, 120]), budget, end - start)
+                bookings.append((start, start + length))
+                start += length
+                budget -= length
+        else:
+            slots = list(range(start, end - 29, 30))
+            for slot in sorted(rng.sample(slots, min(len(slots), budget // 30))):
+                bookings.append((slot, slot + 30))
+    return bookings
+
+
+def synthetic_schedule(seed: int, courts: int, days: int, pattern: str, density: float) -> Schedule:
+    rng = random.Random(seed)
+    tz = ZoneInfo(TIMEZONE)
+    dates = [START_DATE + timedelta(days=i) for i in range(days)]
+    schedule = Schedule(dates=dates, timezone=TIMEZONE, availability=weekday_availability(rng))
+    for court in range(courts):
+        schedule.bookings[court] = [
+            (datetime.combine(day, _minute(start), tz), datetime.combine(day, _minute(end), tz))
+            for day in dates
+            for start, end in day_bookings(rng, schedule.windows(day), pattern, density)
+        ]
+    return schedule
+
+
+def import_availability():
+    """
+    Professional calendars and availability enums live outside this project. The benchmarked paths never
+    touch them, so stand-ins are enough to import Availability.
+    """
+    try:
+        from utils.common.availability_slots import Availability
+        return Availability
+    except ImportError:
+        pass
+    stubs = {
+        "user": ModuleType("user"),
+        "user.models": ModuleType("user.models"),
+        "utils.enums": ModuleType("utils.enums"),
+    }
+    stubs["user.models"].ProfessionalProfile = None
+    stubs["utils.enums"].CalendarStatusChoices = Enum("CalendarStatusChoices", "SCHEDULED")
+    stubs["utils.enums"].AvailabilityTimeFrameChoices = Enum("AvailabilityTimeFrameChoices", "WEEK MONTH")
+    with patch.dict(sys.modules, stubs):
+        sys.modules.pop("utils.common.availability_slots", None)
+        from utils.common.availability_slots import Availability
+    return Availability
+
+
+def _timings(func, repeat: int) -> dict:
+    runs = timeit.repeat(func, number=1, repeat=repeat)
+    return dict(median_ms=round(statistics.median(runs) * 1000, 3), min_ms=round(min(runs) * 1000, 3))
+
+
+def run_benchmarks(sizes: List[str], repeat: int = 5, seed: int = 0) -> dict:
+    """
+    Time get_availability_slots, days_available and free_slot_availability, then the per-day sweep, the range
+    sweep over a compiled template and the numpy kernel, on every (size, scenario) pair.
+    """
+    from django.conf import settings
+    if not settings.configured:
+        settings.configure()
+
+    from utils.common import availability_kernel as kernel
+    from utils.common.availability_engine import free_intervals, split_by_day, to_intervals
+    from utils.common.availability_template import AvailabilityTemplate
+    Availability = import_availability()
+
+    results = {}
+    for size in sizes:
+        for pattern, density in SCENARIOS:
+            schedule = synthetic_schedule(seed, pattern=pattern, density=density, **SIZES[size])
+            name = f"{size}/{pattern}-{density}"
+            rows = [(row.day, row.date, row.opening_time, row.closing_time) for row in schedule.availability]
+
+            court_days = []
+            for bookings in schedule.bookings.values():
+                by_day = {}
+                for start_time, end_time in bookings:
+                    by_day.setdefault(start_time.date(), []).append((start_time.time(), end_time.time()))
+                court_days.extend((day, schedule.windows(day), by_day.get(day, [])) for day in schedule.dates)
+
+            # Inputs of free_slot_availability: the gaps between bookings and the opening windows of each court day
+            free_slots = []
+            for day, windows, booked in court_days:
+                start_of_day = datetime.combine(day, time.min)
+                end_of_day = datetime.combine(day, time(23, 59, 59))
+                _, free = Availability.booking_free_period(sorted(to_intervals(booked)), [], start_of_day, end_of_day)
+                free_slots.append((free, to_intervals(windows), SimpleNamespace(date=day)))
+
+            def get_availability_slots():
+                for day, windows, booked in court_days:
+                    Availability.get_availability_slots(day, booked, windows, schedule.timezone, 10)
+
+            def days_available():
+                for bookings in schedule.bookings.values():
+                    Availability.days_available(schedule.dates, bookings, schedule.availability, schedule.timezone,
+                                                10, bulk=True)
+
+            def free_slot_availability():
+                for free, windows, bounds in free_slots:
+                    Availability.free_slot_availability(free, windows, bounds, lambda: 10)
+
+            def day_sweep():
+                for _, windows, booked in court_days:
+                    free_intervals(to_intervals(windows), to_intervals(booked), 10)
+
+            def court_bookings(bookings):
+                by_day = {}
+                for start_time, end_time in bookings:
+                    for day, start_minute, end_minute in split_by_day(start_time, end_time):
+                        by_day.setdefault(day, []).append((start_minute, end_minute))
+                return [by_day.get(day, []) for day in schedule.dates]
+
+            def range_sweep():
+                windows = AvailabilityTemplate.from_rows(rows).expand(schedule.dates)
+                for bookings in schedule.bookings.values():
+                    for day_windows, day_bookings in zip(windows, court_bookings(bookings)):
+                        free_intervals(day_windows, day_bookings, 10)
+
+            def numpy_kernel():
+                windows = AvailabilityTemplate.from_rows(rows).expand(schedule.dates)
+                for bookings in schedule.bookings.values():
+                    kernel.free_intervals_by_day(windows, court_bookings(bookings), 10)
+
+            benchmarks = [
+                ("get_availability_slots", get_availability_slots),
+                ("days_available", days_available),
+                ("free_slot_availability", free_slot_availability),
+                ("day_sweep", day_sweep),
+                ("range_sweep", range_sweep),
+            ]
+            if kernel.np is not None:
+                benchmarks.append(("numpy_kernel", numpy_kernel))
+            for label, func in benchmarks:
+                results[f"{label}/{name}"] = dict(_timings(func, repeat), court_days=len(court_days))
+    return results
+
+
+def compare(results: dict, baseline: dict, tolerance: float) -> List[str]:
+    """Benchmarks whose median is more than tolerance slower than the baseline."""
+    regressions = []
+    for name, timing in results.items():
+        if name not in baseline:
+            continue
+        ratio = timing["median_ms"] / baseline[name]["median_ms"] if baseline[name]["median_ms"] else 1
+        if ratio > 1 + tolerance:
+            regressions.append(f"{name}: {baseline[name]['median_ms']}ms -> {timing['median_ms']}ms ({ratio:.2f}x)")
+    return regressions
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Benchmark the availability engine on synthetic schedules")
+    parser.add_argument("--sizes", nargs="+", choices=SIZES, default=["small", "medium"],
+                        help="Schedule sizes to run")
+    parser.add_argument("--repeat", type=int, default=5, help="Runs per benchmark, the median is reported")
+    parser.add_argument("--seed", type=int, default=0, help="Seed of the synthetic schedules")
+    parser.add_argument("--output", help="Write the results as JSON to this file")
+    parser.add_argument("--baseline", help="JSON results to compare with")
+    parser.add_argument("--tolerance", type=float, default=0.25,
+                        help="Allowed slowdown against the baseline, 0.25 is 25%%")
+    args = parser.parse_args(argv)
+
+    results = run_benchmarks(args.sizes, args.repeat, args.seed)
+    report = dict(
+        meta=dict(python=platform.python_version(), machine=platform.machine(), seed=args.seed, repeat=args.repeat),
+        results=results,
+    )
+    for name, timing in results.items():
+        print(f"{name:<55} {timing['median_ms']:>10.3f}ms  ({timing['court_days']} court days)")
+
+    if args.output:
+        with open(args.output, "w") as output:
+            json.dump(report, output, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as baseline:
+            regressions = compare(results, json.load(baseline)["results"], args.tolerance)
+        for regression in regressions:
+            print(f"REGRESSION {regression}", file=sys.stderr)
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
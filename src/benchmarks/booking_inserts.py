@@ -0,0 +1,129 @@
+"""
+Insert latency of bookings against the overlap exclusion constraint as the bookings table grows.
+
+Needs the configured PostgreSQL database. The benchmark creates its own account and courts and deletes them
+with their bookings at the end. It does not run in one long transaction: every savepoint of a rejected insert
+would be a subtransaction of it, and past 64 of those PostgreSQL visibility checks slow down with the table size,
+which is not what production inserts see. Run from src/:
+
+    python -m benchmarks.booking_inserts --total 1000000
+
+At every checkpoint the table is filled up to that many bookings with one INSERT ... SELECT, then --samples
+bookings are inserted one at a time through Booking.save and as many conflicting ones are rejected.
+The median and p95 of both should stay flat from the first checkpoint to the last.
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import time
+from datetime import datetime, timedelta, timezone
+
+
+def _percentiles(samples) -> dict:
+    samples = sorted(samples)
+    return dict(median_ms=round(statistics.median(samples) * 1000, 3),
+                p95_ms=round(samples[int(len(samples) * 0.95) - 1] * 1000, 3))
+
+
+def fill(cursor, court_ids, account_id, start, count, base) -> None:
+    """Insert bookings start..count-1 as back to back one hour bookings spread round robin over the courts."""
+    cursor.execute(
+        """
+        INSERT INTO bookings_booking (booking_id, court_id, account_id, start_time, end_time, duration, created_at)
+        SELECT gen_random_uuid(),
+               (%(courts)s::bigint[])[n %% %(court_count)s + 1],
+               %(account)s,
+               %(base)s + (n / %(court_count)s) * interval '1 hour',
+               %(base)s + (n / %(court_count)s + 1) * interval '1 hour',
+               1,
+               now()
+        FROM generate_series(%(start)s, %(stop)s) AS n
+        """,
+        dict(courts=court_ids, court_count=len(court_ids), account=account_id, base=base,
+             start=start, stop=count - 1),
+    )
+    cursor.execute("ANALYZE bookings_booking")
+
+
+def run(total: int, checkpoints, courts: int, samples: int) -> dict:
+    from django.contrib.auth import get_user_model
+    from django.db import connection
+
+    from accounts.models import Account
+    from bookings.models import Booking, SlotNotAvailable
+    from courts.models import Court
+
+    base = datetime(2100, 1, 1, tzinfo=timezone.utc)
+    results = {}
+    user = get_user_model().objects.create_user(email="benchmark@example.com", password="benchmark")
+    account = Account.objects.create(user=user, first_name="bench", last_name="mark")
+    court_list = [Court.objects.create(name=f"Benchmark court {i}", location="Benchmark",
+                                       open=datetime.min.time(), close=datetime.max.time())
+                  for i in range(courts)]
+    court_ids = [court.id for court in court_list]
+    try:
+        filled = 0
+        with connection.cursor() as cursor:
+            for checkpoint in sorted({c for c in checkpoints if c <= total}):
+                fill(cursor, court_ids, account.id, filled, checkpoint, base)
+                filled = checkpoint
+
+                # Timed bookings go a year before the filled range per checkpoint so later fills never hit them
+                free_from = base - timedelta(days=365 * (len(results) + 1))
+                inserts, conflicts = [], []
+                for i in range(samples):
+                    court = court_list[i % courts]
+                    start_time = free_from + timedelta(hours=i // courts)
+                    booking = Booking(court=court, account=account, start_time=start_time,
+                                      end_time=start_time + timedelta(hours=1), duration=1)
+                    started = time.perf_counter()
+                    booking.save()
+                    inserts.append(time.perf_counter() - started)
+
+                    clash = Booking(court=court, account=account, start_time=start_time + timedelta(minutes=30),
+                                    end_time=start_time + timedelta(minutes=90), duration=1)
+                    started = time.perf_counter()
+                    try:
+                        clash.save()
+                    except SlotNotAvailable:
+                        conflicts.append(time.perf_counter() - started)
+                    else:
+                        raise AssertionError("Overlapping booking was inserted")
+
+                results[checkpoint] = dict(insert=_percentiles(inserts), conflict=_percentiles(conflicts))
+                print(f"{checkpoint:>10} bookings  insert {results[checkpoint]['insert']}  "
+                      f"conflict {results[checkpoint]['conflict']}")
+    finally:
+        # Raw delete, cascading through the ORM would send a cancellation for every booking
+        with connection.cursor() as cursor:
+            cursor.execute("DELETE FROM bookings_booking WHERE court_id = ANY(%s)", [court_ids])
+        Court.objects.filter(id__in=court_ids).delete()
+        user.delete()
+    return results
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Benchmark booking inserts against the overlap constraint")
+    parser.add_argument("--total", type=int, default=1_000_000, help="Bookings in the table at the last checkpoint")
+    parser.add_argument("--checkpoints", type=int, nargs="+", default=[10_000, 100_000, 1_000_000],
+                        help="Table sizes to measure at, larger than --total are skipped")
+    parser.add_argument("--courts", type=int, default=50, help="Courts the bookings are spread over")
+    parser.add_argument("--samples", type=int, default=200, help="Timed inserts per checkpoint")
+    parser.add_argument("--output", help="Write the results as JSON to this file")
+    args = parser.parse_args(argv)
+
+    os.environ.setdefault("DJANGO_SETTINGS_MODULE", "tennis.settings")
+    import django
+    django.setup()
+
+    results = run(args.total, args.checkpoints + [args.total], args.courts, args.samples)
+    if args.output:
+        with open(args.output, "w") as output:
+            json.dump(results, output, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,118 @@
+"""
+Load test of the bookings WebSocket consumers: the sync BookingsConsumer against AsyncBookingsConsumer.
+
+Both consumers are driven in process through channels' WebsocketCommunicator, so the numbers compare
+the consumers and not a network stack. Needs the configured database and channel layer (or --in-memory-layer).
+The benchmark creates its own account and court and deletes them at the end. Run from src/:
+
+    python -m benchmarks.websocket_load --connections 200 --messages 20
+
+For each consumer, --connections sockets connect at once, then every socket sends --messages requests one after
+the other, cycling through sub, unsub and a cancel of an unknown booking (a database read answered with an error).
+Reported are connections per second and the median and p99 time from sending a message to its response.
+"""
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import sys
+import time
+import uuid
+from datetime import time as day_time
+
+
+def _percentiles(samples) -> dict:
+    samples = sorted(samples)
+    return dict(median_ms=round(statistics.median(samples) * 1000, 3),
+                p99_ms=round(samples[max(int(len(samples) * 0.99) - 1, 0)] * 1000, 3))
+
+
+def messages(court_id: str, count: int):
+    cycle = [{"type": "sub", "court_id": court_id},
+             {"type": "unsub", "court_id": court_id},
+             {"type": "cancel", "booking_id": str(uuid.uuid4())}]
+    return [cycle[i % len(cycle)] for i in range(count)]
+
+
+async def drive(consumer_class, user, court_id: str, connections: int, count: int) -> dict:
+    from channels.testing import WebsocketCommunicator
+
+    application = consumer_class.as_asgi()
+
+    async def authenticated(scope, receive, send):
+        return await application(dict(scope, user=user), receive, send)
+
+    communicators = [WebsocketCommunicator(authenticated, "/ws/bookings") for _ in range(connections)]
+    started = time.perf_counter()
+    results = await asyncio.gather(*(communicator.connect(timeout=60) for communicator in communicators))
+    connect_seconds = time.perf_counter() - started
+    if not all(connected for connected, _ in results):
+        raise RuntimeError("Not every socket connected")
+
+    latencies = []
+
+    async def session(communicator):
+        for content in messages(court_id, count):
+            sent = time.perf_counter()
+            await communicator.send_json_to(content)
+            await communicator.receive_json_from(timeout=60)
+            latencies.append(time.perf_counter() - sent)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(session(communicator) for communicator in communicators))
+    message_seconds = time.perf_counter() - started
+
+    await asyncio.gather(*(communicator.disconnect() for communicator in communicators))
+    return dict(connections_per_second=round(connections / connect_seconds, 1),
+                messages_per_second=round(len(latencies) / message_seconds, 1),
+                latency=_percentiles(latencies))
+
+
+def run(connections: int, count: int) -> dict:
+    from django.contrib.auth import get_user_model
+
+    from accounts.models import Account
+    from bookings.consumers import AsyncBookingsConsumer, BookingsConsumer
+    from courts.models import Court
+
+    user = get_user_model().objects.create_user(email="websocket-benchmark@example.com", password="benchmark")
+    Account.objects.create(user=user, first_name="bench", last_name="mark")
+    court = Court.objects.create(name="Benchmark court", location="Benchmark",
+                                 open=day_time(8), close=day_time(20))
+    try:
+        results = {}
+        for name, consumer_class in [("sync", BookingsConsumer), ("async", AsyncBookingsConsumer)]:
+            results[name] = asyncio.run(drive(consumer_class, user, str(court.court_id), connections, count))
+            print(f"{name:>6}  {results[name]}")
+        return results
+    finally:
+        court.delete()
+        user.delete()
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Compare the sync and async bookings WebSocket consumers")
+    parser.add_argument("--connections", type=int, default=200, help="Sockets connected at the same time")
+    parser.add_argument("--messages", type=int, default=20, help="Requests sent by every socket")
+    parser.add_argument("--in-memory-layer", action="store_true",
+                        help="Use the in-memory channel layer instead of the configured one")
+    parser.add_argument("--output", help="Write the results as JSON to this file")
+    args = parser.parse_args(argv)
+
+    os.environ.setdefault("DJANGO_SETTINGS_MODULE", "tennis.settings")
+    import django
+    django.setup()
+    if args.in_memory_layer:
+        from django.conf import settings
+        settings.CHANNEL_LAYERS = {"default": {"BACKEND": "channels.layers.InMemoryChannelLayer"}}
+
+    results = run(args.connections, args.messages)
+    if args.output:
+        with open(args.output, "w") as output:
+            json.dump(results, output, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,7 +1,12 @@
 from django.contrib import admin
 
-from .models import Booking
+from .models import Booking, BookingSeries
 
 @admin.register(Booking)
 class BookingAdmin(admin.ModelAdmin):
     list_display = ["booking_id", "court", "start_time"]
+
+
+@admin.register(BookingSeries)
+class BookingSeriesAdmin(admin.ModelAdmin):
+    list_display = ["series_id", "court", "start_time", "occurrences"]
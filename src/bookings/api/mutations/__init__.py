@@ -1,5 +1,15 @@
 import graphene
 from .booking import *
+from .booking_series import *
+from .hold import *
 
 class Mutation(graphene.ObjectType):
-    create_booking = CreateBookingMutation.Field()
\ No newline at end of file
+    create_booking = CreateBookingMutation.Field()
+    create_bookings = CreateBookingsMutation.Field()
+    move_booking = MoveBookingMutation.Field()
+    create_booking_series = CreateBookingSeriesMutation.Field()
+    update_booking_series = UpdateBookingSeriesMutation.Field()
+    cancel_booking_series = CancelBookingSeriesMutation.Field()
+    hold_slot = HoldSlotMutation.Field()
+    confirm_hold = ConfirmHoldMutation.Field()
+    release_hold = ReleaseHoldMutation.Field()
@@ -1,56 +1,132 @@
 import graphene
-import datetime
-from django.utils import timezone
-from django.core.exceptions import ValidationError
-from django.db.models import Q
+from bisect import bisect_left, bisect_right
+from django.db import IntegrityError, transaction
+from django.core.exceptions import NON_FIELD_ERRORS, ObjectDoesNotExist, ValidationError
 from graphql_jwt.decorators import login_required
 
-from accounts.models import Account
-from bookings.models import Booking
+from bookings import holds
+from bookings.models import Booking, SlotNotAvailable
+from bookings.models.booking import is_overlap_error
+from bookings.services import BookingService
+from bookings.signals import bookings_created
 from courts.models import Court
 
 from bookings.api.schema import BookingType, CreateBookingInput
 
-from utils.common_mutations import Create
 from utils.common import ExceptionHandlers
-from utils.logging import logger
+from utils.query_response import QueryResponse
 
-class Base:
-    model = Booking
+# Most slots a single createBookings call may book
+MAX_BULK_BOOKINGS = 50
 
-    foreign_key_fields = [("account", Account),("court", Court)]
+class CreateBookingMutation(graphene.Mutation, QueryResponse):
 
     data = graphene.Field(BookingType)
 
-class CreateBookingMutation(Base, Create):
-
     class Arguments:
         payload = CreateBookingInput(required=True)
 
     @classmethod
     @login_required
     @ExceptionHandlers.mutation()
-    def mutate(cls, root, info, id=None, payload=None):
-        payload["account"] = info.context.user.account.id
-        court_id = payload["court"]
-        start_time = payload["start_time"]
-        start_time = start_time.replace(tzinfo=timezone.utc)
-        duration = payload["duration"]
-        end_time = start_time + datetime.timedelta(hours=duration)
-
-        court = Court.objects.get(id=court_id)
-
-        if start_time < timezone.now() or (start_time.time() <= court.open or end_time.time() >= court.close):
-            raise ValidationError("Invalid start time or duration")
-        
-        booked = court.bookings.filter(
-            (Q(start_time__lte=start_time)&Q(end_time__gt=start_time))
-            |(Q(start_time__lte=end_time)&Q(end_time__gt=end_time))
-        )
-        
-        if booked:
-            raise ValidationError("Slot not available")
-
-        payload["start_time"] = start_time
-        payload["end_time"] = end_time
-        return super().mutate(root, info, id, payload)
+    def mutate(cls, root, info, payload):
+        service = BookingService(info.context.user.account)
+        booking = service.book(payload["start_time"], payload["duration"], id=payload["court"])
+        return cls.success(data=booking, response_message="Booking created successfully")
+
+
+class MoveBookingMutation(graphene.Mutation, QueryResponse):
+
+    data = graphene.Field(BookingType)
+
+    class Arguments:
+        booking_id = graphene.UUID(required=True)
+        start_time = graphene.DateTime(required=True)
+        duration = graphene.Int(required=True)
+
+    @classmethod
+    @login_required
+    @ExceptionHandlers.mutation()
+    def mutate(cls, root, info, booking_id, start_time, duration):
+        service = BookingService(info.context.user.account)
+        booking = service.move(booking_id, start_time, duration)
+        return cls.success(data=booking, response_message="Booking moved successfully")
+
+
+def conflicting_slots(bookings):
+    """
+    Positions of the bookings that overlap another booking of the batch or a booking already in the
+    database, with one range query per court covering the batch's span on that court.
+    """
+    by_court = {}
+    for position, booking in enumerate(bookings):
+        by_court.setdefault(booking.court_id, []).append((booking.start_time, booking.end_time, position))
+
+    conflicts = set()
+    for court_id, slots in by_court.items():
+        slots.sort()
+        for (_, previous_end, previous), (start_time, _, position) in zip(slots, slots[1:]):
+            if start_time < previous_end:
+                conflicts.update((previous, position))
+
+        booked = Booking.objects.filter(court_id=court_id,
+                                        start_time__lt=max(end_time for _, end_time, _ in slots),
+                                        end_time__gt=slots[0][0]) \
+            .order_by("start_time").values_list("start_time", "end_time")
+        starts = [start_time for start_time, _ in booked]
+        ends = [end_time for _, end_time in booked]
+        for start_time, end_time, position in slots:
+            if bisect_right(ends, start_time) < bisect_left(starts, end_time):
+                conflicts.add(position)
+    return sorted(conflicts)
+
+
+class CreateBookingsMutation(graphene.Mutation, QueryResponse):
+
+    data = graphene.List(BookingType)
+
+    class Arguments:
+        payloads = graphene.List(graphene.NonNull(CreateBookingInput), required=True)
+
+    @classmethod
+    @login_required
+    @ExceptionHandlers.mutation()
+    def mutate(cls, root, info, payloads):
+        if not payloads or len(payloads) > MAX_BULK_BOOKINGS:
+            raise ValidationError(f"Book between 1 and {MAX_BULK_BOOKINGS} slots at a time")
+
+        account = info.context.user.account
+        courts = Court.objects.in_bulk({payload["court"] for payload in payloads})
+
+        bookings = []
+        for payload in payloads:
+            court = courts.get(payload["court"])
+            if court is None:
+                raise ObjectDoesNotExist()
+            start_time, end_time = BookingService.period(payload["start_time"], payload["duration"])
+            BookingService.validate(court, start_time, end_time)
+
+            bookings.append(Booking(court=court,
+                                    account=account,
+                                    start_time=start_time,
+                                    end_time=end_time,
+                                    duration=payload["duration"]))
+
+        conflicts = conflicting_slots(bookings)
+        held = holds.conflicts([(booking.court_id, booking.start_time, booking.end_time) for booking in bookings],
+                               account.id)
+        conflicts = sorted(set(conflicts) | set(held))
+        if conflicts:
+            raise ValidationError({NON_FIELD_ERRORS: [f"Slot {position + 1} not available" for position in conflicts]})
+
+        try:
+            with transaction.atomic():
+                Booking.objects.bulk_create(bookings)
+                bookings_created.send(sender=Booking, bookings=bookings)
+        except IntegrityError as e:
+            # Booked by someone else since the range queries
+            if is_overlap_error(e):
+                raise SlotNotAvailable() from e
+            raise
+
+        return cls.success(data=bookings, response_message="Bookings created successfully")
@@ -0,0 +1,108 @@
+import graphene
+from django.utils import timezone
+from django.core.exceptions import NON_FIELD_ERRORS, ValidationError
+from graphql_jwt.decorators import login_required
+
+from bookings import holds
+from bookings.models import BookingSeries
+from bookings.services import BookingService
+from courts.models import Court
+
+from bookings.api.schema import BookingSeriesOutput, CreateBookingSeriesInput, UpdateBookingSeriesInput
+
+from utils.common import ExceptionHandlers
+
+# Most occurrences a booking series may have
+MAX_SERIES_OCCURRENCES = 52
+
+
+def series_conflicts(series, occurrences):
+    """Positions of the occurrences taken by a booking or held by another account."""
+    held = holds.conflicts([(series.court_id, start_time, end_time) for start_time, end_time in occurrences],
+                           series.account_id)
+    return sorted(set(series.conflicts(occurrences)) | set(held))
+
+
+def conflict_error(occurrences, conflicts):
+    return ValidationError({NON_FIELD_ERRORS: [
+        f"Occurrence {position + 1} on {occurrences[position][0]:%Y-%m-%d %H:%M} not available"
+        for position in conflicts
+    ]})
+
+
+class CreateBookingSeriesMutation(graphene.Mutation, BookingSeriesOutput):
+
+    class Arguments:
+        payload = CreateBookingSeriesInput(required=True)
+
+    @classmethod
+    @login_required
+    @ExceptionHandlers.mutation()
+    def mutate(cls, root, info, payload):
+        if not 1 <= payload["occurrences"] <= MAX_SERIES_OCCURRENCES or payload["interval_weeks"] < 1:
+            raise ValidationError(f"A series has between 1 and {MAX_SERIES_OCCURRENCES} weekly occurrences")
+
+        court = Court.objects.get(id=payload["court"])
+        # Occurrences are whole weeks apart, so they all share the time of day of the first one
+        start_time, end_time = BookingService.period(payload["start_time"], payload["duration"])
+        BookingService.validate(court, start_time, end_time)
+
+        series = BookingSeries(court=court,
+                               account=info.context.user.account,
+                               start_time=start_time,
+                               duration=payload["duration"],
+                               occurrences=payload["occurrences"],
+                               interval_weeks=payload["interval_weeks"])
+        occurrences = series.expand()
+        conflicts = series_conflicts(series, occurrences)
+        # Skipping conflicts still books at least one occurrence
+        if conflicts and (not payload["skip_conflicts"] or len(conflicts) == len(occurrences)):
+            raise conflict_error(occurrences, conflicts)
+
+        series.book(skip=conflicts)
+        output = cls.success(data=series, response_message="Booking series created successfully")
+        output.conflicts = [occurrences[position][0] for position in conflicts]
+        return output
+
+
+class UpdateBookingSeriesMutation(graphene.Mutation, BookingSeriesOutput):
+
+    class Arguments:
+        id = graphene.Int(required=True)
+        payload = UpdateBookingSeriesInput(required=True)
+
+    @classmethod
+    @login_required
+    @ExceptionHandlers.mutation()
+    def mutate(cls, root, info, id, payload):
+        series = BookingSeries.objects.select_related("court").get(id=id, account=info.context.user.account)
+        start_time, _ = BookingService.period(payload["start_time"], payload["duration"])
+        duration = payload["duration"]
+        now = timezone.now()
+
+        shift = start_time - series.start_time
+        occurrences = [BookingService.period(old_start + shift, duration)
+                       for old_start in series.upcoming(now).order_by("start_time")
+                                              .values_list("start_time", flat=True)]
+        if occurrences:
+            BookingService.validate(series.court, *occurrences[0])
+        conflicts = series_conflicts(series, occurrences)
+        if conflicts:
+            raise conflict_error(occurrences, conflicts)
+
+        series.reschedule(now, start_time, duration)
+        return cls.success(data=series, response_message="Booking series updated successfully")
+
+
+class CancelBookingSeriesMutation(graphene.Mutation, BookingSeriesOutput):
+
+    class Arguments:
+        id = graphene.Int(required=True)
+
+    @classmethod
+    @login_required
+    @ExceptionHandlers.mutation()
+    def mutate(cls, root, info, id):
+        series = BookingSeries.objects.get(id=id, account=info.context.user.account)
+        cancelled = series.cancel(timezone.now())
+        return cls.success(data=series, response_message=f"{cancelled} bookings cancelled")
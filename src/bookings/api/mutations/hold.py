@@ -0,0 +1,73 @@
+import graphene
+from django.core.exceptions import ValidationError
+from graphql_jwt.decorators import login_required
+
+from bookings import conflict_index, holds
+from bookings.models import Booking
+from bookings.services import BookingService
+from courts.models import Court
+
+from bookings.api.schema import BookingOutput, HoldOutput, HoldSlotInput
+
+from utils.common import ExceptionHandlers
+
+
+class HoldSlotMutation(graphene.Mutation, HoldOutput):
+
+    class Arguments:
+        payload = HoldSlotInput(required=True)
+
+    @classmethod
+    @login_required
+    @ExceptionHandlers.mutation()
+    def mutate(cls, root, info, payload):
+        court = Court.objects.get(id=payload["court"])
+        start_time, end_time = BookingService.period(payload["start_time"], payload["duration"])
+        BookingService.validate(court, start_time, end_time)
+
+        conflict_index.check(court.id, start_time, end_time)
+        hold = holds.place(court, info.context.user.account.id, start_time, end_time, payload.get("seconds"))
+        return cls.success(data=dict(hold._asdict(), court=court), response_message="Slot held")
+
+
+class ConfirmHoldMutation(graphene.Mutation, BookingOutput):
+
+    class Arguments:
+        hold_id = graphene.String(required=True)
+
+    @classmethod
+    @login_required
+    @ExceptionHandlers.mutation()
+    def mutate(cls, root, info, hold_id):
+        account = info.context.user.account
+        hold = holds.get(hold_id)
+        if hold is None or hold.account_id != account.id:
+            raise ValidationError("Hold not found or expired")
+
+        court = Court.objects.get(id=hold.court_id)
+        booking = Booking.objects.create(court=court,
+                                         account=account,
+                                         start_time=hold.start_time,
+                                         end_time=hold.end_time,
+                                         duration=round((hold.end_time - hold.start_time).total_seconds() / 3600))
+        # The "booked" event of the new booking replaces the hold for subscribers
+        holds.release(court, hold, announce=False)
+        return cls.success(data=booking, response_message="Booking created successfully")
+
+
+class ReleaseHoldMutation(graphene.Mutation, HoldOutput):
+
+    class Arguments:
+        hold_id = graphene.String(required=True)
+
+    @classmethod
+    @login_required
+    @ExceptionHandlers.mutation()
+    def mutate(cls, root, info, hold_id):
+        hold = holds.get(hold_id)
+        if hold is None or hold.account_id != info.context.user.account.id:
+            raise ValidationError("Hold not found or expired")
+
+        court = Court.objects.get(id=hold.court_id)
+        holds.release(court, hold)
+        return cls.success(data=dict(hold._asdict(), court=court), response_message="Hold released")
@@ -3,5 +3,9 @@ from .booking import *
 __all__ = [
     "BookingType",
     "BookingOutput",
-    "BookingListOutput"
+    "BookingListOutput",
+    "BookingSeriesType",
+    "BookingSeriesOutput",
+    "HoldType",
+    "HoldOutput",
 ]
\ No newline at end of file
@@ -1,7 +1,7 @@
 import graphene
 from  graphene_django import DjangoObjectType
 
-from bookings.models import Booking
+from bookings.models import Booking, BookingSeries
 
 from courts.api.schema import CourtType
 
@@ -28,4 +28,50 @@ class BookingListOutput(PaginatedModelList):
 class CreateBookingInput(graphene.InputObjectType):
     court = graphene.Int(required=True)
     start_time = graphene.DateTime(required=True)
-    duration = graphene.Int(required=True)
\ No newline at end of file
+    duration = graphene.Int(required=True)
+
+
+class BookingSeriesType(DjangoObjectType):
+    court = graphene.Field(CourtType)
+
+    class Meta:
+        model = BookingSeries
+        fields = "__all__"
+
+
+class BookingSeriesOutput(QueryResponse):
+    data = graphene.Field(BookingSeriesType)
+    conflicts = graphene.List(graphene.DateTime)
+
+
+class CreateBookingSeriesInput(graphene.InputObjectType):
+    court = graphene.Int(required=True)
+    start_time = graphene.DateTime(required=True)
+    duration = graphene.Int(required=True)
+    occurrences = graphene.Int(required=True)
+    interval_weeks = graphene.Int(default_value=1)
+    skip_conflicts = graphene.Boolean(default_value=False)
+
+
+class UpdateBookingSeriesInput(graphene.InputObjectType):
+    start_time = graphene.DateTime(required=True)
+    duration = graphene.Int(required=True)
+
+
+class HoldType(graphene.ObjectType):
+    hold_id = graphene.String()
+    court = graphene.Field(CourtType)
+    start_time = graphene.DateTime()
+    end_time = graphene.DateTime()
+    expires_at = graphene.DateTime()
+
+
+class HoldOutput(QueryResponse):
+    data = graphene.Field(HoldType)
+
+
+class HoldSlotInput(graphene.InputObjectType):
+    court = graphene.Int(required=True)
+    start_time = graphene.DateTime(required=True)
+    duration = graphene.Int(required=True)
+    seconds = graphene.Int()
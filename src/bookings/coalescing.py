@@ -0,0 +1,108 @@
+import atexit
+from threading import Lock, Timer
+from time import monotonic
+from typing import Dict, List
+
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+from django.conf import settings
+
+from utils.logging import logger
+
+
+class CoalescingStats:
+    """
+    Counters of the event coalescer: booking events buffered and frames sent for them.
+    Logged every BOOKING_EVENT_STATS_SECONDS by the flush that crosses the interval.
+    """
+
+    events: int = 0
+    frames: int = 0
+    _reported_at: float = monotonic()
+    _lock = Lock()
+
+    @classmethod
+    def record(cls, events: int = 0, frames: int = 0) -> None:
+        with cls._lock:
+            cls.events += events
+            cls.frames += frames
+
+    @classmethod
+    def as_dict(cls) -> dict:
+        return {
+            "events": cls.events,
+            "frames": cls.frames,
+            "compression_ratio": cls.events / cls.frames if cls.frames else 0.0,
+        }
+
+    @classmethod
+    def report(cls) -> None:
+        interval = getattr(settings, "BOOKING_EVENT_STATS_SECONDS", 300)
+        with cls._lock:
+            if not interval or monotonic() - cls._reported_at < interval:
+                return
+            cls._reported_at = monotonic()
+        logger.info(f"Booking event coalescing: {cls.as_dict()}")
+
+    @classmethod
+    def reset(cls) -> None:
+        with cls._lock:
+            cls.events = 0
+            cls.frames = 0
+            cls._reported_at = monotonic()
+
+
+def tick() -> float:
+    """Seconds events are buffered for, 0 sends every event straight away."""
+    return getattr(settings, "BOOKING_EVENT_TICK_MS", 0) / 1000
+
+
+def enabled() -> bool:
+    return tick() > 0
+
+
+class EventCoalescer:
+    """
+    Buffers the booking events of this process per court group and, one tick after the first of them,
+    sends every group a single frame: {"events": [...]} in the order the events were sent, or the event
+    itself when it was the only one. Flushes are serialized, so frames of a group never overtake each other.
+    """
+
+    def __init__(self):
+        self._pending: Dict[str, List[dict]] = {}
+        self._timer = None
+        self._lock = Lock()
+        self._flush_lock = Lock()
+
+    def send(self, group: str, body: dict) -> None:
+        with self._lock:
+            self._pending.setdefault(group, []).append(body)
+            if self._timer is None:
+                self._timer = Timer(tick(), self.flush)
+                self._timer.daemon = True
+                self._timer.start()
+
+    def flush(self) -> None:
+        with self._flush_lock:
+            with self._lock:
+                pending, self._pending = self._pending, {}
+                if self._timer is not None:
+                    self._timer.cancel()
+                    self._timer = None
+
+            channel_layer = get_channel_layer()
+            for group, bodies in pending.items():
+                body = bodies[0] if len(bodies) == 1 else {"events": bodies}
+                async_to_sync(channel_layer.group_send)(
+                    group, {
+                        "type": "event",
+                        "body": body
+                    }
+                )
+                CoalescingStats.record(events=len(bodies), frames=1)
+            CoalescingStats.report()
+
+
+coalescer = EventCoalescer()
+# Events still buffered when a process exits are sent rather than dropped
+atexit.register(coalescer.flush)
@@ -0,0 +1,202 @@
+from bisect import bisect_left, bisect_right
+from collections import OrderedDict
+from datetime import datetime
+from threading import Lock
+from time import monotonic
+from typing import Dict, List
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from bookings.models import Booking, SlotNotAvailable
+
+
+class ConflictIndexStats:
+    """Counters of the in-process conflict index: checks served from a loaded court, lazy loads and rejections."""
+
+    hits: int = 0
+    misses: int = 0
+    rejects: int = 0
+    _lock = Lock()
+
+    @classmethod
+    def record(cls, hits: int = 0, misses: int = 0, rejects: int = 0) -> None:
+        with cls._lock:
+            cls.hits += hits
+            cls.misses += misses
+            cls.rejects += rejects
+
+    @classmethod
+    def as_dict(cls) -> dict:
+        total = cls.hits + cls.misses
+        return {
+            "hits": cls.hits,
+            "misses": cls.misses,
+            "rejects": cls.rejects,
+            "hit_ratio": cls.hits / total if total else 0.0,
+        }
+
+    @classmethod
+    def reset(cls) -> None:
+        with cls._lock:
+            cls.hits = 0
+            cls.misses = 0
+            cls.rejects = 0
+
+
+class CourtIntervals:
+    """
+    Upcoming bookings of one court as three parallel lists sorted by start.
+    Bookings of a court never overlap, so the ends are sorted too and an overlap is two bisects away.
+    """
+
+    def __init__(self, bookings=()):
+        self.starts: List[datetime] = []
+        self.ends: List[datetime] = []
+        self.ids: List[int] = []
+        self.loaded_at = monotonic()
+        for booking_id, start_time, end_time in bookings:
+            self.starts.append(start_time)
+            self.ends.append(end_time)
+            self.ids.append(booking_id)
+
+    def overlaps(self, start_time: datetime, end_time: datetime, exclude: int = None) -> bool:
+        """Whether a booking other than exclude overlaps [start_time, end_time)."""
+        first, last = bisect_right(self.ends, start_time), bisect_left(self.starts, end_time)
+        return any(booking_id != exclude for booking_id in self.ids[first:last])
+
+    def add(self, booking_id: int, start_time: datetime, end_time: datetime) -> None:
+        self.remove(booking_id)
+        position = bisect_left(self.starts, start_time)
+        self.starts.insert(position, start_time)
+        self.ends.insert(position, end_time)
+        self.ids.insert(position, booking_id)
+
+    def remove(self, booking_id: int) -> None:
+        if booking_id in self.ids:
+            position = self.ids.index(booking_id)
+            del self.starts[position], self.ends[position], self.ids[position]
+
+
+class ConflictIndex:
+    """
+    Per-court booking intervals of this process, used to turn down obvious conflicts without a query.
+
+    A court is loaded from its upcoming bookings the first time it is checked and then kept in sync by the
+    booking signals. Only rejections come from the index: a slot it considers free is still inserted and the
+    exclusion constraint decides. Bookings cancelled or moved by other processes are not seen here, so a
+    rejection is only final while the court was loaded less than CONFLICT_INDEX_FRESH seconds ago; in an older
+    court it is confirmed with a query of the overlapping bookings, and a court found stale is dropped to be
+    reloaded on its next check. Every court is reloaded after CONFLICT_INDEX_TTL seconds and at most
+    CONFLICT_INDEX_MAX_COURTS courts are kept.
+    """
+
+    def __init__(self):
+        self.courts: Dict[int, CourtIntervals] = OrderedDict()
+        self._lock = Lock()
+
+    @property
+    def ttl(self) -> float:
+        return getattr(settings, "CONFLICT_INDEX_TTL", 60)
+
+    @property
+    def fresh(self) -> float:
+        return getattr(settings, "CONFLICT_INDEX_FRESH", 5)
+
+    @property
+    def max_courts(self) -> int:
+        return getattr(settings, "CONFLICT_INDEX_MAX_COURTS", 1024)
+
+    def _get(self, court_id: int):
+        intervals = self.courts.get(court_id)
+        if intervals is not None and monotonic() - intervals.loaded_at > self.ttl:
+            del self.courts[court_id]
+            return None
+        if intervals is not None:
+            self.courts.move_to_end(court_id)
+        return intervals
+
+    def _load(self, court_id: int) -> CourtIntervals:
+        bookings = Booking.objects.filter(court_id=court_id, end_time__gt=timezone.now()) \
+            .order_by("start_time").values_list("id", "start_time", "end_time")
+        intervals = CourtIntervals(bookings)
+        with self._lock:
+            self.courts[court_id] = intervals
+            while len(self.courts) > self.max_courts:
+                self.courts.popitem(last=False)
+        return intervals
+
+    def intervals(self, court_id: int) -> CourtIntervals:
+        """The indexed bookings of a court, loaded on the first call."""
+        with self._lock:
+            intervals = self._get(court_id)
+        ConflictIndexStats.record(hits=intervals is not None, misses=intervals is None)
+        if intervals is None:
+            intervals = self._load(court_id)
+        return intervals
+
+    def check(self, court_id: int, start_time: datetime, end_time: datetime, exclude: int = None) -> None:
+        """
+        Raise SlotNotAvailable when the slot overlaps a booking of the court, other than exclude. An overlap
+        found in a court loaded more than CONFLICT_INDEX_FRESH seconds ago is confirmed against the database.
+        """
+        intervals = self.intervals(court_id)
+        if intervals.overlaps(start_time, end_time, exclude) and \
+                self.confirmed(court_id, intervals, start_time, end_time, exclude):
+            ConflictIndexStats.record(rejects=1)
+            raise SlotNotAvailable()
+
+    def confirmed(self, court_id: int, intervals: CourtIntervals, start_time: datetime, end_time: datetime,
+                  exclude: int = None) -> bool:
+        """
+        Whether an overlap found in the intervals of a court still holds: right away when they are fresh,
+        otherwise after one query for an overlapping booking. Stale intervals are dropped from the index.
+        """
+        if monotonic() - intervals.loaded_at <= self.fresh:
+            return True
+        ConflictIndexStats.record(misses=1)
+        bookings = Booking.objects.filter(court_id=court_id, start_time__lt=end_time, end_time__gt=start_time)
+        if exclude is not None:
+            bookings = bookings.exclude(pk=exclude)
+        if bookings.exists():
+            return True
+        with self._lock:
+            if self.courts.get(court_id) is intervals:
+                del self.courts[court_id]
+        return False
+
+    def add(self, court_id: int, booking_id: int, start_time: datetime, end_time: datetime) -> None:
+        with self._lock:
+            intervals = self.courts.get(court_id)
+            if intervals is not None:
+                intervals.add(booking_id, start_time, end_time)
+
+    def remove(self, court_id: int, booking_id: int) -> None:
+        with self._lock:
+            intervals = self.courts.get(court_id)
+            if intervals is not None:
+                intervals.remove(booking_id)
+
+    def clear(self) -> None:
+        with self._lock:
+            self.courts.clear()
+
+
+conflict_index = ConflictIndex()
+
+
+def check(court_id: int, start_time: datetime, end_time: datetime, exclude: int = None) -> None:
+    conflict_index.check(court_id, start_time, end_time, exclude)
+
+
+def booking_saved(booking: Booking) -> None:
+    """Add a booking once its transaction commits, a rolled back insert never reaches the index."""
+    court_id, booking_id = booking.court_id, booking.id
+    start_time, end_time = booking.start_time, booking.end_time
+    transaction.on_commit(lambda: conflict_index.add(court_id, booking_id, start_time, end_time))
+
+
+def booking_removed(booking: Booking) -> None:
+    """Forgetting a booking early only costs a rejection, so it is removed right away."""
+    conflict_index.remove(booking.court_id, booking.id)
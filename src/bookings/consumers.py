@@ -1,11 +1,49 @@
 from traceback import print_exc
-from datetime import timedelta
-from asgiref.sync import async_to_sync
-from django.db.models import Q
-from django.utils import timezone
+from asgiref.sync import async_to_sync, sync_to_async
+from django.conf import settings
 from rest_framework.exceptions import ValidationError
-from channels.generic.websocket import JsonWebsocketConsumer
-from . import models,serializers
+from channels.generic.websocket import AsyncJsonWebsocketConsumer, JsonWebsocketConsumer
+from accounts.models import Account
+from courts.models import Court
+from . import event_stream,models,serializers,snapshots
+from .groups import group_add_many, group_discard_many
+from .pipeline import pipeline
+from .services import BookingService
+
+
+def sub_court_ids(data, located=()):
+    """
+    Courts named by a sub or unsub message: court_id, court_ids and the courts of its location, once each.
+    A message names at most MAX_SUBSCRIPTIONS courts, however many its location has.
+    """
+    court_ids = [data["court_id"]] if "court_id" in data else []
+    court_ids = list(dict.fromkeys([*court_ids, *data.get("court_ids", []), *located]))
+    if len(court_ids) > serializers.MAX_SUBSCRIPTIONS:
+        raise ValidationError(f"A message names at most {serializers.MAX_SUBSCRIPTIONS} courts")
+    return court_ids
+
+
+def located_court_ids(location):
+    """Courts of a location, one more than a message may name so sub_court_ids can turn the rest down."""
+    return Court.objects.filter(location=location).order_by("id") \
+        .values_list("court_id", flat=True)[:serializers.MAX_SUBSCRIPTIONS + 1]
+
+
+def sub_response(data, court_ids, snapshot=None, since=None):
+    """
+    One acknowledgement per message, listing the courts when more than one court_id could be meant.
+    For a sub asking for a snapshot, it carries the versioned bookings of every court in the window,
+    for a sub resuming from since cursors, the events each court had after its cursor, oldest first.
+    Courts listed under truncated lost events past the cursor and need a snapshot.
+    """
+    response = {"status": "success"}
+    if data.keys() & {"court_ids", "location"}:
+        response["court_ids"] = [str(court_id) for court_id in court_ids]
+    if snapshot:
+        response["snapshot"] = snapshots.snapshot(court_ids, snapshot["start_time"], snapshot["end_time"])
+    if since:
+        response["replay"], response["truncated"] = event_stream.replay(court_ids, since)
+    return response
 
 
 class BookingsConsumer(JsonWebsocketConsumer):
@@ -16,10 +54,9 @@ class BookingsConsumer(JsonWebsocketConsumer):
 
     
     def disconnect(self, code):
-        for sub in self.subs:
-            async_to_sync(self.channel_layer.group_discard)(
-                sub, self.channel_name
-            )
+        async_to_sync(group_discard_many)(
+            self.channel_layer, self.subs, self.channel_name
+        )
 
     def receive_json(self, content, **kwargs):
         try:
@@ -34,6 +71,8 @@ class BookingsConsumer(JsonWebsocketConsumer):
                 response = self.unsubscribe(content)
             elif type == "book":
                 response = self.book(content)
+            elif type == "move":
+                response = self.move(content)
             elif type == "cancel":
                 response = self.cancel(content)
 
@@ -53,21 +92,28 @@ class BookingsConsumer(JsonWebsocketConsumer):
             
     
 
+    def court_ids(self, data):
+        located = []
+        if "location" in data:
+            located = located_court_ids(data["location"])
+        return sub_court_ids(data, located)
+
+
     def subscribe(self,content):
         serializer = serializers.ConsumerSubSerializer(data=content)
         serializer.is_valid(raise_exception=True)
 
         data = serializer.validated_data
-        court_id = data["court_id"]
-        sub = f"court_{court_id}"
+        court_ids = self.court_ids(data)
+        subs = [f"court_{court_id}" for court_id in court_ids]
 
-        async_to_sync(self.channel_layer.group_add)(
-            sub, self.channel_name
+        async_to_sync(group_add_many)(
+            self.channel_layer, subs, self.channel_name
         )
 
-        self.subs.append(sub)
+        self.subs.extend(sub for sub in subs if sub not in self.subs)
 
-        self.send_json({"status": "success"})
+        self.send_json(sub_response(data, court_ids, data.get("snapshot"), data.get("since")))
 
 
     def unsubscribe(self,content):
@@ -75,17 +121,16 @@ class BookingsConsumer(JsonWebsocketConsumer):
         serializer.is_valid(raise_exception=True)
 
         data = serializer.validated_data
-        court_id = data["court_id"]
-        sub = f"court_{court_id}"
+        court_ids = self.court_ids(data)
+        subs = [f"court_{court_id}" for court_id in court_ids]
 
-        async_to_sync(self.channel_layer.group_discard)(
-            sub, self.channel_name
+        async_to_sync(group_discard_many)(
+            self.channel_layer, subs, self.channel_name
         )
 
-        if sub in self.subs:
-            self.subs.remove(sub)
+        self.subs = [sub for sub in self.subs if sub not in subs]
 
-        self.send_json({"status": "success"})
+        self.send_json(sub_response(data, court_ids))
 
 
     def book(self,content):
@@ -93,37 +138,31 @@ class BookingsConsumer(JsonWebsocketConsumer):
         serializer.is_valid(raise_exception=True)
 
         data = serializer.validated_data
-        
-        court_id = data["court_id"]
-        start_time = data["start_time"]
-        duration = data["duration"]
-        end_time = start_time + timedelta(hours=duration)
-        
-        court = models.Court.objects.get(court_id=court_id)
 
-        if start_time < timezone.now() or (start_time.time() <= court.open or end_time.time() >= court.close):
-            raise Exception("Invalid start time or duration")
-        
-        booked = court.bookings.filter(
-            (Q(start_time__lte=start_time)&Q(end_time__gt=start_time))
-            |(Q(start_time__lte=end_time)&Q(end_time__gt=end_time))
-        )
-        
+        service = BookingService(self.scope["user"].account)
+        if settings.BOOKING_PIPELINE:
+            # The court's pipeline worker answers on this channel once the request is decided
+            booking = service.prepare(data["start_time"], data["duration"], court_id=data["court_id"])
+            async_to_sync(pipeline.submit)(booking, self.channel_name)
+            return
 
-        if booked:
-            raise Exception("Slot not available")
-        
-        user = self.scope["user"]
-        account = user.account
-        booking = models.Booking.objects.create(court=court,
-                                                account=account,
-                                                start_time=start_time,
-                                                end_time=end_time,
-                                                duration=duration)
+        service.book(data["start_time"], data["duration"], court_id=data["court_id"])
 
         self.send_json({"status": "success"})
 
         
+    def move(self,content):
+        serializer = serializers.ConsumerMoveSerializer(data=content)
+        serializer.is_valid(raise_exception=True)
+
+        data = serializer.validated_data
+
+        service = BookingService(self.scope["user"].account)
+        service.move(data["booking_id"], data["start_time"], data["duration"])
+
+        self.send_json({"status": "success"})
+
+
     def cancel(self,content):
         serializer = serializers.ConsumerCancelSerializer(data=content)
         serializer.is_valid(raise_exception=True)
@@ -148,4 +187,140 @@ class BookingsConsumer(JsonWebsocketConsumer):
 
     def event(self,event):
         message = event["body"]
-        self.send_json(message)
\ No newline at end of file
+        self.send_json(message)
+
+
+
+class AsyncBookingsConsumer(AsyncJsonWebsocketConsumer):
+    """
+    BookingsConsumer on the event loop: same messages and responses, group changes are awaited directly
+    and the database is reached through the async ORM, so an idle or waiting socket holds no thread.
+    """
+
+    async def connect(self):
+        self.subs = []
+        self.account = await Account.objects.filter(user_id=self.scope["user"].id).afirst()
+        await self.accept()
+
+
+    async def disconnect(self, code):
+        await group_discard_many(
+            self.channel_layer, self.subs, self.channel_name
+        )
+
+    async def receive_json(self, content, **kwargs):
+        try:
+            serializer = serializers.ConsumerTypeSerializer(data=content)
+            serializer.is_valid(raise_exception=True)
+
+            type = serializer.validated_data["type"]
+
+            if type == "sub":
+                await self.subscribe(content)
+            elif type == "unsub":
+                await self.unsubscribe(content)
+            elif type == "book":
+                await self.book(content)
+            elif type == "move":
+                await self.move(content)
+            elif type == "cancel":
+                await self.cancel(content)
+
+        except ValidationError as e:
+            response = {
+                "status": "error",
+                "details": e.get_full_details()
+            }
+            await self.send_json(response)
+        except Exception as e:
+            print_exc()
+            response = {
+                "status": "error",
+                "details": str(e)
+            }
+            await self.send_json(response)
+
+
+    async def court_ids(self, data):
+        located = []
+        if "location" in data:
+            located = [court_id async for court_id in located_court_ids(data["location"])]
+        return sub_court_ids(data, located)
+
+
+    async def subscribe(self,content):
+        serializer = serializers.ConsumerSubSerializer(data=content)
+        serializer.is_valid(raise_exception=True)
+
+        data = serializer.validated_data
+        court_ids = await self.court_ids(data)
+        subs = [f"court_{court_id}" for court_id in court_ids]
+
+        await group_add_many(
+            self.channel_layer, subs, self.channel_name
+        )
+
+        self.subs.extend(sub for sub in subs if sub not in self.subs)
+
+        await self.send_json(await sync_to_async(sub_response)(data, court_ids, data.get("snapshot"), data.get("since")))
+
+
+    async def unsubscribe(self,content):
+        serializer = serializers.ConsumerSubSerializer(data=content)
+        serializer.is_valid(raise_exception=True)
+
+        data = serializer.validated_data
+        court_ids = await self.court_ids(data)
+        subs = [f"court_{court_id}" for court_id in court_ids]
+
+        await group_discard_many(
+            self.channel_layer, subs, self.channel_name
+        )
+
+        self.subs = [sub for sub in self.subs if sub not in subs]
+
+        await self.send_json(sub_response(data, court_ids))
+
+
+    async def book(self,content):
+        serializer = serializers.ConsumerBookSerializer(data=content)
+        serializer.is_valid(raise_exception=True)
+
+        data = serializer.validated_data
+
+        service = BookingService(self.account)
+        if settings.BOOKING_PIPELINE:
+            # The court's pipeline worker answers on this channel once the request is decided
+            booking = await service.aprepare(data["start_time"], data["duration"], court_id=data["court_id"])
+            await pipeline.submit(booking, self.channel_name)
+            return
+
+        await service.abook(data["start_time"], data["duration"], court_id=data["court_id"])
+
+        await self.send_json({"status": "success"})
+
+
+    async def move(self,content):
+        serializer = serializers.ConsumerMoveSerializer(data=content)
+        serializer.is_valid(raise_exception=True)
+
+        data = serializer.validated_data
+
+        service = BookingService(self.account)
+        await service.amove(data["booking_id"], data["start_time"], data["duration"])
+
+        await self.send_json({"status": "success"})
+
+
+    async def cancel(self,content):
+        serializer = serializers.ConsumerCancelSerializer(data=content)
+        serializer.is_valid(raise_exception=True)
+
+        service = BookingService(self.account)
+        await service.acancel(serializer.validated_data["booking_id"])
+
+        await self.send_json({"status": "success"})
+
+
+    async def event(self,event):
+        await self.send_json(event["body"])
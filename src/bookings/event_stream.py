@@ -0,0 +1,66 @@
+import json
+from typing import Dict, Iterable, List, Tuple, Union
+
+import redis
+from django.conf import settings
+
+from . import redis_client
+
+
+def client() -> redis.Redis:
+    return redis_client.client("EVENT_STREAM_REDIS_URL")
+
+
+def max_length() -> int:
+    return getattr(settings, "EVENT_STREAM_MAXLEN", 1000)
+
+
+def stream_key(court_id) -> str:
+    return f"court_events:{court_id}"
+
+
+def _position(cursor) -> Tuple[int, int]:
+    milliseconds, _, sequence = str(cursor).partition("-")
+    return int(milliseconds), int(sequence or 0)
+
+
+def append(court_id, body: dict) -> str:
+    """
+    Append a court event to the court's stream, by its court_id UUID, and return its cursor.
+    The stream keeps about EVENT_STREAM_MAXLEN events, older ones are trimmed as new ones come in.
+    """
+    cursor = client().xadd(stream_key(court_id), {"body": json.dumps(body)},
+                           maxlen=max_length(), approximate=True)
+    return cursor.decode()
+
+
+def replay(court_ids: Iterable, since: Union[str, Dict[str, str]]) -> Tuple[Dict[str, List[dict]], List[str]]:
+    """
+    Events of the courts after their cursors, with their cursors, in one round trip, and the courts whose
+    stream was trimmed past the cursor. Clients may have missed events of those and should ask for a snapshot.
+    since is a cursor per court_id, or one cursor for every court. A cursor is a position in one court's
+    stream, so clients resuming several courts pass the last cursor they saw of each; courts left out of
+    the map are not replayed.
+    """
+    cursors = since if isinstance(since, dict) else dict.fromkeys((str(court_id) for court_id in court_ids), since)
+    court_ids = [str(court_id) for court_id in court_ids if str(court_id) in cursors]
+    pipe = client().pipeline(transaction=False)
+    for court_id in court_ids:
+        pipe.xlen(stream_key(court_id))
+        pipe.xrange(stream_key(court_id), "-", "+", count=1)
+        pipe.xrange(stream_key(court_id), cursors[court_id], "+")
+    results = pipe.execute()
+
+    events = {}
+    truncated = []
+    for court_id, length, oldest, entries in zip(court_ids, results[::3], results[1::3], results[2::3]):
+        since_position = _position(cursors[court_id])
+        # Only a full stream has been trimmed
+        if length >= max_length() and _position(oldest[0][0].decode()) > since_position:
+            truncated.append(court_id)
+        events[court_id] = [
+            dict(json.loads(fields[b"body"]), cursor=cursor.decode())
+            for cursor, fields in entries
+            if _position(cursor.decode()) > since_position
+        ]
+    return events, truncated
@@ -0,0 +1,51 @@
+import asyncio
+import time
+from collections import defaultdict
+from typing import Iterable
+
+from channels_redis.core import RedisChannelLayer
+
+
+def _by_connection(layer: RedisChannelLayer, groups: Iterable[str]):
+    """Group names by the Redis shard holding them, as the layer's own group_add would pick it."""
+    shards = defaultdict(list)
+    for group in groups:
+        assert layer.valid_group_name(group), "Group name not valid"
+        shards[layer.consistent_hash(group)].append(group)
+    return shards.items()
+
+
+async def group_add_many(layer, groups: Iterable[str], channel: str) -> None:
+    """
+    Add a channel to several groups. On the Redis layer that is one pipelined round trip per shard,
+    writing the same ZADD and EXPIRE as RedisChannelLayer.group_add. Other layers get one group_add per group.
+    """
+    groups = list(groups)
+    if not isinstance(layer, RedisChannelLayer):
+        await asyncio.gather(*(layer.group_add(group, channel) for group in groups))
+        return
+
+    assert layer.valid_channel_name(channel), "Channel name not valid"
+    now = time.time()
+    for index, shard_groups in _by_connection(layer, groups):
+        async with layer.connection(index).pipeline(transaction=False) as pipe:
+            for group in shard_groups:
+                key = layer._group_key(group)
+                pipe.zadd(key, {channel: now})
+                pipe.expire(key, layer.group_expiry)
+            await pipe.execute()
+
+
+async def group_discard_many(layer, groups: Iterable[str], channel: str) -> None:
+    """Remove a channel from several groups, pipelined per shard on the Redis layer like group_add_many."""
+    groups = list(groups)
+    if not isinstance(layer, RedisChannelLayer):
+        await asyncio.gather(*(layer.group_discard(group, channel) for group in groups))
+        return
+
+    assert layer.valid_channel_name(channel), "Channel name not valid"
+    for index, shard_groups in _by_connection(layer, groups):
+        async with layer.connection(index).pipeline(transaction=False) as pipe:
+            for group in shard_groups:
+                pipe.zrem(layer._group_key(group), channel)
+            await pipe.execute()
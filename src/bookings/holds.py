@@ -0,0 +1,171 @@
+import time as _time
+import uuid
+from collections import defaultdict
+from datetime import date, datetime, timezone as dt_timezone
+from typing import Dict, Iterable, List, NamedTuple, Optional, Tuple
+from zoneinfo import ZoneInfo
+
+import redis
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+from django.conf import settings
+
+from bookings import redis_client
+from bookings.models import SlotNotAvailable
+from utils.common.availability_engine import Interval, split_by_day
+
+
+class Hold(NamedTuple):
+    """A slot set aside for one account until expires_at, stored as one sorted set member per court."""
+    hold_id: str
+    court_id: int
+    account_id: int
+    start_time: datetime
+    end_time: datetime
+    expires_at: datetime
+
+    @property
+    def member(self) -> str:
+        return f"{self.hold_id}|{self.account_id}|{self.start_time.timestamp()}|{self.end_time.timestamp()}"
+
+    @classmethod
+    def from_member(cls, court_id: int, member: bytes, score: float) -> "Hold":
+        hold_id, account_id, start, end = member.decode().split("|")
+        return cls(hold_id, court_id, int(account_id),
+                   datetime.fromtimestamp(float(start), dt_timezone.utc),
+                   datetime.fromtimestamp(float(end), dt_timezone.utc),
+                   datetime.fromtimestamp(score, dt_timezone.utc))
+
+    def overlaps(self, start_time: datetime, end_time: datetime) -> bool:
+        return self.start_time < end_time and start_time < self.end_time
+
+
+def client() -> redis.Redis:
+    return redis_client.client("SLOT_HOLD_REDIS_URL")
+
+
+def max_seconds() -> int:
+    return getattr(settings, "SLOT_HOLD_SECONDS", 90)
+
+
+def court_key(court_id: int) -> str:
+    return f"slot_holds:{court_id}"
+
+
+def hold_key(hold_id: str) -> str:
+    return f"slot_hold:{hold_id}"
+
+
+def _live(pipe, court_id: int, now: float) -> None:
+    """Queue the removal of expired holds and a read of the rest. Expired members only go when a court is read."""
+    pipe.zremrangebyscore(court_key(court_id), "-inf", now)
+    pipe.zrangebyscore(court_key(court_id), now, "+inf", withscores=True)
+
+
+def court_holds(court_ids: Iterable[int]) -> Dict[int, List[Hold]]:
+    """Live holds of several courts in one round trip."""
+    court_ids = list(court_ids)
+    now = _time.time()
+    pipe = client().pipeline(transaction=False)
+    for court_id in court_ids:
+        _live(pipe, court_id, now)
+    results = pipe.execute()
+    return {
+        court_id: [Hold.from_member(court_id, member, score) for member, score in members]
+        for court_id, members in zip(court_ids, results[1::2])
+    }
+
+
+def check(court_id: int, start_time: datetime, end_time: datetime, account_id: Optional[int] = None) -> None:
+    """Raise SlotNotAvailable when the slot overlaps a live hold of another account."""
+    for hold in court_holds([court_id])[court_id]:
+        if hold.account_id != account_id and hold.overlaps(start_time, end_time):
+            raise SlotNotAvailable()
+
+
+def conflicts(slots: Iterable[Tuple[int, datetime, datetime]], account_id: Optional[int] = None) -> List[int]:
+    """
+    Positions of the slots, as (court_id, start_time, end_time), that overlap a live hold of another account,
+    with the holds of all their courts read in one round trip.
+    """
+    slots = list(slots)
+    if not slots:
+        return []
+    held = court_holds({court_id for court_id, _, _ in slots})
+    return [position for position, (court_id, start_time, end_time) in enumerate(slots)
+            if any(hold.account_id != account_id and hold.overlaps(start_time, end_time)
+                   for hold in held[court_id])]
+
+
+def place(court, account_id: int, start_time: datetime, end_time: datetime, seconds: int = None) -> Hold:
+    """
+    Hold a slot for an account for at most SLOT_HOLD_SECONDS. Holds of a court are checked and added
+    under WATCH, so two clients cannot hold overlapping slots. The court key expires with its last hold,
+    expired members of a busy court are dropped whenever it is read.
+    """
+    seconds = min(seconds or max_seconds(), max_seconds())
+    key = court_key(court.id)
+    result = {}
+
+    def add(pipe):
+        now = _time.time()
+        holds = [Hold.from_member(court.id, member, score)
+                 for member, score in pipe.zrangebyscore(key, now, "+inf", withscores=True)]
+        if any(hold.overlaps(start_time, end_time) for hold in holds):
+            raise SlotNotAvailable()
+        hold = Hold(uuid.uuid4().hex, court.id, account_id, start_time, end_time,
+                    datetime.fromtimestamp(now + seconds, dt_timezone.utc))
+        pipe.multi()
+        pipe.zremrangebyscore(key, "-inf", now)
+        pipe.zadd(key, {hold.member: now + seconds})
+        pipe.expire(key, max_seconds())
+        pipe.set(hold_key(hold.hold_id), court.id, ex=seconds)
+        result["hold"] = hold
+
+    client().transaction(add, key)
+    hold = result["hold"]
+    send_event(court, "held", hold)
+    return hold
+
+
+def get(hold_id: str) -> Optional[Hold]:
+    court_id = client().get(hold_key(hold_id))
+    if court_id is None:
+        return None
+    return next((hold for hold in court_holds([int(court_id)])[int(court_id)] if hold.hold_id == hold_id), None)
+
+
+def release(court, hold: Hold, announce: bool = True) -> None:
+    pipe = client().pipeline()
+    pipe.zrem(court_key(hold.court_id), hold.member)
+    pipe.delete(hold_key(hold.hold_id))
+    pipe.execute()
+    if announce:
+        send_event(court, "released", hold)
+
+
+def send_event(court, key: str, hold: Hold) -> None:
+    details = {key: {"start_time": hold.start_time.isoformat(),
+                     "end_time": hold.end_time.isoformat(),
+                     "expires_at": hold.expires_at.isoformat()}}
+    async_to_sync(get_channel_layer().group_send)(
+        f"court_{court.court_id}", {
+            "type": "event",
+            "body": details
+        }
+    )
+
+
+def held_intervals(court_ids: Iterable[int], dates: List[date],
+                   timezone: str = "UTC") -> Dict[Tuple[int, date], List[Interval]]:
+    """Held minute intervals by (court_id, date) on the local clock of the timezone, for the given dates only."""
+    tz = ZoneInfo(timezone)
+    wanted = set(dates)
+    held = defaultdict(list)
+    for court_id, holds in court_holds(court_ids).items():
+        for hold in holds:
+            for day, start_minute, end_minute in split_by_day(hold.start_time.astimezone(tz),
+                                                              hold.end_time.astimezone(tz)):
+                if day in wanted:
+                    held[(court_id, day)].append((start_minute, end_minute))
+    return held
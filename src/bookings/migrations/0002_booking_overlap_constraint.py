@@ -0,0 +1,35 @@
+# Generated by Django 5.0.3 on 2026-10-18 19:53
+
+import bookings.models.booking
+import django.contrib.postgres.constraints
+import django.contrib.postgres.fields.ranges
+from django.contrib.postgres.operations import BtreeGistExtension
+import uuid
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0001_initial'),
+        ('bookings', '0001_initial'),
+        ('courts', '0001_initial'),
+    ]
+
+    operations = [
+        # Court equality inside the GiST exclusion constraint
+        BtreeGistExtension(),
+        migrations.AlterField(
+            model_name='booking',
+            name='booking_id',
+            field=models.UUIDField(db_index=True, default=uuid.uuid4),
+        ),
+        migrations.AddIndex(
+            model_name='booking',
+            index=models.Index(fields=['court', 'start_time'], name='bookings_bo_court_i_e64d24_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='booking',
+            constraint=django.contrib.postgres.constraints.ExclusionConstraint(expressions=[(bookings.models.booking.TsTzRange('start_time', 'end_time', django.contrib.postgres.fields.ranges.RangeBoundary()), '&&'), ('court', '=')], name='exclude_overlapping_court_bookings'),
+        ),
+    ]
@@ -1,5 +1,8 @@
 from .booking import *
+from .booking_series import BookingSeries
 
 __all__ = [
-    "Booking"
+    "Booking",
+    "BookingSeries",
+    "SlotNotAvailable"
 ]
\ No newline at end of file
@@ -1,16 +1,40 @@
 import uuid
-from django.db import models
+from django.contrib.postgres.constraints import ExclusionConstraint
+from django.contrib.postgres.fields import DateTimeRangeField, RangeBoundary, RangeOperators
+from django.core.exceptions import NON_FIELD_ERRORS, ValidationError
+from django.db import IntegrityError, models, transaction
+from django.db.models import Deferrable
 
 
 from accounts.models import Account
 from courts.models import Court
 
+OVERLAP_CONSTRAINT = "exclude_overlapping_court_bookings"
+
+
+class TsTzRange(models.Func):
+    function = "TSTZRANGE"
+    output_field = DateTimeRangeField()
+
+
+class SlotNotAvailable(ValidationError):
+    """Raised when a booking overlaps another booking of the same court."""
+
+    def __init__(self):
+        super().__init__({NON_FIELD_ERRORS: ["Slot not available"]})
+
+    def __str__(self):
+        return "Slot not available"
+
+
 class Booking(models.Model):
     """ Booking model """
 
-    booking_id = models.UUIDField(default=uuid.uuid4)
+    booking_id = models.UUIDField(default=uuid.uuid4, db_index=True)
     court = models.ForeignKey(Court, on_delete=models.CASCADE, related_name="bookings")
     account = models.ForeignKey(Account, on_delete=models.CASCADE, related_name="bookings")
+    series = models.ForeignKey("bookings.BookingSeries", on_delete=models.SET_NULL, null=True, blank=True,
+                               related_name="bookings")
     start_time = models.DateTimeField()
     end_time = models.DateTimeField()
     duration = models.IntegerField()
@@ -18,4 +42,55 @@ class Booking(models.Model):
 
 
     def __str__(self):
-        return f"<Booking: {self.booking_id} | {self.start_time} | {self.duration} hours>"
\ No newline at end of file
+        return f"<Booking: {self.booking_id} | {self.start_time} | {self.duration} hours>"
+
+    class Meta:
+        constraints = [
+            # Bookings of a court may touch but never overlap, enforced by a GiST index over the [start, end) period.
+            # Checked at the end of each statement, so one UPDATE can move bookings past each other.
+            ExclusionConstraint(
+                name=OVERLAP_CONSTRAINT,
+                expressions=[
+                    (TsTzRange("start_time", "end_time", RangeBoundary()), RangeOperators.OVERLAPS),
+                    ("court", RangeOperators.EQUAL),
+                ],
+                deferrable=Deferrable.IMMEDIATE,
+            ),
+        ]
+        indexes = [
+            models.Index(fields=["court", "start_time"]),
+        ]
+
+    def save(self, *args, **kwargs):
+        """
+        The exclusion constraint is the only overlap check, so concurrent bookings of the same slot cannot both
+        be inserted. The insert runs in a savepoint so a conflict leaves the surrounding transaction usable.
+        """
+        try:
+            with transaction.atomic():
+                super().save(*args, **kwargs)
+        except IntegrityError as e:
+            if is_overlap_error(e):
+                raise SlotNotAvailable() from e
+            raise
+
+    def move(self, start_time, end_time, duration):
+        """
+        Update the period in place. moved_from tells the booking signals the previous period, so they skip
+        their lookup of the old row and announce one "moved" event instead of "cancelled" and "booked".
+        """
+        previous = self.start_time, self.end_time, self.duration
+        self.moved_from = previous[:2]
+        self.start_time, self.end_time, self.duration = start_time, end_time, duration
+        try:
+            self.save(update_fields=["start_time", "end_time", "duration"])
+        except Exception:
+            self.start_time, self.end_time, self.duration = previous
+            raise
+        finally:
+            del self.moved_from
+
+
+def is_overlap_error(error: IntegrityError) -> bool:
+    diag = getattr(error.__cause__, "diag", None)
+    return getattr(diag, "constraint_name", None) == OVERLAP_CONSTRAINT
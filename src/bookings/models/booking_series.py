@@ -0,0 +1,139 @@
+import uuid
+from bisect import bisect_left, bisect_right
+from datetime import datetime, timedelta
+from typing import List, Tuple
+
+from django.db import IntegrityError, connections, models, transaction
+from django.db.models import F
+
+from accounts.models import Account
+from courts.models import Court
+
+from .booking import Booking, SlotNotAvailable, is_overlap_error
+
+
+class BookingSeries(models.Model):
+    """ A recurring booking: `occurrences` bookings of `duration` hours, `interval_weeks` apart """
+
+    series_id = models.UUIDField(default=uuid.uuid4, db_index=True)
+    court = models.ForeignKey(Court, on_delete=models.CASCADE, related_name="booking_series")
+    account = models.ForeignKey(Account, on_delete=models.CASCADE, related_name="booking_series")
+    start_time = models.DateTimeField()
+    duration = models.IntegerField()
+    occurrences = models.IntegerField()
+    interval_weeks = models.IntegerField(default=1)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+
+    def __str__(self):
+        return f"<BookingSeries: {self.series_id} | {self.start_time} | {self.occurrences} x {self.duration} hours>"
+
+    def expand(self) -> List[Tuple[datetime, datetime]]:
+        """The (start, end) of every occurrence, computed in memory."""
+        length = timedelta(hours=self.duration)
+        return [
+            (start_time, start_time + length)
+            for start_time in (self.start_time + timedelta(weeks=self.interval_weeks * i)
+                               for i in range(self.occurrences))
+        ]
+
+    def conflicts(self, occurrences: List[Tuple[datetime, datetime]]) -> List[int]:
+        """
+        Positions of the occurrences overlapping another booking of the court, read with one query over the
+        span of the series. Bookings of this series itself are ignored so a series can be moved onto itself.
+        """
+        if not occurrences:
+            return []
+        booked = Booking.objects.filter(court_id=self.court_id,
+                                        start_time__lt=occurrences[-1][1],
+                                        end_time__gt=occurrences[0][0])
+        if self.pk:
+            booked = booked.exclude(series=self)
+        booked = booked.order_by("start_time").values_list("start_time", "end_time")
+        starts = [start_time for start_time, _ in booked]
+        ends = [end_time for _, end_time in booked]
+        return [
+            position for position, (start_time, end_time) in enumerate(occurrences)
+            if bisect_right(ends, start_time) < bisect_left(starts, end_time)
+        ]
+
+    def book(self, skip: List[int] = ()) -> list:
+        """
+        Save the series and insert its occurrences with one bulk_create, leaving out the positions in skip.
+        The caller checks conflicts first, a booking made in between still fails the exclusion constraint.
+        """
+        from bookings.signals import bookings_created
+
+        skip = set(skip)
+        try:
+            with transaction.atomic():
+                self.save()
+                bookings = Booking.objects.bulk_create([
+                    Booking(court=self.court,
+                            account=self.account,
+                            series=self,
+                            start_time=start_time,
+                            end_time=end_time,
+                            duration=self.duration)
+                    for position, (start_time, end_time) in enumerate(self.expand())
+                    if position not in skip
+                ])
+                bookings_created.send(sender=Booking, bookings=bookings)
+        except IntegrityError as e:
+            if is_overlap_error(e):
+                raise SlotNotAvailable() from e
+            raise
+        return bookings
+
+    def upcoming(self, now: datetime):
+        return self.bookings.filter(start_time__gt=now)
+
+    def cancel(self, now: datetime) -> int:
+        """
+        Delete the occurrences that have not started with one DELETE.
+        The per-booking post_delete signal is not sent, bookings_deleted covers the whole set instead.
+        Nothing references a booking, so the DELETE is issued directly rather than through the deletion collector.
+        """
+        from bookings.signals import bookings_deleted
+
+        with transaction.atomic():
+            upcoming = self.upcoming(now).select_related("court", "account__user")
+            bookings = list(upcoming)
+            connection = connections[upcoming.db]
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    f"DELETE FROM {connection.ops.quote_name(Booking._meta.db_table)} "
+                    f"WHERE {connection.ops.quote_name(Booking._meta.pk.column)} = ANY(%s)",
+                    [[booking.pk for booking in bookings]],
+                )
+            bookings_deleted.send(sender=Booking, bookings=bookings)
+        return len(bookings)
+
+    def reschedule(self, now: datetime, start_time: datetime, duration: int) -> list:
+        """
+        Move the occurrences that have not started by the shift from the series start to start_time and give
+        them a new duration, with one UPDATE. The exclusion constraint is checked once the UPDATE is done, so
+        occurrences may move into each other's old slots. It rejects the whole update with SlotNotAvailable,
+        callers check conflicts() first to report the occurrences in the way.
+        """
+        from bookings.signals import bookings_updated
+
+        shift = start_time - self.start_time
+        try:
+            with transaction.atomic():
+                upcoming = self.upcoming(now)
+                previous = {pk: (old_start, old_end)
+                            for pk, old_start, old_end in upcoming.values_list("pk", "start_time", "end_time")}
+                upcoming.update(start_time=F("start_time") + shift,
+                                end_time=F("start_time") + shift + timedelta(hours=duration),
+                                duration=duration)
+                self.start_time = start_time
+                self.duration = duration
+                self.save(update_fields=["start_time", "duration"])
+                bookings = list(Booking.objects.filter(pk__in=previous).select_related("court", "account__user"))
+                bookings_updated.send(sender=Booking, bookings=bookings, previous=previous)
+        except IntegrityError as e:
+            if is_overlap_error(e):
+                raise SlotNotAvailable() from e
+            raise
+        return bookings
@@ -0,0 +1,137 @@
+import asyncio
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+from channels.db import database_sync_to_async
+from channels.layers import get_channel_layer
+from django.conf import settings
+from django.db import IntegrityError, router, transaction
+from django.db.models.signals import post_save
+
+from bookings.conflict_index import CourtIntervals, conflict_index
+from bookings.models import Booking, SlotNotAvailable
+from bookings.models.booking import is_overlap_error
+from utils.logging import logger
+
+SUCCESS = {"status": "success"}
+REJECTED = {"status": "error", "details": "Slot not available"}
+
+
+class BookingRequest(NamedTuple):
+    booking: Booking
+    reply_channel: str
+
+
+def insert_bookings(bookings: List[Booking]) -> List[Optional[SlotNotAvailable]]:
+    """
+    Insert bookings with one statement and send the post_save signals bulk_create skips.
+    When the exclusion constraint turns the statement down, because another process booked in between,
+    every booking is retried on its own so only the conflicting ones fail.
+
+    :return: None for every inserted booking and the SlotNotAvailable error of every rejected one.
+    """
+    if not bookings:
+        return []
+    using = router.db_for_write(Booking)
+    try:
+        with transaction.atomic(using=using):
+            Booking.objects.using(using).bulk_create(bookings)
+            for booking in bookings:
+                post_save.send(sender=Booking, instance=booking, created=True, raw=False,
+                               using=using, update_fields=None)
+        return [None] * len(bookings)
+    except IntegrityError as e:
+        if not is_overlap_error(e):
+            raise
+
+    errors = []
+    for booking in bookings:
+        booking.pk = None
+        try:
+            booking.save(using=using)
+            errors.append(None)
+        except SlotNotAvailable as e:
+            errors.append(e)
+    return errors
+
+
+def decide(court_id: int, requests: List[BookingRequest]) -> Tuple[List[BookingRequest], List[BookingRequest]]:
+    """Split a batch of one court, in arrival order, into the requests that fit and the ones that conflict."""
+    booked = conflict_index.intervals(court_id)
+    taken = CourtIntervals()
+    winners, losers = [], []
+    for position, request in enumerate(requests):
+        start_time, end_time = request.booking.start_time, request.booking.end_time
+        # An overlap in a stale court is confirmed against the database before it rejects
+        conflict = booked.overlaps(start_time, end_time) and \
+            conflict_index.confirmed(court_id, booked, start_time, end_time)
+        if conflict or taken.overlaps(start_time, end_time):
+            losers.append(request)
+        else:
+            taken.add(-position - 1, start_time, end_time)
+            winners.append(request)
+    return winners, losers
+
+
+class BookingPipeline:
+    """
+    Serializes the bookings of each court through one asyncio task on the event loop.
+
+    Requests that arrive while a batch is being written queue up behind it. The worker decides the next batch
+    in memory, answers the conflicting requests straight away and inserts the rest with one statement.
+    Answers go to the reply channel of the request as "event" messages, the consumer forwards them as is.
+    The worker of a court ends once its queue is empty.
+    """
+
+    def __init__(self):
+        self.queues: Dict[int, asyncio.Queue] = {}
+        self.workers: Dict[int, asyncio.Task] = {}
+
+    @property
+    def batch_size(self) -> int:
+        return getattr(settings, "BOOKING_PIPELINE_BATCH_SIZE", 100)
+
+    async def submit(self, booking: Booking, reply_channel: str) -> None:
+        queue = self.queues.get(booking.court_id)
+        if queue is None:
+            queue = self.queues[booking.court_id] = asyncio.Queue()
+            self.workers[booking.court_id] = asyncio.create_task(self._work(booking.court_id, queue))
+        queue.put_nowait(BookingRequest(booking, reply_channel))
+
+    async def join(self) -> None:
+        """Wait until every queued request has been answered."""
+        while self.workers:
+            await asyncio.gather(*self.workers.values())
+
+    async def _work(self, court_id: int, queue: asyncio.Queue) -> None:
+        channel_layer = get_channel_layer()
+        try:
+            while not queue.empty():
+                batch = [queue.get_nowait() for _ in range(min(queue.qsize(), self.batch_size))]
+                await self._process(channel_layer, court_id, batch)
+        finally:
+            # No await between the last empty() check and here, so no request can be left behind
+            del self.queues[court_id]
+            del self.workers[court_id]
+
+    async def _process(self, channel_layer, court_id: int, batch: List[BookingRequest]) -> None:
+        unanswered = batch
+        try:
+            winners, losers = await database_sync_to_async(decide)(court_id, batch)
+            for request in losers:
+                await reply(channel_layer, request, REJECTED)
+
+            unanswered = winners
+            errors = await database_sync_to_async(insert_bookings)([request.booking for request in winners])
+            for request, error in zip(winners, errors):
+                await reply(channel_layer, request, REJECTED if error else SUCCESS)
+        except Exception as e:
+            logger.exception("Booking pipeline error")
+            for request in unanswered:
+                await reply(channel_layer, request, {"status": "error", "details": str(e)})
+
+
+async def reply(channel_layer, request: BookingRequest, body: dict) -> None:
+    await channel_layer.send(request.reply_channel, {"type": "event", "body": body})
+
+
+pipeline = BookingPipeline()
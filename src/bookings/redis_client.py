@@ -0,0 +1,17 @@
+from functools import lru_cache
+
+import redis
+from django.conf import settings
+
+
+@lru_cache(maxsize=None)
+def _client(url: str) -> redis.Redis:
+    return redis.Redis.from_url(url)
+
+
+def client(setting: str) -> redis.Redis:
+    """
+    Client of the Redis at the URL in the named setting, or of the cache's Redis when it is unset.
+    Clients are kept per URL, so modules sharing a Redis share its connection pool.
+    """
+    return _client(getattr(settings, setting, None) or settings.CACHES["default"]["LOCATION"])
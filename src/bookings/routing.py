@@ -3,5 +3,5 @@ from . import consumers
 
 
 urlpatterns = [
-    path("ws/bookings", consumers.BookingsConsumer.as_asgi(), name="bookings-ws")
+    path("ws/bookings", consumers.AsyncBookingsConsumer.as_asgi(), name="bookings-ws")
 ]
\ No newline at end of file
@@ -1,7 +1,14 @@
+from datetime import timedelta
+
 from rest_framework import serializers
 
 from . import models
 
+# Most courts a single sub or unsub message may list
+MAX_SUBSCRIPTIONS = 100
+# Widest window a snapshot on subscribe may cover
+MAX_SNAPSHOT_WINDOW = timedelta(days=31)
+
 
 class BookedSerializer(serializers.ModelSerializer):
     class Meta:
@@ -26,14 +33,54 @@ class ConsumerTypeSerializer(serializers.Serializer):
     type_choices = [("sub","Subscribe"),
                     ("unsub","Unsubscribe"),
                     ("book","Book"),
+                    ("move","Move"),
                     ("cancel","Cancel")]
 
     type = serializers.ChoiceField(type_choices)
 
 
 
+class ConsumerSnapshotSerializer(serializers.Serializer):
+    start_time = serializers.DateTimeField()
+    end_time = serializers.DateTimeField()
+
+    def validate(self, data):
+        if not data["start_time"] < data["end_time"] <= data["start_time"] + MAX_SNAPSHOT_WINDOW:
+            raise serializers.ValidationError(f"A snapshot covers at most {MAX_SNAPSHOT_WINDOW.days} days")
+        return data
+
+
+class CursorsField(serializers.Field):
+    """One event stream cursor for every court of the message, or a map of court_id to that court's cursor."""
+
+    default_error_messages = {
+        "invalid": "Expected a cursor or a map of court_id to cursor.",
+        "max_length": f"Resume at most {MAX_SUBSCRIPTIONS} courts at a time.",
+    }
+
+    def to_internal_value(self, data):
+        cursor = serializers.RegexField(r"^\d+(-\d+)?$", max_length=42)
+        if isinstance(data, str):
+            return cursor.run_validation(data)
+        if not isinstance(data, dict):
+            self.fail("invalid")
+        if len(data) > MAX_SUBSCRIPTIONS:
+            self.fail("max_length")
+        court_id = serializers.UUIDField()
+        return {str(court_id.run_validation(key)): cursor.run_validation(value) for key, value in data.items()}
+
+
 class ConsumerSubSerializer(serializers.Serializer):
-    court_id = serializers.UUIDField()
+    court_id = serializers.UUIDField(required=False)
+    court_ids = serializers.ListField(child=serializers.UUIDField(), required=False, max_length=MAX_SUBSCRIPTIONS)
+    location = serializers.CharField(required=False, max_length=100)
+    snapshot = ConsumerSnapshotSerializer(required=False)
+    since = CursorsField(required=False)
+
+    def validate(self, data):
+        if not data.keys() & {"court_id", "court_ids", "location"}:
+            raise serializers.ValidationError("court_id, court_ids or location is required")
+        return data
 
 
 class ConsumerBookSerializer(serializers.Serializer):
@@ -41,5 +88,10 @@ class ConsumerBookSerializer(serializers.Serializer):
     start_time = serializers.DateTimeField()
     duration = serializers.IntegerField()
 
+class ConsumerMoveSerializer(serializers.Serializer):
+    booking_id = serializers.UUIDField()
+    start_time = serializers.DateTimeField()
+    duration = serializers.IntegerField()
+
 class ConsumerCancelSerializer(serializers.Serializer):
     booking_id = serializers.UUIDField()
\ No newline at end of file
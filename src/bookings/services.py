@@ -0,0 +1,123 @@
+from datetime import datetime, timedelta, timezone
+from typing import Tuple
+
+from asgiref.sync import sync_to_async
+from django.core.exceptions import NON_FIELD_ERRORS, ValidationError
+
+from accounts.models import Account
+from courts.models import Court
+
+from . import conflict_index, holds
+from .models import Booking
+
+
+class InvalidBookingTime(ValidationError):
+    """Raised when a booking starts in the past or does not fit in the court's opening hours."""
+
+    def __init__(self):
+        super().__init__({NON_FIELD_ERRORS: ["Invalid start time or duration"]})
+
+    def __str__(self):
+        return "Invalid start time or duration"
+
+
+class BookingService:
+    """
+    Books courts for one account, shared by the GraphQL mutation and the WebSocket consumer.
+
+    A booking costs one court query and the insert. Conflicts are turned down by the in-process conflict index
+    and by slot holds without a query, and by the exclusion constraint on insert, so there is no overlap query.
+    """
+
+    def __init__(self, account: Account):
+        self.account = account
+
+    @staticmethod
+    def period(start_time: datetime, duration: int) -> Tuple[datetime, datetime]:
+        """Naive start times are taken as UTC."""
+        if start_time.tzinfo is None:
+            start_time = start_time.replace(tzinfo=timezone.utc)
+        start_time = start_time.astimezone(timezone.utc)
+        return start_time, start_time + timedelta(hours=duration)
+
+    @staticmethod
+    def within_opening_hours(court: Court, start_time: datetime, end_time: datetime) -> bool:
+        """Bookings start after the court opens and end before it closes, compared on the UTC clock."""
+        return court.open < start_time.time() and end_time.time() < court.close
+
+    @staticmethod
+    def validate(court: Court, start_time: datetime, end_time: datetime) -> None:
+        """Bookings start in the future and fit in the opening hours."""
+        if start_time < datetime.now(timezone.utc) or not BookingService.within_opening_hours(court, start_time, end_time):
+            raise InvalidBookingTime()
+
+    def _check(self, court_id: int, start_time: datetime, end_time: datetime, exclude: int = None) -> None:
+        conflict_index.check(court_id, start_time, end_time, exclude)
+        holds.check(court_id, start_time, end_time, self.account.id)
+
+    def prepare(self, start_time: datetime, duration: int, **court_lookup) -> Booking:
+        """Validate a booking of the court matching court_lookup and return it unsaved."""
+        start_time, end_time = self.period(start_time, duration)
+        court = Court.objects.get(**court_lookup)
+        self.validate(court, start_time, end_time)
+
+        self._check(court.id, start_time, end_time)
+        return Booking(court=court,
+                       account=self.account,
+                       start_time=start_time,
+                       end_time=end_time,
+                       duration=duration)
+
+    def book(self, start_time: datetime, duration: int, **court_lookup) -> Booking:
+        """Validate and insert a booking, raises SlotNotAvailable when the slot is taken."""
+        booking = self.prepare(start_time, duration, **court_lookup)
+        booking.save()
+        return booking
+
+    def move(self, booking_id, start_time: datetime, duration: int) -> Booking:
+        """
+        Move a booking of the account to a new start and duration on the same court, with one query for the
+        booking and one UPDATE. Its own period never counts as a conflict.
+        """
+        booking = Booking.objects.select_related("court", "account__user").get(booking_id=booking_id,
+                                                                                account=self.account)
+        start_time, end_time = self.period(start_time, duration)
+        self.validate(booking.court, start_time, end_time)
+
+        self._check(booking.court_id, start_time, end_time, booking.id)
+        booking.move(start_time, end_time, duration)
+        return booking
+
+    async def aprepare(self, start_time: datetime, duration: int, **court_lookup) -> Booking:
+        """prepare() for async callers, the court is read with the async ORM."""
+        start_time, end_time = self.period(start_time, duration)
+        court = await Court.objects.aget(**court_lookup)
+        self.validate(court, start_time, end_time)
+
+        # Redis round trip and, the first time a court is checked, the conflict index load
+        await sync_to_async(self._check)(court.id, start_time, end_time)
+        return Booking(court=court,
+                       account=self.account,
+                       start_time=start_time,
+                       end_time=end_time,
+                       duration=duration)
+
+    async def abook(self, start_time: datetime, duration: int, **court_lookup) -> Booking:
+        booking = await self.aprepare(start_time, duration, **court_lookup)
+        await booking.asave()
+        return booking
+
+    async def amove(self, booking_id, start_time: datetime, duration: int) -> Booking:
+        booking = await Booking.objects.select_related("court", "account__user").aget(booking_id=booking_id,
+                                                                                       account=self.account)
+        start_time, end_time = self.period(start_time, duration)
+        self.validate(booking.court, start_time, end_time)
+
+        await sync_to_async(self._check)(booking.court_id, start_time, end_time, booking.id)
+        await sync_to_async(booking.move)(start_time, end_time, duration)
+        return booking
+
+    async def acancel(self, booking_id) -> None:
+        booking = await Booking.objects.select_related("court", "account__user").aget(booking_id=booking_id,
+                                                                                       account=self.account)
+        await booking.adelete()
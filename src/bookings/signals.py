@@ -1,42 +1,67 @@
 from datetime import timedelta,datetime
+from django.db import transaction
 from django.db.models.signals import post_save,post_delete,pre_save
-from django.dispatch import receiver
+from django.dispatch import Signal, receiver
 from asgiref.sync import async_to_sync
 from channels.layers import get_channel_layer
 
+from courts import availability_cache, free_interval_store
+from courts.availability import court_windows
 
-from . import models,tasks,serializers
+from . import coalescing,conflict_index,event_stream,models,snapshots,tasks,serializers
 
+# Sent with the bookings of a bulk_create, which skips post_save: bookings_created.send(sender=Booking, bookings=[...])
+bookings_created = Signal()
+# Sent with the bookings removed by one set-based delete, which skips post_delete
+bookings_deleted = Signal()
+# Sent with the bookings changed by one set-based update and their previous (start_time, end_time) by pk
+bookings_updated = Signal()
 
-@receiver(pre_save, sender=models.Booking)
-def send_messages_before_save(sender, instance, **kwargs):
-    new_booking = instance
-
-    try:
-        old_booking = models.Booking.objects.get(booking_id=new_booking.booking_id)
-        
-        channel_layer = get_channel_layer()
-
-        serializer = serializers.CancelledSerializer(old_booking)
-        sub = f"court_{old_booking.court.court_id}"
 
-        details = {"cancelled": serializer.data}
-        async_to_sync(channel_layer.group_send)(
-            sub, {
-                "type": "event",
-                "body": details
-            }
-        )
-        
-    except models.Booking.DoesNotExist:
-        pass
+@receiver(pre_save, sender=models.Booking)
+def remember_previous_booking(sender, instance, **kwargs):
+    """
+    Note the court and period an updated booking had. Nothing is released here: the update can still be
+    turned down by the exclusion constraint, post_save releases the old period once it went through.
+    Booking.move passes the old period along as moved_from, which saves this lookup.
+    """
+    booking = instance
+    booking.previous_booking = None
+    if booking._state.adding or getattr(booking, "moved_from", None):
+        return
 
+    old_booking = models.Booking.objects.select_related("court").filter(pk=booking.pk).first()
+    if old_booking is not None and (old_booking.court_id, old_booking.start_time, old_booking.end_time) != \
+            (booking.court_id, booking.start_time, booking.end_time):
+        booking.previous_booking = old_booking
 
 
 @receiver(post_save, sender=models.Booking)
 def send_messages_on_save(sender, instance, created, **kwargs):
 
     booking = instance
+
+    previous = getattr(booking, "previous_booking", None)
+    moved_from = getattr(booking, "moved_from", None)
+    if moved_from:
+        previous = models.Booking(court=booking.court, start_time=moved_from[0], end_time=moved_from[1])
+    if previous is not None:
+        conflict_index.conflict_index.remove(previous.court_id, booking.id)
+        availability_cache.invalidate(previous.court_id,
+                                      previous.start_time,
+                                      previous.end_time)
+        free_interval_store.release_booking(previous.court,
+                                            court_windows(previous.court),
+                                            previous.start_time,
+                                            previous.end_time)
+
+    conflict_index.booking_saved(booking)
+    availability_cache.invalidate(booking.court_id,
+                                  booking.start_time,
+                                  booking.end_time)
+    free_interval_store.occupy_booking(booking.court,
+                                       booking.start_time,
+                                       booking.end_time)
     
     if created: 
         tasks.send_confirmation.apply_async(args=(
@@ -69,24 +94,30 @@ def send_messages_on_save(sender, instance, created, **kwargs):
         eta=datetime.now()+timedelta(minutes=2)
     )
 
-    channel_layer = get_channel_layer()
-    
     serializer = serializers.BookedSerializer(booking)
-    sub = f"court_{booking.court.court_id}"
 
-    details = {"booked": serializer.data}
-    async_to_sync(channel_layer.group_send)(
-        sub, {
-            "type": "event",
-            "body": details
-        }
-    )
+    if previous is not None and previous.court_id == booking.court_id:
+        details = {"moved": {"from": serializers.CancelledSerializer(previous).data, "to": serializer.data}}
+    else:
+        if previous is not None:
+            send_court_event(previous.court, {"cancelled": serializers.CancelledSerializer(previous).data})
+        details = {"booked": serializer.data}
+    send_court_event(booking.court, details)
         
 
 @receiver(post_delete, sender=models.Booking)
 def send_messages_on_delete(sender, instance, **kwargs):
 
     booking = instance
+
+    conflict_index.booking_removed(booking)
+    availability_cache.invalidate(booking.court_id,
+                                  booking.start_time,
+                                  booking.end_time)
+    free_interval_store.release_booking(booking.court,
+                                        court_windows(booking.court),
+                                        booking.start_time,
+                                        booking.end_time)
     
     tasks.send_cancellation.apply_async(args=(
             booking.account.user.email,
@@ -98,15 +129,161 @@ def send_messages_on_delete(sender, instance, **kwargs):
 
     tasks.send_cancel_admin_notification.apply_async(args=[str(booking)])
 
-    channel_layer = get_channel_layer()
-
     serializer = serializers.CancelledSerializer(booking)
-    sub = f"court_{booking.court.court_id}"
+    send_court_event(booking.court, {"cancelled": serializer.data})
+
+
+@receiver(bookings_created, sender=models.Booking)
+def send_messages_on_bulk_create(sender, bookings, **kwargs):
+    """One confirmation per account, one admin notification and one "booked" event per court for the whole batch."""
+
+    by_court = {}
+    by_account = {}
+    for booking in bookings:
+        conflict_index.booking_saved(booking)
+        availability_cache.invalidate(booking.court_id,
+                                      booking.start_time,
+                                      booking.end_time)
+        free_interval_store.occupy_booking(booking.court,
+                                           booking.start_time,
+                                           booking.end_time)
+        by_court.setdefault(booking.court_id, []).append(booking)
+        by_account.setdefault(booking.account_id, []).append(booking)
+
+        # Reminders are due at different times, they stay one per booking
+        tasks.send_reminders.apply_async(args=(
+            booking.account.user.email,
+            booking.court.name,
+            booking.start_time,
+            booking.duration
+        ), eta=booking.start_time - timedelta(hours=12))
+
+    for account_bookings in by_account.values():
+        tasks.send_bulk_confirmation.apply_async(args=(
+            account_bookings[0].account.user.email,
+            [(booking.court.name, booking.start_time, booking.duration) for booking in account_bookings]
+        ))
+
+    tasks.send_admin_notification.apply_async(args=["\n".join(str(booking) for booking in bookings)])
+
+    for court_bookings in by_court.values():
+        court = court_bookings[0].court
+
+        tasks.send_worker_reminders.apply_async(
+            args=(str(court.court_id),court.name),
+            eta=datetime.now()+timedelta(minutes=2)
+        )
+
+    send_court_events(bookings, "booked", serializers.BookedSerializer)
+
+
+def send_court_event(court, details):
+    """
+    Send a booking event to the court's group once the current transaction commits, so a rolled back
+    or rejected change is never announced. The event is tagged with the court's next version and with its
+    cursor in the court's event stream, from which a reconnecting client replays what it missed.
+    With BOOKING_EVENT_TICK_MS set, the event goes out with the court's other events of that tick.
+    """
+    transaction.on_commit(lambda: _send_court_event(court, details))
 
-    details = {"cancelled": serializer.data}
-    async_to_sync(channel_layer.group_send)(
+
+def _send_court_event(court, details):
+    details["version"] = snapshots.next_version(court.court_id)
+    details["cursor"] = event_stream.append(court.court_id, details)
+    sub = f"court_{court.court_id}"
+    if coalescing.enabled():
+        coalescing.coalescer.send(sub, details)
+        return
+
+    async_to_sync(get_channel_layer().group_send)(
         sub, {
             "type": "event",
             "body": details
         }
-    )
\ No newline at end of file
+    )
+
+
+def send_court_events(bookings, key, serializer_class, previous=None):
+    """
+    One event per court carrying the bookings of that court as a list under key.
+    With previous, the (start_time, end_time) the bookings had before, the event also lists those as cancelled.
+    """
+    by_court = {}
+    for booking in bookings:
+        by_court.setdefault(booking.court_id, []).append(booking)
+
+    for court_bookings in by_court.values():
+        serializer = serializer_class(court_bookings, many=True)
+
+        details = {key: serializer.data}
+        if previous is not None:
+            details["cancelled"] = [
+                serializers.CancelledSerializer(models.Booking(start_time=previous[booking.pk][0],
+                                                               end_time=previous[booking.pk][1])).data
+                for booking in court_bookings
+            ]
+        send_court_event(court_bookings[0].court, details)
+
+
+@receiver(bookings_deleted, sender=models.Booking)
+def send_messages_on_bulk_delete(sender, bookings, **kwargs):
+
+    if not bookings:
+        return
+
+    for booking in bookings:
+        conflict_index.booking_removed(booking)
+        availability_cache.invalidate(booking.court_id,
+                                      booking.start_time,
+                                      booking.end_time)
+        free_interval_store.release_booking(booking.court,
+                                            court_windows(booking.court),
+                                            booking.start_time,
+                                            booking.end_time)
+
+    by_account = {}
+    for booking in bookings:
+        by_account.setdefault(booking.account_id, []).append(booking)
+    for account_bookings in by_account.values():
+        tasks.send_bulk_cancellation.apply_async(args=(
+            account_bookings[0].account.user.email,
+            [(booking.court.name, booking.start_time, booking.duration) for booking in account_bookings]
+        ))
+
+    tasks.send_cancel_admin_notification.apply_async(args=["\n".join(str(booking) for booking in bookings)])
+
+    send_court_events(bookings, "cancelled", serializers.CancelledSerializer)
+
+
+@receiver(bookings_updated, sender=models.Booking)
+def send_messages_on_bulk_update(sender, bookings, previous, **kwargs):
+
+    if not bookings:
+        return
+
+    for booking in bookings:
+        old_start_time, old_end_time = previous[booking.pk]
+        availability_cache.invalidate(booking.court_id, old_start_time, old_end_time)
+        free_interval_store.release_booking(booking.court,
+                                            court_windows(booking.court),
+                                            old_start_time,
+                                            old_end_time)
+        conflict_index.booking_removed(booking)
+        conflict_index.booking_saved(booking)
+        availability_cache.invalidate(booking.court_id,
+                                      booking.start_time,
+                                      booking.end_time)
+        free_interval_store.occupy_booking(booking.court,
+                                           booking.start_time,
+                                           booking.end_time)
+
+    by_account = {}
+    for booking in bookings:
+        by_account.setdefault(booking.account_id, []).append(booking)
+    for account_bookings in by_account.values():
+        tasks.send_bulk_booking_change.apply_async(args=(
+            account_bookings[0].account.user.email,
+            [(booking.court.name, booking.start_time, booking.duration) for booking in account_bookings]
+        ))
+
+    send_court_events(bookings, "booked", serializers.BookedSerializer, previous)
@@ -0,0 +1,48 @@
+from collections import defaultdict
+from datetime import datetime
+from typing import Dict, Iterable
+
+from django.core.cache import cache
+from rest_framework.fields import DateTimeField
+
+from .models import Booking
+
+
+def version_key(court_id) -> str:
+    return f"court_version:{court_id}"
+
+
+def next_version(court_id) -> int:
+    """
+    Version of the next booking event of the court, by its court_id UUID. Versions only go up while the
+    key lives in the cache; a client seeing a version lower than one it already has should ask for a new snapshot.
+    """
+    key = version_key(court_id)
+    cache.add(key, 0, timeout=None)
+    return cache.incr(key)
+
+
+def versions(court_ids: Iterable) -> Dict[str, int]:
+    court_ids = [str(court_id) for court_id in court_ids]
+    found = cache.get_many([version_key(court_id) for court_id in court_ids])
+    return {court_id: found.get(version_key(court_id), 0) for court_id in court_ids}
+
+
+def snapshot(court_ids: Iterable, start_time: datetime, end_time: datetime) -> Dict[str, dict]:
+    """
+    Bookings of the courts overlapping the window, with one cache round trip for the versions and one query.
+    Versions are bumped once a change has committed and are read before the bookings, so every change up to
+    the snapshot's version is in it. Changes committed between the two reads are in it too and come again as
+    events with a higher version; clients apply those on top, which leaves the booking as it already is.
+    """
+    court_versions = versions(court_ids)
+    booked = defaultdict(list)
+    field = DateTimeField()
+    for court_id, start, end in Booking.objects.filter(court__court_id__in=court_versions.keys(),
+                                                       start_time__lt=end_time,
+                                                       end_time__gt=start_time) \
+            .order_by("start_time").values_list("court__court_id", "start_time", "end_time"):
+        booked[str(court_id)].append({"start_time": field.to_representation(start),
+                                      "end_time": field.to_representation(end)})
+    return {court_id: {"version": version, "booked": booked[court_id]}
+            for court_id, version in court_versions.items()}
@@ -31,6 +31,19 @@ def send_reminders(email,court_name,start_time,duration):
 
     send_mail(subject, message, from_email, recipient_list)
 
+@shared_task
+def send_bulk_confirmation(email,bookings):
+
+    from_email = settings.DEFAULT_FROM_EMAIL
+    recipient_list = [email]
+
+    subject = 'Booking Confirmation'
+    lines = [f"{court_name} from {start_time} for {duration} hours" for court_name, start_time, duration in bookings]
+    message = "You have booked:\n" + "\n".join(lines)
+
+    send_mail(subject, message, from_email, recipient_list)
+
+
 @shared_task
 def send_booking_change(email,court_name,start_time,duration):
     
@@ -43,6 +56,19 @@ def send_booking_change(email,court_name,start_time,duration):
     send_mail(subject, message, from_email, recipient_list)
 
 
+@shared_task
+def send_bulk_booking_change(email,bookings):
+
+    from_email = settings.DEFAULT_FROM_EMAIL
+    recipient_list = [email]
+
+    subject = 'Booking Modification'
+    lines = [f"{court_name} from {start_time} for {duration} hours" for court_name, start_time, duration in bookings]
+    message = "Your bookings have been changed to:\n" + "\n".join(lines)
+
+    send_mail(subject, message, from_email, recipient_list)
+
+
 @shared_task
 def send_admin_notification(booking_info):
 
@@ -67,6 +93,19 @@ def send_cancellation(email,court_name,start_time,duration):
     send_mail(subject, message, from_email, recipient_list)
 
 
+@shared_task
+def send_bulk_cancellation(email,bookings):
+
+    from_email = settings.DEFAULT_FROM_EMAIL
+    recipient_list = [email]
+
+    subject = 'Booking Cancellation'
+    lines = [f"{court_name} from {start_time} for {duration} hours" for court_name, start_time, duration in bookings]
+    message = "You have cancelled your bookings for:\n" + "\n".join(lines)
+
+    send_mail(subject, message, from_email, recipient_list)
+
+
 @shared_task
 def send_cancel_admin_notification(booking_info):
 
@@ -1,16 +1,31 @@
+import time as time_module
+import uuid
+from concurrent.futures import ThreadPoolExecutor
 from datetime import time,timedelta
+from unittest.mock import AsyncMock, Mock, patch
 from django.utils import timezone
 from django.urls import reverse
-from django.test import TransactionTestCase
+from django.conf import settings
+from django.test import SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.contrib.auth import get_user_model
+from django.db import IntegrityError, connections, transaction
 from django.contrib.auth.models import User
 from rest_framework_simplejwt.tokens import RefreshToken
+from asgiref.sync import async_to_sync
 from channels.db import database_sync_to_async
+from channels.layers import get_channel_layer
 from channels.testing import WebsocketCommunicator
+from channels_redis.core import RedisChannelLayer
+from graphql_jwt.testcases import JSONWebTokenTestCase
 
 from accounts.models import Account
+from courts.availability import courts_availability
 from courts.models import Court
 
-from . import models,consumers,routing
+from . import coalescing,conflict_index,event_stream,holds,models,consumers,pipeline,routing,signals,snapshots
+from .groups import group_add_many, group_discard_many
+from .models import SlotNotAvailable
+from .services import BookingService
 
 
 class BookingsConsumerTestCase(TransactionTestCase):
@@ -130,3 +145,1113 @@ class BookingsConsumerTestCase(TransactionTestCase):
 
 
     
+
+
+class BookingOverlapTestCase(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        user = get_user_model().objects.create_user(email="test@email.com",
+                                                    password="Test_password1")
+        cls.account = Account.objects.create(user=user,
+                                             first_name="first",
+                                             last_name="last")
+        cls.courts = [Court.objects.create(name=f"Test court {i}",
+                                           location="Test location",
+                                           open=time(8,0),
+                                           close=time(16,0))
+                      for i in range(2)]
+        cls.start_time = (timezone.now() + timedelta(days=1)).replace(hour=10, minute=0, second=0, microsecond=0)
+        models.Booking.objects.create(court=cls.courts[0],
+                                      account=cls.account,
+                                      start_time=cls.start_time,
+                                      end_time=cls.start_time + timedelta(hours=2),
+                                      duration=2)
+
+    def book(self, court, start_time, duration):
+        return models.Booking.objects.create(court=court,
+                                             account=self.account,
+                                             start_time=start_time,
+                                             end_time=start_time + timedelta(hours=duration),
+                                             duration=duration)
+
+    def test_overlap_rejected(self):
+        for start_time, duration in [(self.start_time, 1),
+                                     (self.start_time - timedelta(hours=1), 2),
+                                     (self.start_time + timedelta(hours=1), 2),
+                                     (self.start_time - timedelta(hours=1), 4)]:
+            with self.subTest(start_time=start_time, duration=duration):
+                with self.assertRaises(SlotNotAvailable) as error:
+                    self.book(self.courts[0], start_time, duration)
+                self.assertEqual(str(error.exception), "Slot not available")
+
+        # The failed inserts rolled back to their savepoints
+        self.assertEqual(models.Booking.objects.count(), 1)
+
+    def test_adjacent_and_other_courts_allowed(self):
+        self.book(self.courts[0], self.start_time + timedelta(hours=2), 1)
+        self.book(self.courts[0], self.start_time - timedelta(hours=1), 1)
+        self.book(self.courts[1], self.start_time, 2)
+
+        self.assertEqual(models.Booking.objects.count(), 4)
+
+    def test_bulk_inserts_enforced(self):
+        with self.assertRaises(IntegrityError):
+            models.Booking.objects.bulk_create([
+                models.Booking(court=self.courts[1], account=self.account, start_time=self.start_time,
+                               end_time=self.start_time + timedelta(hours=2), duration=2),
+                models.Booking(court=self.courts[1], account=self.account, start_time=self.start_time,
+                               end_time=self.start_time + timedelta(hours=1), duration=1),
+            ])
+
+
+class ConflictIndexTestCase(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        user = get_user_model().objects.create_user(email="test@email.com",
+                                                    password="Test_password1")
+        cls.account = Account.objects.create(user=user,
+                                             first_name="first",
+                                             last_name="last")
+        cls.court = Court.objects.create(name="Test court",
+                                         location="Test location",
+                                         open=time(8,0),
+                                         close=time(16,0))
+        cls.start_time = (timezone.now() + timedelta(days=1)).replace(hour=10, minute=0, second=0, microsecond=0)
+        cls.booking = models.Booking.objects.create(court=cls.court,
+                                                    account=cls.account,
+                                                    start_time=cls.start_time,
+                                                    end_time=cls.start_time + timedelta(hours=2),
+                                                    duration=2)
+
+    def setUp(self):
+        conflict_index.conflict_index.clear()
+        conflict_index.ConflictIndexStats.reset()
+
+    def test_check_loads_once_and_rejects(self):
+        with self.assertNumQueries(1):
+            conflict_index.check(self.court.id, self.start_time + timedelta(hours=2),
+                                 self.start_time + timedelta(hours=3))
+        with self.assertNumQueries(0):
+            with self.assertRaises(SlotNotAvailable):
+                conflict_index.check(self.court.id, self.start_time + timedelta(hours=1),
+                                     self.start_time + timedelta(hours=3))
+
+        self.assertEqual(conflict_index.ConflictIndexStats.as_dict(),
+                         {"hits": 1, "misses": 1, "rejects": 1, "hit_ratio": 0.5})
+
+    def test_stale_rejection_reloaded(self):
+        # A booking another process has since cancelled
+        intervals = conflict_index.conflict_index.intervals(self.court.id)
+        intervals.add(0, self.start_time + timedelta(hours=2), self.start_time + timedelta(hours=3))
+        with self.assertNumQueries(0), self.assertRaises(SlotNotAvailable):
+            conflict_index.check(self.court.id, self.start_time + timedelta(hours=2),
+                                 self.start_time + timedelta(hours=3))
+
+        intervals.loaded_at -= conflict_index.conflict_index.fresh + 1
+        with self.subTest("Real overlap confirmed"):
+            with self.assertNumQueries(1), self.assertRaises(SlotNotAvailable):
+                conflict_index.check(self.court.id, self.start_time, self.start_time + timedelta(hours=1))
+
+        # One query finds the overlap gone and drops the court
+        with self.assertNumQueries(1):
+            conflict_index.check(self.court.id, self.start_time + timedelta(hours=2),
+                                 self.start_time + timedelta(hours=3))
+        # The next check reloads the court, which is fresh and rejects on its own
+        with self.assertNumQueries(1), self.assertRaises(SlotNotAvailable):
+            conflict_index.check(self.court.id, self.start_time, self.start_time + timedelta(hours=1))
+        with self.assertNumQueries(0), self.assertRaises(SlotNotAvailable):
+            conflict_index.check(self.court.id, self.start_time, self.start_time + timedelta(hours=1))
+        with self.assertNumQueries(0):
+            conflict_index.check(self.court.id, self.start_time + timedelta(hours=2),
+                                 self.start_time + timedelta(hours=3))
+
+    def test_kept_in_sync_by_signals(self):
+        conflict_index.check(self.court.id, self.start_time - timedelta(hours=2), self.start_time)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            models.Booking.objects.create(court=self.court,
+                                          account=self.account,
+                                          start_time=self.start_time - timedelta(hours=2),
+                                          end_time=self.start_time,
+                                          duration=2)
+        with self.assertNumQueries(0):
+            with self.assertRaises(SlotNotAvailable):
+                conflict_index.check(self.court.id, self.start_time - timedelta(hours=1), self.start_time)
+
+        self.booking.delete()
+        with self.assertNumQueries(0):
+            conflict_index.check(self.court.id, self.start_time, self.start_time + timedelta(hours=2))
+
+    def test_rolled_back_booking_not_indexed(self):
+        conflict_index.check(self.court.id, self.start_time + timedelta(hours=2), self.start_time + timedelta(hours=3))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            try:
+                with transaction.atomic():
+                    models.Booking.objects.create(court=self.court,
+                                                  account=self.account,
+                                                  start_time=self.start_time + timedelta(hours=2),
+                                                  end_time=self.start_time + timedelta(hours=3),
+                                                  duration=1)
+                    raise RuntimeError
+            except RuntimeError:
+                pass
+
+        conflict_index.check(self.court.id, self.start_time + timedelta(hours=2), self.start_time + timedelta(hours=3))
+
+
+@override_settings(CHANNEL_LAYERS={"default": {"BACKEND": "channels.layers.InMemoryChannelLayer"}})
+class BookingPipelineTestCase(TransactionTestCase):
+
+    def setUp(self):
+        conflict_index.conflict_index.clear()
+        user = get_user_model().objects.create_user(email="test@email.com",
+                                                    password="Test_password1")
+        self.account = Account.objects.create(user=user,
+                                              first_name="first",
+                                              last_name="last")
+        self.court = Court.objects.create(name="Test court",
+                                          location="Test location",
+                                          open=time(8,0),
+                                          close=time(16,0))
+        self.start_time = (timezone.now() + timedelta(days=1)).replace(hour=10, minute=0, second=0, microsecond=0)
+
+    def booking(self, start_time, duration):
+        return models.Booking(court=self.court,
+                              account=self.account,
+                              start_time=start_time,
+                              end_time=start_time + timedelta(hours=duration),
+                              duration=duration)
+
+    async def test_same_court_requests_decided_in_order(self):
+        channel_layer = get_channel_layer()
+        channels = [await channel_layer.new_channel() for _ in range(5)]
+        requests = [self.booking(self.start_time, 2),
+                    self.booking(self.start_time, 2),
+                    self.booking(self.start_time + timedelta(hours=1), 1),
+                    self.booking(self.start_time + timedelta(hours=2), 1),
+                    self.booking(self.start_time - timedelta(hours=1), 2)]
+        for booking, channel in zip(requests, channels):
+            await pipeline.pipeline.submit(booking, channel)
+        await pipeline.pipeline.join()
+
+        responses = [(await channel_layer.receive(channel))["body"] for channel in channels]
+        self.assertEqual(responses, [pipeline.SUCCESS, pipeline.REJECTED, pipeline.REJECTED,
+                                     pipeline.SUCCESS, pipeline.REJECTED])
+        self.assertEqual(await models.Booking.objects.acount(), 2)
+        self.assertEqual(pipeline.pipeline.queues, {})
+
+    def test_insert_bookings_falls_back_on_conflict(self):
+        models.Booking.objects.create(court=self.court,
+                                      account=self.account,
+                                      start_time=self.start_time,
+                                      end_time=self.start_time + timedelta(hours=1),
+                                      duration=1)
+
+        errors = pipeline.insert_bookings([self.booking(self.start_time - timedelta(hours=1), 1),
+                                           self.booking(self.start_time, 2),
+                                           self.booking(self.start_time + timedelta(hours=2), 1)])
+
+        self.assertEqual([error is not None for error in errors], [False, True, False])
+        self.assertEqual(models.Booking.objects.count(), 3)
+
+
+class CreateBookingsMutationTestCase(JSONWebTokenTestCase):
+
+    mutation = """
+        mutation CreateBookings($payloads:[CreateBookingInput!]!){
+            createBookings(payloads:$payloads){
+                data{
+                    startTime
+                    court{
+                        name
+                    }
+                }
+                errors
+            }
+        }
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create_user(email="test@email.com",
+                                                        password="Test_password1")
+        cls.account = Account.objects.create(user=cls.user,
+                                             first_name="first",
+                                             last_name="last")
+        cls.courts = [Court.objects.create(name=f"Test court {i}",
+                                           location="Test location",
+                                           open=time(8,0),
+                                           close=time(16,0))
+                      for i in range(2)]
+        cls.start_time = (timezone.now() + timedelta(days=1)).replace(hour=10, minute=0, second=0, microsecond=0)
+        models.Booking.objects.create(court=cls.courts[1],
+                                      account=cls.account,
+                                      start_time=cls.start_time,
+                                      end_time=cls.start_time + timedelta(hours=2),
+                                      duration=2)
+
+    def setUp(self):
+        self.client.authenticate(self.user)
+
+    def payload(self, court, hours_after, duration):
+        start_time = self.start_time + timedelta(hours=hours_after)
+        return {"court": court.id, "startTime": start_time.replace(tzinfo=None).isoformat(), "duration": duration}
+
+    def test_create_bookings(self):
+        payloads = [self.payload(self.courts[0], 0, 1),
+                    self.payload(self.courts[0], 1, 2),
+                    self.payload(self.courts[0], 3, 1),
+                    self.payload(self.courts[1], 2, 1)]
+
+        with patch("bookings.signals.async_to_sync") as group_send, \
+                patch("bookings.tasks.send_bulk_confirmation.apply_async") as confirmation, \
+                self.captureOnCommitCallbacks(execute=True):
+            response = self.client.execute(self.mutation, {"payloads": payloads})
+
+        self.assertIsNone(response.errors)
+        data = response.data["createBookings"]["data"]
+        self.assertEqual([booking["court"]["name"] for booking in data], ["Test court 0"] * 3 + ["Test court 1"])
+        self.assertEqual(models.Booking.objects.count(), 5)
+        # One event per court and one confirmation for the whole batch
+        self.assertEqual(group_send.call_count, 2)
+        self.assertEqual(confirmation.call_count, 1)
+        self.assertEqual(len(confirmation.call_args.kwargs["args"][1]), 4)
+
+    def test_conflicts_reject_the_whole_batch(self):
+        payloads = [self.payload(self.courts[0], 0, 2),
+                    self.payload(self.courts[0], 1, 1),
+                    self.payload(self.courts[1], 1, 1),
+                    self.payload(self.courts[1], 2, 1)]
+
+        response = self.client.execute(self.mutation, {"payloads": payloads})
+
+        self.assertIsNone(response.errors)
+        self.assertIsNone(response.data["createBookings"]["data"])
+        self.assertEqual(response.data["createBookings"]["errors"],
+                         ["__all__: Slot 1 not available",
+                          "__all__: Slot 2 not available",
+                          "__all__: Slot 3 not available"])
+        self.assertEqual(models.Booking.objects.count(), 1)
+
+    def test_times_validated_like_single_bookings(self):
+        # Offsets are converted to UTC, not dropped
+        local = (self.start_time + timedelta(hours=4)).replace(tzinfo=None).isoformat() + "+02:00"
+        with patch("bookings.signals.async_to_sync"):
+            response = self.client.execute(self.mutation, {"payloads": [
+                {"court": self.courts[0].id, "startTime": local, "duration": 1}]})
+        self.assertIsNone(response.data["createBookings"]["errors"])
+        self.assertEqual(models.Booking.objects.get(court=self.courts[0]).start_time,
+                         self.start_time + timedelta(hours=2))
+
+        response = self.client.execute(self.mutation, {"payloads": [self.payload(self.courts[0], -2, 1)]})
+        self.assertEqual(response.data["createBookings"]["errors"], ["__all__: Invalid start time or duration"])
+
+    def test_query_count(self):
+        payloads = [self.payload(court, hours, 1) for court in self.courts for hours in (3, 4)]
+
+        # User and account, courts, one range query per court, the insert and its savepoint
+        with patch("bookings.signals.async_to_sync"), self.assertNumQueries(8):
+            response = self.client.execute(self.mutation, {"payloads": payloads})
+
+        self.assertEqual(len(response.data["createBookings"]["data"]), 4)
+
+
+class BookingSeriesTestCase(JSONWebTokenTestCase):
+
+    create = """
+        mutation CreateBookingSeries($payload:CreateBookingSeriesInput!){
+            createBookingSeries(payload:$payload){
+                data{
+                    id
+                }
+                conflicts
+                errors
+            }
+        }
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create_user(email="test@email.com",
+                                                        password="Test_password1")
+        cls.account = Account.objects.create(user=cls.user,
+                                             first_name="first",
+                                             last_name="last")
+        cls.court = Court.objects.create(name="Test court",
+                                         location="Test location",
+                                         open=time(8,0),
+                                         close=time(20,0))
+        cls.start_time = (timezone.now() + timedelta(days=1)).replace(hour=10, minute=0, second=0, microsecond=0)
+        cls.booking = models.Booking.objects.create(court=cls.court,
+                                                    account=cls.account,
+                                                    start_time=cls.start_time + timedelta(weeks=2, hours=1),
+                                                    end_time=cls.start_time + timedelta(weeks=2, hours=2),
+                                                    duration=1)
+
+    def setUp(self):
+        self.client.authenticate(self.user)
+
+    def payload(self, **kwargs):
+        payload = {"court": self.court.id,
+                   "startTime": self.start_time.replace(tzinfo=None).isoformat(),
+                   "duration": 2,
+                   "occurrences": 4}
+        payload.update(kwargs)
+        return payload
+
+    def series(self, occurrences=4):
+        series = models.BookingSeries(court=self.court,
+                                      account=self.account,
+                                      start_time=self.start_time + timedelta(hours=3),
+                                      duration=2,
+                                      occurrences=occurrences)
+        series.book()
+        return series
+
+    def test_conflicts_reported_per_occurrence(self):
+        response = self.client.execute(self.create, {"payload": self.payload()})
+
+        self.assertEqual(response.data["createBookingSeries"]["errors"],
+                         [f"__all__: Occurrence 3 on {self.start_time + timedelta(weeks=2):%Y-%m-%d %H:%M} not available"])
+        self.assertEqual(models.BookingSeries.objects.count(), 0)
+        self.assertEqual(models.Booking.objects.count(), 1)
+
+    def test_skip_conflicts(self):
+        with patch("bookings.signals.async_to_sync") as group_send, self.captureOnCommitCallbacks(execute=True):
+            response = self.client.execute(self.create, {"payload": self.payload(skipConflicts=True)})
+
+        self.assertIsNone(response.errors)
+        self.assertEqual(response.data["createBookingSeries"]["conflicts"],
+                         [(self.start_time + timedelta(weeks=2)).isoformat()])
+        series = models.BookingSeries.objects.get()
+        self.assertEqual(list(series.bookings.values_list("start_time", flat=True).order_by("start_time")),
+                         [self.start_time + timedelta(weeks=week) for week in (0, 1, 3)])
+        self.assertEqual(group_send.call_count, 1)
+
+    def test_skip_conflicts_books_at_least_one(self):
+        response = self.client.execute(self.create, {"payload": self.payload(
+            startTime=(self.start_time + timedelta(weeks=2)).replace(tzinfo=None).isoformat(), occurrences=1,
+            skipConflicts=True)})
+
+        self.assertEqual(response.data["createBookingSeries"]["errors"],
+                         [f"__all__: Occurrence 1 on {self.start_time + timedelta(weeks=2):%Y-%m-%d %H:%M} not available"])
+        self.assertEqual(models.BookingSeries.objects.count(), 0)
+
+    def test_cancel_is_one_delete(self):
+        series = self.series()
+
+        with patch("bookings.signals.async_to_sync") as group_send, \
+                patch("bookings.tasks.send_cancellation.apply_async") as cancellation, \
+                patch("bookings.tasks.send_bulk_cancellation.apply_async") as bulk_cancellation, \
+                self.captureOnCommitCallbacks(execute=True), \
+                self.assertNumQueries(4):
+            # Savepoint, the occurrences, one DELETE, release
+            self.assertEqual(series.cancel(timezone.now()), 4)
+
+        self.assertFalse(series.bookings.exists())
+        self.assertEqual(cancellation.call_count, 0)
+        self.assertEqual(bulk_cancellation.call_count, 1)
+        self.assertEqual(group_send.call_count, 1)
+
+    def test_reschedule(self):
+        series = self.series(occurrences=3)
+        mutation = """
+            mutation UpdateBookingSeries($id:Int!, $payload:UpdateBookingSeriesInput!){
+                updateBookingSeries(id:$id, payload:$payload){
+                    errors
+                }
+            }
+        """
+        conflicting = {"startTime": (self.start_time - timedelta(hours=1)).replace(tzinfo=None).isoformat(),
+                       "duration": 3}
+        response = self.client.execute(mutation, {"id": series.id, "payload": conflicting})
+        self.assertEqual(response.data["updateBookingSeries"]["errors"],
+                         [f"__all__: Occurrence 3 on "
+                          f"{self.start_time + timedelta(weeks=2, hours=-1):%Y-%m-%d %H:%M} not available"])
+
+        moved = {"startTime": (self.start_time - timedelta(hours=1)).replace(tzinfo=None).isoformat(),
+                 "duration": 1}
+        with patch("bookings.signals.async_to_sync"), \
+                patch("bookings.tasks.send_booking_change.apply_async") as change, \
+                patch("bookings.tasks.send_bulk_booking_change.apply_async") as bulk_change:
+            response = self.client.execute(mutation, {"id": series.id, "payload": moved})
+
+        self.assertIsNone(response.data["updateBookingSeries"]["errors"])
+        self.assertEqual(list(series.bookings.values_list("start_time", "end_time").order_by("start_time")),
+                         [(self.start_time + timedelta(weeks=week, hours=-1),
+                           self.start_time + timedelta(weeks=week)) for week in range(3)])
+        # One notice listing every moved occurrence
+        self.assertEqual(change.call_count, 0)
+        self.assertEqual(bulk_change.call_count, 1)
+        email, moved_bookings = bulk_change.call_args.kwargs["args"]
+        self.assertEqual(email, self.user.email)
+        self.assertEqual([start_time for _, start_time, _ in moved_bookings],
+                         [self.start_time + timedelta(weeks=week, hours=-1) for week in range(3)])
+
+    def test_reschedule_by_whole_intervals(self):
+        series = self.series()
+        start_time = series.start_time + timedelta(weeks=series.interval_weeks)
+        self.assertEqual(series.conflicts([(occurrence_start + timedelta(weeks=series.interval_weeks),
+                                            occurrence_end + timedelta(weeks=series.interval_weeks))
+                                           for occurrence_start, occurrence_end in series.expand()]), [])
+
+        with patch("bookings.signals.async_to_sync"), \
+                patch("bookings.tasks.send_bulk_booking_change.apply_async"), \
+                self.captureOnCommitCallbacks(execute=True):
+            series.reschedule(timezone.now(), start_time, 2)
+
+        self.assertEqual(list(series.bookings.values_list("start_time", flat=True).order_by("start_time")),
+                         [start_time + timedelta(weeks=week) for week in range(4)])
+
+
+class SlotHoldsTestCase(JSONWebTokenTestCase):
+
+    hold = """
+        mutation HoldSlot($payload:HoldSlotInput!){
+            holdSlot(payload:$payload){
+                data{
+                    holdId
+                    expiresAt
+                }
+                errors
+            }
+        }
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.users = [get_user_model().objects.create_user(email=f"test{i}@email.com",
+                                                          password="Test_password1")
+                     for i in range(2)]
+        cls.accounts = [Account.objects.create(user=user,
+                                               first_name="first",
+                                               last_name="last")
+                        for user in cls.users]
+        cls.court = Court.objects.create(name="Test court",
+                                         location="Test location",
+                                         open=time(8,0),
+                                         close=time(16,0))
+        cls.start_time = (timezone.now() + timedelta(days=1)).replace(hour=10, minute=0, second=0, microsecond=0)
+
+    def setUp(self):
+        holds.client().delete(holds.court_key(self.court.id))
+        conflict_index.conflict_index.clear()
+        self.client.authenticate(self.users[0])
+
+    def hold_slot(self, hours_after=0, duration=2):
+        start_time = self.start_time + timedelta(hours=hours_after)
+        payload = {"court": self.court.id, "startTime": start_time.replace(tzinfo=None).isoformat(),
+                   "duration": duration}
+        with patch("bookings.holds.async_to_sync"):
+            return self.client.execute(self.hold, {"payload": payload}).data["holdSlot"]
+
+    def test_hold_blocks_other_accounts(self):
+        hold_id = self.hold_slot()["data"]["holdId"]
+
+        self.client.authenticate(self.users[1])
+        self.assertEqual(self.hold_slot(hours_after=1)["errors"], ["__all__: Slot not available"])
+        self.assertIsNone(self.hold_slot(hours_after=2)["errors"])
+
+        with self.assertRaises(SlotNotAvailable):
+            holds.check(self.court.id, self.start_time, self.start_time + timedelta(hours=1), self.accounts[1].id)
+        holds.check(self.court.id, self.start_time, self.start_time + timedelta(hours=1), self.accounts[0].id)
+
+        free = courts_availability([self.court], self.start_time.date(), self.start_time.date())[0]["slots"]
+        self.assertEqual([(slot.start_time, slot.end_time) for slot in free], [(time(8,0), time(10,0)),
+                                                                               (time(14,0), time(16,0))])
+        self.assertIsNotNone(holds.get(hold_id))
+
+    def test_hold_blocks_bulk_and_series_bookings(self):
+        self.hold_slot(hours_after=1, duration=1)
+        bulk = """
+            mutation CreateBookings($payloads:[CreateBookingInput!]!){
+                createBookings(payloads:$payloads){
+                    errors
+                }
+            }
+        """
+        create_series = """
+            mutation CreateBookingSeries($payload:CreateBookingSeriesInput!){
+                createBookingSeries(payload:$payload){
+                    data{
+                        id
+                    }
+                    errors
+                }
+            }
+        """
+        update_series = """
+            mutation UpdateBookingSeries($id:Int!, $payload:UpdateBookingSeriesInput!){
+                updateBookingSeries(id:$id, payload:$payload){
+                    errors
+                }
+            }
+        """
+
+        def payload(hours_after, **kwargs):
+            start_time = self.start_time + timedelta(hours=hours_after)
+            return dict({"court": self.court.id, "startTime": start_time.replace(tzinfo=None).isoformat(),
+                         "duration": 1}, **kwargs)
+
+        self.client.authenticate(self.users[1])
+        response = self.client.execute(bulk, {"payloads": [payload(0), payload(1)]}).data["createBookings"]
+        self.assertEqual(response["errors"], ["__all__: Slot 2 not available"])
+        response = self.client.execute(create_series, {"payload": payload(1, occurrences=2)}).data
+        self.assertEqual(response["createBookingSeries"]["errors"],
+                         [f"__all__: Occurrence 1 on {self.start_time + timedelta(hours=1):%Y-%m-%d %H:%M} "
+                          f"not available"])
+
+        with patch("bookings.signals.async_to_sync"):
+            response = self.client.execute(create_series, {"payload": payload(3, occurrences=2)}).data
+        series_id = int(response["createBookingSeries"]["data"]["id"])
+        response = self.client.execute(update_series, {"id": series_id, "payload": {
+            "startTime": (self.start_time + timedelta(hours=1)).replace(tzinfo=None).isoformat(), "duration": 1}})
+        self.assertEqual(response.data["updateBookingSeries"]["errors"],
+                         [f"__all__: Occurrence 1 on {self.start_time + timedelta(hours=1):%Y-%m-%d %H:%M} "
+                          f"not available"])
+        self.assertEqual(models.Booking.objects.count(), 2)
+
+        # The account holding the slot books it
+        self.client.authenticate(self.users[0])
+        with patch("bookings.signals.async_to_sync"):
+            response = self.client.execute(bulk, {"payloads": [payload(1)]}).data["createBookings"]
+        self.assertIsNone(response["errors"])
+
+    def test_confirm(self):
+        hold_id = self.hold_slot()["data"]["holdId"]
+        mutation = """
+            mutation ConfirmHold($holdId:String!){
+                confirmHold(holdId:$holdId){
+                    data{
+                        startTime
+                        duration
+                    }
+                    errors
+                }
+            }
+        """
+
+        self.client.authenticate(self.users[1])
+        response = self.client.execute(mutation, {"holdId": hold_id}).data["confirmHold"]
+        self.assertEqual(response["errors"], ["Hold not found or expired"])
+
+        self.client.authenticate(self.users[0])
+        with patch("bookings.signals.async_to_sync"):
+            response = self.client.execute(mutation, {"holdId": hold_id}).data["confirmHold"]
+        self.assertEqual(response["data"], {"startTime": self.start_time.isoformat(), "duration": 2})
+        self.assertIsNone(holds.get(hold_id))
+        self.assertEqual(models.Booking.objects.get().account, self.accounts[0])
+
+    def test_expired_holds_dropped_on_read(self):
+        hold_id = self.hold_slot()["data"]["holdId"]
+
+        with patch("bookings.holds._time.time", return_value=time_module.time() + holds.max_seconds() + 1):
+            self.assertEqual(holds.court_holds([self.court.id]), {self.court.id: []})
+        self.assertEqual(holds.client().zcard(holds.court_key(self.court.id)), 0)
+        self.assertIsNone(holds.get(hold_id))
+
+
+class BookingServiceTestCase(JSONWebTokenTestCase):
+
+    mutation = """
+        mutation CreateBooking($payload:CreateBookingInput!){
+            createBooking(payload:$payload){
+                data{
+                    startTime
+                }
+                errors
+            }
+        }
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create_user(email="test@email.com",
+                                                        password="Test_password1")
+        cls.account = Account.objects.create(user=cls.user,
+                                             first_name="first",
+                                             last_name="last")
+        cls.court = Court.objects.create(name="Test court",
+                                         location="Test location",
+                                         open=time(8,0),
+                                         close=time(16,0))
+        cls.start_time = (timezone.now() + timedelta(days=1)).replace(hour=10, minute=0, second=0, microsecond=0)
+
+    def setUp(self):
+        holds.client().delete(holds.court_key(self.court.id))
+        conflict_index.conflict_index.clear()
+        # Known bookings of the court are loaded once per process, not per request
+        conflict_index.conflict_index.intervals(self.court.id)
+        self.client.authenticate(self.user)
+
+    def test_graphql_query_budget(self):
+        payload = {"court": self.court.id, "startTime": self.start_time.replace(tzinfo=None).isoformat(),
+                   "duration": 2}
+
+        # User and account, the court, the insert in its savepoint
+        with patch("bookings.signals.async_to_sync"), self.captureOnCommitCallbacks(execute=True), \
+                self.assertNumQueries(6):
+            response = self.client.execute(self.mutation, {"payload": payload})
+        self.assertEqual(response.data["createBooking"]["data"], {"startTime": self.start_time.isoformat()})
+
+        # User and account, the court, then turned down by the conflict index before the insert
+        with self.assertNumQueries(3):
+            response = self.client.execute(self.mutation, {"payload": payload})
+        self.assertEqual(response.data["createBooking"]["errors"], ["__all__: Slot not available"])
+
+    def test_websocket_query_budget(self):
+        consumer = consumers.BookingsConsumer()
+        consumer.scope = {"user": get_user_model().objects.get(id=self.user.id)}
+        consumer.send_json = Mock()
+        content = {"type": "book", "court_id": str(self.court.court_id),
+                   "start_time": self.start_time.isoformat(), "duration": 2}
+
+        # Account, the court, the insert in its savepoint
+        with patch("bookings.signals.async_to_sync"), self.captureOnCommitCallbacks(execute=True), \
+                self.assertNumQueries(5):
+            consumer.receive_json(content)
+        consumer.send_json.assert_called_with({"status": "success"})
+
+        # The court, then turned down by the conflict index
+        with self.assertNumQueries(1):
+            consumer.receive_json(content)
+        consumer.send_json.assert_called_with({"status": "error", "details": "Slot not available"})
+
+        content["start_time"] = (self.start_time - timedelta(days=2)).isoformat()
+        consumer.receive_json(content)
+        consumer.send_json.assert_called_with({"status": "error", "details": "Invalid start time or duration"})
+
+
+class MoveBookingTestCase(JSONWebTokenTestCase):
+
+    mutation = """
+        mutation MoveBooking($bookingId:UUID!, $startTime:DateTime!, $duration:Int!){
+            moveBooking(bookingId:$bookingId, startTime:$startTime, duration:$duration){
+                data{
+                    startTime
+                    endTime
+                }
+                errors
+            }
+        }
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create_user(email="test@email.com",
+                                                        password="Test_password1")
+        cls.account = Account.objects.create(user=cls.user,
+                                             first_name="first",
+                                             last_name="last")
+        cls.court = Court.objects.create(name="Test court",
+                                         location="Test location",
+                                         open=time(8,0),
+                                         close=time(16,0))
+        cls.start_time = (timezone.now() + timedelta(days=1)).replace(hour=10, minute=0, second=0, microsecond=0)
+        cls.bookings = [models.Booking.objects.create(court=cls.court,
+                                                      account=cls.account,
+                                                      start_time=cls.start_time + timedelta(hours=hours),
+                                                      end_time=cls.start_time + timedelta(hours=hours + duration),
+                                                      duration=duration)
+                        for hours, duration in [(0, 2), (3, 1)]]
+
+    def setUp(self):
+        holds.client().delete(holds.court_key(self.court.id))
+        conflict_index.conflict_index.clear()
+        conflict_index.conflict_index.intervals(self.court.id)
+        self.client.authenticate(self.user)
+
+    def variables(self, hours_after, duration):
+        return {"bookingId": str(self.bookings[0].booking_id),
+                "startTime": (self.start_time + timedelta(hours=hours_after)).isoformat(),
+                "duration": duration}
+
+    def test_move_sends_one_event(self):
+        with patch("bookings.signals.async_to_sync") as group_send, \
+                patch("bookings.tasks.send_booking_change.apply_async") as change, \
+                self.captureOnCommitCallbacks(execute=True), \
+                self.assertNumQueries(6):
+            # User and account, the booking with its court, the UPDATE in its savepoint
+            response = self.client.execute(self.mutation, self.variables(1, 2))
+
+        self.assertEqual(response.data["moveBooking"]["data"],
+                         {"startTime": (self.start_time + timedelta(hours=1)).isoformat(),
+                          "endTime": (self.start_time + timedelta(hours=3)).isoformat()})
+        self.assertEqual(group_send.return_value.call_count, 1)
+        body = group_send.return_value.call_args.args[1]["body"]
+        self.assertEqual(list(body), ["moved", "version", "cursor"])
+        self.assertEqual(body["moved"]["from"]["start_time"], self.start_time.isoformat().replace("+00:00", "Z"))
+        self.assertEqual(body["moved"]["to"]["start_time"],
+                         (self.start_time + timedelta(hours=1)).isoformat().replace("+00:00", "Z"))
+        self.assertEqual(change.call_count, 1)
+
+        # The index follows the move
+        conflict_index.check(self.court.id, self.start_time, self.start_time + timedelta(hours=1))
+        with self.assertRaises(SlotNotAvailable):
+            conflict_index.check(self.court.id, self.start_time + timedelta(hours=2),
+                                 self.start_time + timedelta(hours=3))
+
+    def test_conflicts_exclude_only_the_booking_itself(self):
+        response = self.client.execute(self.mutation, self.variables(2, 2))
+        self.assertEqual(response.data["moveBooking"]["errors"], ["__all__: Slot not available"])
+
+        # Past the index, the constraint rejects it and the booking keeps its period
+        conflict_index.conflict_index.clear()
+        booking = models.Booking.objects.get(pk=self.bookings[0].pk)
+        with patch("bookings.signals.async_to_sync"), self.assertRaises(SlotNotAvailable):
+            booking.move(self.start_time + timedelta(hours=2), self.start_time + timedelta(hours=4), 2)
+        self.assertEqual(booking.start_time, self.start_time)
+        self.assertFalse(hasattr(booking, "moved_from"))
+
+    def test_overlapping_update_releases_nothing(self):
+        booking = models.Booking.objects.get(pk=self.bookings[1].pk)
+        booking.start_time = self.start_time + timedelta(hours=1)
+        booking.end_time = self.start_time + timedelta(hours=2)
+
+        with patch("bookings.signals.async_to_sync") as group_send, \
+                patch("bookings.signals.availability_cache.invalidate") as invalidate, \
+                patch("bookings.signals.free_interval_store.release_booking") as release, \
+                self.captureOnCommitCallbacks(execute=True) as callbacks, \
+                self.assertRaises(SlotNotAvailable):
+            booking.save()
+
+        self.assertEqual(callbacks, [])
+        invalidate.assert_not_called()
+        release.assert_not_called()
+        group_send.assert_not_called()
+        # The booking keeps its period in the index
+        with self.assertRaises(SlotNotAvailable):
+            conflict_index.check(self.court.id, self.start_time + timedelta(hours=3),
+                                 self.start_time + timedelta(hours=4))
+
+    def test_websocket_move(self):
+        consumer = consumers.BookingsConsumer()
+        consumer.scope = {"user": self.user}
+        consumer.send_json = Mock()
+
+        with patch("bookings.signals.async_to_sync"):
+            consumer.receive_json({"type": "move", "booking_id": str(self.bookings[1].booking_id),
+                                   "start_time": (self.start_time + timedelta(hours=4)).isoformat(),
+                                   "duration": 1})
+
+        consumer.send_json.assert_called_with({"status": "success"})
+        self.assertEqual(models.Booking.objects.get(pk=self.bookings[1].pk).start_time,
+                         self.start_time + timedelta(hours=4))
+
+
+@override_settings(CHANNEL_LAYERS={"default": {"BACKEND": "channels.layers.InMemoryChannelLayer"}})
+class AsyncBookingsConsumerTestCase(TransactionTestCase):
+
+    def setUp(self):
+        conflict_index.conflict_index.clear()
+        self.user = get_user_model().objects.create_user(email="test@email.com",
+                                                         password="Test_password1")
+        self.account = Account.objects.create(user=self.user,
+                                              first_name="first",
+                                              last_name="last")
+        self.court = Court.objects.create(name="Test court",
+                                          location="Test location",
+                                          open=time(8,0),
+                                          close=time(16,0))
+        holds.client().delete(holds.court_key(self.court.id))
+        self.start_time = (timezone.now() + timedelta(days=1)).replace(hour=10, minute=0, second=0, microsecond=0)
+
+    async def connect(self):
+        application = consumers.AsyncBookingsConsumer.as_asgi()
+
+        async def authenticated(scope, receive, send):
+            return await application(dict(scope, user=self.user), receive, send)
+
+        communicator = WebsocketCommunicator(authenticated, "/ws/bookings")
+        connected, _ = await communicator.connect()
+        self.assertTrue(connected)
+        return communicator
+
+    async def request(self, communicator, content):
+        await communicator.send_json_to(content)
+        return await communicator.receive_json_from()
+
+    async def test_protocol(self):
+        communicator = await self.connect()
+        court_id = str(self.court.court_id)
+
+        self.assertEqual(await self.request(communicator, {"type": "sub", "court_id": court_id}),
+                         {"status": "success"})
+
+        book = {"type": "book", "court_id": court_id, "start_time": self.start_time.isoformat(), "duration": 2}
+        await communicator.send_json_to(book)
+        responses = [await communicator.receive_json_from(), await communicator.receive_json_from()]
+        self.assertIn({"status": "success"}, responses)
+        self.assertIn("booked", [key for response in responses for key in response])
+
+        self.assertEqual(await self.request(communicator, dict(book, start_time=(self.start_time + timedelta(hours=1)).isoformat())),
+                         {"status": "error", "details": "Slot not available"})
+
+        self.assertEqual(await self.request(communicator, {"type": "unsub", "court_id": court_id}),
+                         {"status": "success"})
+
+        booking = await models.Booking.objects.aget(court=self.court)
+        self.assertEqual(await self.request(communicator, {"type": "move", "booking_id": str(booking.booking_id),
+                                                           "start_time": (self.start_time + timedelta(hours=2)).isoformat(),
+                                                           "duration": 1}),
+                         {"status": "success"})
+        self.assertEqual(await self.request(communicator, {"type": "cancel", "booking_id": str(booking.booking_id)}),
+                         {"status": "success"})
+        self.assertFalse(await models.Booking.objects.aexists())
+
+        response = await self.request(communicator, {"type": "nope"})
+        self.assertEqual(response["status"], "error")
+        await communicator.disconnect()
+
+    async def test_subscribe_many(self):
+        other = await Court.objects.acreate(name="Other court", location="Other location",
+                                            open=time(8,0), close=time(16,0))
+        communicator = await self.connect()
+        court_ids = [str(self.court.court_id), str(other.court_id)]
+
+        self.assertEqual(await self.request(communicator, {"type": "sub", "location": "Test location"}),
+                         {"status": "success", "court_ids": court_ids[:1]})
+        self.assertEqual(await self.request(communicator, {"type": "sub", "court_ids": court_ids}),
+                         {"status": "success", "court_ids": court_ids})
+
+        layer = get_channel_layer()
+        await layer.group_send(f"court_{other.court_id}", {"type": "event", "body": {"ping": 1}})
+        self.assertEqual(await communicator.receive_json_from(), {"ping": 1})
+
+        self.assertEqual(await self.request(communicator, {"type": "unsub", "court_ids": court_ids}),
+                         {"status": "success", "court_ids": court_ids})
+        await layer.group_send(f"court_{other.court_id}", {"type": "event", "body": {"ping": 2}})
+        self.assertTrue(await communicator.receive_nothing())
+
+        response = await self.request(communicator, {"type": "sub"})
+        self.assertEqual(response["status"], "error")
+
+        # A location names no more courts than court_ids may
+        await Court.objects.acreate(name="Third court", location="Test location", open=time(8,0), close=time(16,0))
+        with patch("bookings.serializers.MAX_SUBSCRIPTIONS", 1):
+            response = await self.request(communicator, {"type": "sub", "location": "Test location"})
+        self.assertEqual(response, {"status": "error",
+                                    "details": [{"message": "A message names at most 1 courts", "code": "invalid"}]})
+        await communicator.disconnect()
+
+    async def test_subscribe_with_snapshot(self):
+        court_id = str(self.court.court_id)
+        service = BookingService(self.account)
+        await service.abook(self.start_time, 1, court_id=self.court.court_id)
+        communicator = await self.connect()
+
+        window = {"start_time": self.start_time.isoformat(),
+                  "end_time": (self.start_time + timedelta(days=1)).isoformat()}
+        response = await self.request(communicator, {"type": "sub", "court_id": court_id, "snapshot": window})
+        snapshot = response["snapshot"][court_id]
+        self.assertEqual(snapshot["booked"], [{
+            "start_time": self.start_time.isoformat().replace("+00:00", "Z"),
+            "end_time": (self.start_time + timedelta(hours=1)).isoformat().replace("+00:00", "Z"),
+        }])
+
+        booking = await service.abook(self.start_time + timedelta(hours=2), 1, court_id=self.court.court_id)
+        event = await communicator.receive_json_from()
+        self.assertIn("booked", event)
+        self.assertEqual(event["version"], snapshot["version"] + 1)
+
+        await service.acancel(booking.booking_id)
+        event = await communicator.receive_json_from()
+        self.assertIn("cancelled", event)
+        self.assertEqual(event["version"], snapshot["version"] + 2)
+
+        window["end_time"] = (self.start_time + timedelta(days=60)).isoformat()
+        response = await self.request(communicator, {"type": "sub", "court_id": court_id, "snapshot": window})
+        self.assertEqual(response["status"], "error")
+        await communicator.disconnect()
+
+    def test_snapshot_before_commit(self):
+        court_id = str(self.court.court_id)
+        window = (self.start_time, self.start_time + timedelta(days=1))
+        before = snapshots.snapshot([court_id], *window)[court_id]
+
+        def snapshot_elsewhere():
+            try:
+                return snapshots.snapshot([court_id], *window)[court_id]
+            finally:
+                connections.close_all()
+
+        with patch("bookings.signals.async_to_sync") as group_send:
+            with transaction.atomic():
+                models.Booking.objects.create(court=self.court,
+                                              account=self.account,
+                                              start_time=self.start_time,
+                                              end_time=self.start_time + timedelta(hours=1),
+                                              duration=1)
+                # Another worker reading now sees neither the booking nor a new version
+                with ThreadPoolExecutor(max_workers=1) as executor:
+                    during = executor.submit(snapshot_elsewhere).result()
+                group_send.assert_not_called()
+        after = snapshots.snapshot([court_id], *window)[court_id]
+
+        self.assertEqual(during, before)
+        event = group_send.return_value.call_args.args[1]["body"]
+        self.assertEqual(event["version"], before["version"] + 1)
+        self.assertEqual(after["version"], event["version"])
+        self.assertEqual(len(after["booked"]), 1)
+
+    async def test_resume_from_cursor(self):
+        court_id = str(self.court.court_id)
+        service = BookingService(self.account)
+        communicator = await self.connect()
+        await self.request(communicator, {"type": "sub", "court_id": court_id})
+
+        seen = await service.abook(self.start_time, 1, court_id=self.court.court_id)
+        cursor = (await communicator.receive_json_from())["cursor"]
+        await communicator.disconnect()
+
+        missed = await service.abook(self.start_time + timedelta(hours=2), 1, court_id=self.court.court_id)
+        await service.acancel(seen.booking_id)
+
+        communicator = await self.connect()
+        response = await self.request(communicator, {"type": "sub", "court_id": court_id, "since": cursor})
+        replay = response["replay"][court_id]
+        self.assertEqual([next(iter(event)) for event in replay], ["booked", "cancelled"])
+        self.assertEqual(replay[0]["booked"]["start_time"],
+                         missed.start_time.isoformat().replace("+00:00", "Z"))
+        self.assertEqual(response["truncated"], [])
+
+        # Live events follow the replay
+        await service.acancel(missed.booking_id)
+        event = await communicator.receive_json_from()
+        self.assertIn("cancelled", event)
+        self.assertGreater(event["version"], replay[-1]["version"])
+        await communicator.disconnect()
+
+    async def test_resume_each_court_from_its_cursor(self):
+        other = await Court.objects.acreate(name="Other court", location="Test location",
+                                            open=time(8,0), close=time(16,0))
+        courts = [self.court, other]
+        court_ids = [str(court.court_id) for court in courts]
+        service = BookingService(self.account)
+        communicator = await self.connect()
+        await self.request(communicator, {"type": "sub", "court_ids": court_ids})
+
+        cursors = {}
+        for court in courts:
+            await service.abook(self.start_time, 1, court_id=court.court_id)
+            cursors[str(court.court_id)] = (await communicator.receive_json_from())["cursor"]
+        await communicator.disconnect()
+
+        for hours, court in [(2, other), (3, self.court)]:
+            await service.abook(self.start_time + timedelta(hours=hours), 1, court_id=court.court_id)
+
+        communicator = await self.connect()
+        response = await self.request(communicator, {"type": "sub", "court_ids": court_ids, "since": cursors})
+        self.assertEqual({court_id: [event["booked"]["start_time"] for event in events]
+                          for court_id, events in response["replay"].items()},
+                         {court_ids[0]: [(self.start_time + timedelta(hours=3)).isoformat().replace("+00:00", "Z")],
+                          court_ids[1]: [(self.start_time + timedelta(hours=2)).isoformat().replace("+00:00", "Z")]})
+        self.assertEqual(response["truncated"], [])
+
+        # Courts left out of the map are not replayed
+        response = await self.request(communicator, {"type": "sub", "court_ids": court_ids,
+                                                     "since": {court_ids[1]: cursors[court_ids[1]]}})
+        self.assertEqual(list(response["replay"]), court_ids[1:])
+
+        response = await self.request(communicator, {"type": "sub", "court_ids": court_ids,
+                                                     "since": {"not a court": "1-0"}})
+        self.assertEqual(response["status"], "error")
+        await communicator.disconnect()
+
+    @override_settings(EVENT_STREAM_MAXLEN=2)
+    def test_replay_reports_trimmed_streams(self):
+        key = str(self.court.court_id)
+        cursors = [event_stream.append(self.court.court_id, {"booked": {"minute": minute}})
+                   for minute in range(4)]
+        # Trimming is approximate, Redis trims a stream this short only when asked for an exact length
+        event_stream.client().xtrim(event_stream.stream_key(self.court.court_id), maxlen=2, approximate=False)
+
+        events, truncated = event_stream.replay([self.court.court_id], cursors[0])
+        self.assertEqual(truncated, [key])
+        self.assertEqual([event["cursor"] for event in events[key]], cursors[-2:])
+
+        events, truncated = event_stream.replay([self.court.court_id], cursors[2])
+        self.assertEqual(truncated, [])
+        self.assertEqual([event["booked"]["minute"] for event in events[key]], [3])
+
+
+class GroupsTestCase(SimpleTestCase):
+
+    async def test_redis_group_changes_are_pipelined(self):
+        config = settings.CHANNEL_LAYERS["default"]
+        if config["BACKEND"] != "channels_redis.core.RedisChannelLayer":
+            self.skipTest("The configured channel layer is not the Redis layer")
+        layer = RedisChannelLayer(**config.get("CONFIG", {}))
+        channel = await layer.new_channel()
+        groups = [f"court_test_{i}" for i in range(50)]
+
+        with patch.object(layer, "group_add") as group_add:
+            await group_add_many(layer, groups, channel)
+        group_add.assert_not_called()
+
+        connection = layer.connection(0)
+        members = [await connection.zscore(layer._group_key(group), channel) for group in groups]
+        self.assertNotIn(None, members)
+
+        await group_discard_many(layer, groups, channel)
+        members = [await connection.zscore(layer._group_key(group), channel) for group in groups]
+        self.assertEqual(members, [None] * len(groups))
+
+
+@override_settings(BOOKING_EVENT_TICK_MS=50)
+class EventCoalescingTestCase(TestCase):
+
+    def setUp(self):
+        coalescing.CoalescingStats.reset()
+        self.courts = [Court(court_id=uuid.uuid4()), Court(court_id=uuid.uuid4())]
+        self.layer = Mock(group_send=AsyncMock())
+        patcher = patch("bookings.coalescing.get_channel_layer", return_value=self.layer)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def frames(self):
+        return {group: message["body"] for (group, message), _ in self.layer.group_send.call_args_list}
+
+    def test_events_of_a_tick_share_a_frame(self):
+        first, second = self.courts
+        with self.captureOnCommitCallbacks(execute=True):
+            for minute in range(3):
+                signals.send_court_event(first, {"booked": {"minute": minute}})
+            signals.send_court_event(second, {"cancelled": {"minute": 0}})
+        self.layer.group_send.assert_not_called()
+
+        # Sent by the timer one tick later
+        time_module.sleep(0.3)
+        frames = self.frames()
+        events = frames[f"court_{first.court_id}"]["events"]
+        self.assertEqual([event["booked"]["minute"] for event in events], [0, 1, 2])
+        self.assertEqual([event["version"] for event in events],
+                         list(range(events[0]["version"], events[0]["version"] + 3)))
+        self.assertIn("cancelled", frames[f"court_{second.court_id}"])
+
+        self.assertEqual(coalescing.CoalescingStats.as_dict(),
+                         {"events": 4, "frames": 2, "compression_ratio": 2.0})
+
+    def test_stats_logged_once_per_interval(self):
+        coalescing.coalescer.send(f"court_{self.courts[0].court_id}", {"booked": {}})
+        coalescing.CoalescingStats._reported_at -= 301
+        with self.assertLogs("django", "INFO") as logs:
+            coalescing.coalescer.flush()
+        self.assertEqual(logs.output,
+                         ["INFO:django:Booking event coalescing: {'events': 1, 'frames': 1, 'compression_ratio': 1.0}"])
+
+        with self.assertNoLogs("django", "INFO"):
+            coalescing.coalescer.send(f"court_{self.courts[0].court_id}", {"booked": {}})
+            coalescing.coalescer.flush()
+
+    @override_settings(BOOKING_EVENT_TICK_MS=0)
+    def test_disabled(self):
+        with patch("bookings.signals.async_to_sync") as group_send, self.captureOnCommitCallbacks(execute=True):
+            signals.send_court_event(self.courts[0], {"booked": {}})
+            signals.send_court_event(self.courts[0], {"booked": {}})
+
+        self.assertEqual(group_send.return_value.call_count, 2)
+        self.assertEqual(coalescing.CoalescingStats.frames, 0)
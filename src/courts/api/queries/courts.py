@@ -1,9 +1,56 @@
+import base64
 import graphene
+from datetime import date
+from django.utils import timezone as django_timezone
+from itertools import dropwhile, islice
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
 from courts.models import Court
-from courts.api.schema import CourtOutput, CourtListOutput
+from courts.availability import (MAX_AVAILABILITY_DAYS, MAX_STREAM_DAYS, courts_availability,
+                                 iter_courts_availability)
+from courts.slot_search import next_available_slots
+from courts.api.schema import (CourtOutput, CourtListOutput, CourtAvailabilityOutput,
+                               CourtSlotConnection, CourtSlotConnectionOutput, NextAvailableSlotsOutput)
+from utils.common.availability_engine import time_to_minute
 
 from utils.model_helpers import retrieve_object_by_id
 
+MAX_SLOTS_PER_PAGE = 1000
+
+MAX_NEXT_SLOTS = 50
+
+
+def validate_availability_args(date_from, date_to, min_duration, timezone, max_days=MAX_AVAILABILITY_DAYS):
+    """Error message for invalid availability arguments, None when they are valid."""
+    if date_from > date_to:
+        return "dateFrom must be earlier than dateTo"
+    if (date_to - date_from).days >= max_days:
+        return f"dateFrom to dateTo covers at most {max_days} days"
+    if min_duration < 0:
+        return "minDuration must be a positive integer"
+    try:
+        ZoneInfo(timezone)
+    except (ZoneInfoNotFoundError, ValueError):
+        return f"Unknown timezone {timezone}"
+    return None
+
+
+def slot_position(slot):
+    """Slots are streamed ordered by (date, court id, start minute)."""
+    return slot["date"], slot["court"].id, time_to_minute(slot["start_time"])
+
+
+def encode_slot_cursor(slot):
+    day, court_id, start = slot_position(slot)
+    return base64.urlsafe_b64encode(f"{day.isoformat()}|{court_id}|{start}".encode()).decode()
+
+
+def decode_slot_cursor(cursor):
+    try:
+        day, court_id, start = base64.urlsafe_b64decode(cursor.encode()).decode().split("|")
+        return date.fromisoformat(day), int(court_id), int(start)
+    except (ValueError, UnicodeDecodeError):
+        raise ValueError(f"Invalid cursor {cursor}")
+
 
 class CourtQuery(graphene.ObjectType):
     get_court = graphene.Field(CourtOutput, id=graphene.Int(required=True))
@@ -12,6 +59,29 @@ class CourtQuery(graphene.ObjectType):
                                     location=graphene.String(),
                                     page=graphene.Int(),
                                     per_page=graphene.Int(),)
+    courts_availability = graphene.Field(CourtAvailabilityOutput,
+                                         court_ids=graphene.List(graphene.UUID, required=True),
+                                         date_from=graphene.Date(required=True),
+                                         date_to=graphene.Date(required=True),
+                                         min_duration=graphene.Int(),
+                                         timezone=graphene.String(),
+                                         description="Free slots of several courts over a date range")
+    courts_availability_slots = graphene.Field(CourtSlotConnectionOutput,
+                                               court_ids=graphene.List(graphene.UUID, required=True),
+                                               date_from=graphene.Date(required=True),
+                                               date_to=graphene.Date(required=True),
+                                               min_duration=graphene.Int(),
+                                               timezone=graphene.String(),
+                                               first=graphene.Int(),
+                                               after=graphene.String(),
+                                               description="Free slots of several courts as a connection, "
+                                                           "computed page by page for long ranges")
+    next_available_slots = graphene.Field(NextAvailableSlotsOutput,
+                                          duration=graphene.Int(required=True),
+                                          after=graphene.DateTime(),
+                                          court_ids=graphene.List(graphene.UUID),
+                                          limit=graphene.Int(),
+                                          description="The earliest slots of duration hours on any court")
 
     def resolve_get_court(root, info, id):
         data = retrieve_object_by_id(model=Court, id=id)
@@ -25,3 +95,55 @@ class CourtQuery(graphene.ObjectType):
             queryset = queryset.filter(location__icontains=location)
 
         return CourtListOutput.from_queryset(queryset, per_page, page)
+
+    def resolve_courts_availability(root, info, court_ids, date_from, date_to, min_duration=0, timezone="UTC"):
+        error = validate_availability_args(date_from, date_to, min_duration, timezone)
+        if error:
+            return CourtAvailabilityOutput.error400(error)
+
+        courts = Court.objects.filter(court_id__in=court_ids)
+        data = courts_availability(courts, date_from, date_to, min_duration, timezone=timezone)
+        return CourtAvailabilityOutput.success(data=data)
+
+    def resolve_courts_availability_slots(root, info, court_ids, date_from, date_to, min_duration=0, timezone="UTC",
+                                          first=100, after=None):
+        error = validate_availability_args(date_from, date_to, min_duration, timezone, MAX_STREAM_DAYS)
+        if error:
+            return CourtSlotConnectionOutput.error400(error)
+        if not 0 < first <= MAX_SLOTS_PER_PAGE:
+            return CourtSlotConnectionOutput.error400(f"first must be between 1 and {MAX_SLOTS_PER_PAGE}")
+
+        position = None
+        if after:
+            try:
+                position = decode_slot_cursor(after)
+            except ValueError as e:
+                return CourtSlotConnectionOutput.error400(str(e))
+            date_from = max(date_from, position[0])
+
+        courts = Court.objects.filter(court_id__in=court_ids)
+        slots = iter_courts_availability(courts, date_from, date_to, min_duration, timezone=timezone)
+        if position:
+            slots = dropwhile(lambda slot: slot_position(slot) <= position, slots)
+        page = list(islice(slots, first + 1))
+
+        edges = [CourtSlotConnection.Edge(node=slot, cursor=encode_slot_cursor(slot)) for slot in page[:first]]
+        page_info = graphene.relay.PageInfo(
+            has_next_page=len(page) > first,
+            has_previous_page=position is not None,
+            start_cursor=edges[0].cursor if edges else None,
+            end_cursor=edges[-1].cursor if edges else None,
+        )
+        return CourtSlotConnectionOutput.success(data=CourtSlotConnection(edges=edges, page_info=page_info))
+
+    def resolve_next_available_slots(root, info, duration, after=None, court_ids=None, limit=5):
+        if duration < 1:
+            return NextAvailableSlotsOutput.error400("duration must be at least 1 hour")
+        if not 0 < limit <= MAX_NEXT_SLOTS:
+            return NextAvailableSlotsOutput.error400(f"limit must be between 1 and {MAX_NEXT_SLOTS}")
+
+        courts = Court.objects.all()
+        if court_ids:
+            courts = courts.filter(court_id__in=court_ids)
+        data = next_available_slots(courts, duration, after or django_timezone.now(), limit)
+        return NextAvailableSlotsOutput.success(data=data)
@@ -3,5 +3,13 @@ from .courts import *
 __all__ = [
     "CourtType",
     "CourtOutput",
-    "CourtListOutput"
+    "CourtListOutput",
+    "CourtSlotType",
+    "CourtAvailabilityType",
+    "CourtAvailabilityOutput",
+    "CourtSlotNode",
+    "CourtSlotConnection",
+    "CourtSlotConnectionOutput",
+    "NextSlotType",
+    "NextAvailableSlotsOutput"
 ]
\ No newline at end of file
@@ -17,4 +17,42 @@ class CourtOutput(QueryResponse):
     data = graphene.Field(CourtType)
 
 class CourtListOutput(PaginatedModelList):
-    data = graphene.List(CourtType)
\ No newline at end of file
+    data = graphene.List(CourtType)
+
+class CourtSlotType(graphene.ObjectType):
+    date = graphene.Date()
+    day = graphene.String()
+    start_time = graphene.Time()
+    end_time = graphene.Time()
+
+
+class CourtAvailabilityType(graphene.ObjectType):
+    court = graphene.Field(CourtType)
+    slots = graphene.List(CourtSlotType)
+
+
+class CourtAvailabilityOutput(QueryResponse):
+    data = graphene.List(CourtAvailabilityType)
+
+
+class CourtSlotNode(CourtSlotType):
+    court = graphene.Field(CourtType)
+
+
+class CourtSlotConnection(graphene.relay.Connection):
+    class Meta:
+        node = CourtSlotNode
+
+
+class CourtSlotConnectionOutput(QueryResponse):
+    data = graphene.Field(CourtSlotConnection)
+
+
+class NextSlotType(graphene.ObjectType):
+    court = graphene.Field(CourtType)
+    start_time = graphene.DateTime()
+    end_time = graphene.DateTime()
+
+
+class NextAvailableSlotsOutput(QueryResponse):
+    data = graphene.List(NextSlotType)
@@ -0,0 +1,168 @@
+from collections import defaultdict
+from datetime import date, timedelta
+from itertools import groupby
+from operator import itemgetter
+from typing import Dict, Iterable, Iterator, List, Tuple
+from zoneinfo import ZoneInfo
+
+from bookings import holds
+from bookings.models import Booking
+from courts.models import Court
+from courts import availability_cache, free_interval_store
+from utils.common.availability_engine import free_intervals, merge_intervals, split_by_day, time_to_minute
+from utils.common.day_boundaries import day_boundaries
+from utils.common.slots import DaySlots, SlotList
+
+# Days of free intervals loaded at a time when streaming availability
+STREAM_CHUNK_DAYS = 31
+# Widest date range, both ends included, of an availability request answered in one response
+MAX_AVAILABILITY_DAYS = 93
+# Widest date range of a streamed or paginated availability request
+MAX_STREAM_DAYS = 366
+
+
+def date_range(date_from: date, date_to: date) -> List[date]:
+    """Every date from date_from to date_to, both included."""
+    return [date_from + timedelta(days=i) for i in range((date_to - date_from).days + 1)]
+
+
+def court_windows(court: Court) -> List[Tuple[int, int]]:
+    """A court is open for the same single window every day."""
+    opening, closing = time_to_minute(court.open), time_to_minute(court.close)
+    return [(opening, closing)] if opening < closing else []
+
+
+def bookings_by_court(court_ids: Iterable[int], dates: List[date],
+                      timezone: str = "UTC") -> Iterator[Tuple[int, Dict[date, list]]]:
+    """
+    Load the bookings of all courts overlapping the dates in one range query ordered by (court, start_time)
+    and yield (court_id, {date: [(start_minute, end_minute)]}) one court at a time.
+    Dates and minutes are on the local clock of the timezone.
+    """
+    tz = ZoneInfo(timezone)
+    range_start = day_boundaries(dates[0], timezone).utc_start
+    range_end = day_boundaries(dates[-1], timezone).utc_end
+
+    rows = Booking.objects.filter(
+        court_id__in=court_ids,
+        start_time__lt=range_end,
+        end_time__gt=range_start
+    ).order_by("court_id", "start_time").values_list("court_id", "start_time", "end_time")
+
+    for court_id, court_rows in groupby(rows.iterator(), key=itemgetter(0)):
+        day_bookings = defaultdict(list)
+        for _, start_time, end_time in court_rows:
+            for day, start_minute, end_minute in split_by_day(start_time.astimezone(tz), end_time.astimezone(tz)):
+                day_bookings[day].append((start_minute, end_minute))
+        yield court_id, day_bookings
+
+
+def compute_free_intervals(courts: List[Court], dates: List[date], buffer_minutes: int = 0,
+                           timezone: str = "UTC") -> Dict[Tuple[int, date], list]:
+    """Free minute intervals of every (court, date) pair, streaming all bookings through the sweep court by court."""
+    bookings = bookings_by_court([court.id for court in courts], dates, timezone)
+    next_court_id, day_bookings = next(bookings, (None, {}))
+
+    free = {}
+    for court in sorted(courts, key=lambda court: court.id):
+        if court.id == next_court_id:
+            court_bookings = day_bookings
+            next_court_id, day_bookings = next(bookings, (None, {}))
+        else:
+            court_bookings = {}
+        windows = court_windows(court)
+        for day in dates:
+            free[(court.id, day)] = free_intervals(windows, merge_intervals(court_bookings.get(day, [])), buffer_minutes)
+    return free
+
+
+def _compute_missing(free: Dict[Tuple[int, date], list], courts: List[Court], dates: List[date],
+                     buffer_minutes: int, timezone: str) -> Dict[Tuple[int, date], list]:
+    """Compute the (court, date) pairs not found in free with a single bookings query."""
+    missing = [(court, day) for court in courts for day in dates if (court.id, day) not in free]
+    if not missing:
+        return {}
+    missing_courts = list({court.id: court for court, _ in missing}.values())
+    missing_dates = date_range(min(day for _, day in missing), max(day for _, day in missing))
+    computed = compute_free_intervals(missing_courts, missing_dates, buffer_minutes, timezone)
+    return {key: computed[key] for key in ((court.id, day) for court, day in missing)}
+
+
+def _load_free_intervals(courts: List[Court], dates: List[date], buffer_minutes: int,
+                         timezone: str) -> Dict[Tuple[int, date], list]:
+    """
+    The default view (UTC, no buffer) is read from the incrementally maintained free interval store,
+    other variants from the availability cache. Misses are computed from a single bookings query
+    and written back. Live slot holds are subtracted afterwards.
+    """
+    courts_by_id = {court.id: court for court in courts}
+    if buffer_minutes == 0 and timezone == "UTC":
+        free, versions = free_interval_store.get_many(courts, dates)
+        computed = _compute_missing(free, courts, dates, buffer_minutes, timezone)
+        free_interval_store.set_many(courts_by_id, computed, versions)
+    else:
+        free, entries = availability_cache.get_many(courts, dates, buffer_minutes, timezone)
+        computed = _compute_missing(free, courts, dates, buffer_minutes, timezone)
+        availability_cache.set_many(courts_by_id, computed, entries, buffer_minutes, timezone)
+    free.update(computed)
+
+    # Holds are short-lived and never cached, they are taken off whatever was loaded
+    for key, held in holds.held_intervals(courts_by_id, dates, timezone).items():
+        free[key] = free_intervals(free[key], merge_intervals(held))
+    return free
+
+
+def _day_slots(day: date, intervals: list, min_minutes: int) -> DaySlots:
+    return DaySlots(day, ((start, end) for start, end in intervals if end - start >= min_minutes))
+
+
+def courts_availability(courts: Iterable[Court], date_from: date, date_to: date,
+                        min_duration: int = 0, buffer_minutes: int = 0, timezone: str = "UTC") -> List[dict]:
+    """
+    Free slots of several courts over a date range.
+
+    :param courts: The courts to compute availability for.
+    :param date_from: First date of the range.
+    :param date_to: Last date of the range, included.
+    :param min_duration: Minimum slot length in hours.
+    :param buffer_minutes: Minutes kept free after every booking.
+    :param timezone: Timezone the dates and opening hours are expressed in.
+    :return: A list of {"court": Court, "slots": SlotList} dicts ordered by court id.
+    """
+    courts = sorted(courts, key=lambda court: court.id)
+    dates = date_range(date_from, date_to)
+    if not courts or not dates:
+        return []
+
+    free = _load_free_intervals(courts, dates, buffer_minutes, timezone)
+    min_minutes = min_duration * 60
+    return [
+        dict(court=court, slots=SlotList(_day_slots(day, free[(court.id, day)], min_minutes) for day in dates))
+        for court in courts
+    ]
+
+
+def iter_courts_availability(courts: Iterable[Court], date_from: date, date_to: date,
+                             min_duration: int = 0, buffer_minutes: int = 0, timezone: str = "UTC",
+                             chunk_days: int = STREAM_CHUNK_DAYS) -> Iterator[dict]:
+    """
+    Stream the free slots of several courts one at a time, ordered by (date, court id, start time).
+    Free intervals are loaded chunk_days at a time, so the first slots are available after the first chunk
+    and memory does not grow with the length of the range.
+    Takes the same parameters as courts_availability and yields {"court", "date", "day", "start_time", "end_time"}.
+    """
+    courts = sorted(courts, key=lambda court: court.id)
+    if not courts:
+        return
+
+    min_minutes = min_duration * 60
+    chunk_from = date_from
+    while chunk_from <= date_to:
+        chunk_to = min(chunk_from + timedelta(days=chunk_days - 1), date_to)
+        dates = date_range(chunk_from, chunk_to)
+        free = _load_free_intervals(courts, dates, buffer_minutes, timezone)
+        for day in dates:
+            for court in courts:
+                for slot in _day_slots(day, free.pop((court.id, day)), min_minutes):
+                    yield dict(court=court, **slot)
+        chunk_from = chunk_to + timedelta(days=1)
@@ -0,0 +1,127 @@
+import uuid
+from datetime import date, datetime, timedelta
+from threading import Lock
+from typing import Dict, List, Tuple
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+from courts.models import Court
+
+# Widest UTC offset in use, a booking can fall on a neighbouring date in another timezone
+MAX_UTC_OFFSET = timedelta(hours=14)
+
+
+class AvailabilityCacheStats:
+    """Hit/miss counters of the availability cache for this process."""
+
+    hits: int = 0
+    misses: int = 0
+    _lock = Lock()
+
+    @classmethod
+    def record(cls, hits: int = 0, misses: int = 0) -> None:
+        with cls._lock:
+            cls.hits += hits
+            cls.misses += misses
+
+    @classmethod
+    def as_dict(cls) -> dict:
+        total = cls.hits + cls.misses
+        return {
+            "hits": cls.hits,
+            "misses": cls.misses,
+            "hit_ratio": cls.hits / total if total else 0.0,
+        }
+
+    @classmethod
+    def reset(cls) -> None:
+        with cls._lock:
+            cls.hits = 0
+            cls.misses = 0
+
+
+def cache_key(court_id: int, day: date) -> str:
+    return f"availability:{court_id}:{day.isoformat()}"
+
+
+def generation_key(court_id: int, day: date) -> str:
+    return f"availability_generation:{court_id}:{day.isoformat()}"
+
+
+def variant(court: Court, buffer_minutes: int, timezone: str) -> str:
+    """
+    All variants of a court/day live in the same cache entry so that a single delete invalidates them.
+    Opening hours are part of the variant, editing a court never serves stale windows.
+    """
+    return f"{buffer_minutes}|{timezone}|{court.open}|{court.close}"
+
+
+def _timeout() -> int:
+    return getattr(settings, "AVAILABILITY_CACHE_TIMEOUT", 900)
+
+
+def get_many(courts: List[Court], dates: List[date], buffer_minutes: int,
+             timezone: str) -> Tuple[Dict[Tuple[int, date], list], Dict[str, dict]]:
+    """
+    Fetch the cached free intervals of every (court, date) pair in one round trip.
+
+    Entries carry the generation of their court/day at the time the data behind them was read.
+    An entry from an older generation was computed before an invalidation and counts as a miss.
+
+    :return: The free intervals found, keyed by (court_id, date), and the entries to extend, keyed by cache key.
+        Entries are stamped with the current generation, so set_many cannot store data read before a later invalidation.
+    """
+    keys = {cache_key(court.id, day): (court, day) for court in courts for day in dates}
+    generation_keys = {key: generation_key(court.id, day) for key, (court, day) in keys.items()}
+    cached = cache.get_many([*keys, *generation_keys.values()])
+
+    found = {}
+    entries = {}
+    for key, (court, day) in keys.items():
+        generation = cached.get(generation_keys[key])
+        entry = cached.get(key)
+        if entry is None or entry.get("generation") != generation:
+            entry = {"generation": generation}
+        entries[key] = entry
+        intervals = entry.get(variant(court, buffer_minutes, timezone))
+        if intervals is not None:
+            found[(court.id, day)] = intervals
+
+    AvailabilityCacheStats.record(hits=len(found), misses=len(keys) - len(found))
+    return found, entries
+
+
+def set_many(courts: Dict[int, Court], computed: Dict[Tuple[int, date], list], entries: Dict[str, dict],
+             buffer_minutes: int, timezone: str) -> None:
+    """
+    Store freshly computed free intervals next to the variants already cached for the same court/day,
+    under the generation get_many saw before the bookings were read.
+    """
+    updates = {}
+    for (court_id, day), intervals in computed.items():
+        key = cache_key(court_id, day)
+        entry = updates.get(key) or dict(entries[key])
+        entry[variant(courts[court_id], buffer_minutes, timezone)] = intervals
+        updates[key] = entry
+    if updates:
+        cache.set_many(updates, _timeout())
+
+
+def invalidate(court_id: int, start_time: datetime, end_time: datetime) -> None:
+    """
+    Drop the cached availability of every date a booking can touch, whatever the timezone, once the
+    current transaction commits. The dates get a new generation, so an entry computed from a read taken
+    before the commit and written back after it is never served.
+    """
+    transaction.on_commit(lambda: _invalidate(court_id, start_time, end_time))
+
+
+def _invalidate(court_id: int, start_time: datetime, end_time: datetime) -> None:
+    first_day = (start_time - MAX_UTC_OFFSET).date()
+    last_day = (end_time + MAX_UTC_OFFSET).date()
+    days = [first_day + timedelta(days=i) for i in range((last_day - first_day).days + 1)]
+    # Kept twice as long as entries, so a late write-back from the previous generation expires first
+    cache.set_many({generation_key(court_id, day): uuid.uuid4().hex for day in days}, 2 * _timeout())
+    cache.delete_many([cache_key(court_id, day) for day in days])
@@ -0,0 +1,156 @@
+import time as _time
+import uuid
+from bisect import bisect_left, bisect_right
+from contextlib import contextmanager
+from datetime import date, datetime, timezone
+from typing import Dict, List, Tuple
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+from courts.models import Court
+from utils.common.availability_engine import Interval, split_by_day
+
+
+class FreeIntervals:
+    """
+    Sorted, disjoint free intervals of one court on one day.
+    Starts and ends are kept in two parallel lists so the interval touching a minute is found with bisect.
+    """
+
+    def __init__(self, intervals: List[Interval] = None):
+        intervals = intervals or []
+        self.starts = [start for start, _ in intervals]
+        self.ends = [end for _, end in intervals]
+
+    def as_list(self) -> List[Interval]:
+        return list(zip(self.starts, self.ends))
+
+    def occupy(self, start: int, end: int) -> None:
+        """Remove [start, end) from the free intervals, splitting the ones it cuts through."""
+        first = bisect_right(self.ends, start)
+        last = bisect_left(self.starts, end)
+        if first >= last:
+            return
+
+        pieces = []
+        if self.starts[first] < start:
+            pieces.append((self.starts[first], start))
+        if self.ends[last - 1] > end:
+            pieces.append((end, self.ends[last - 1]))
+
+        self.starts[first:last] = [piece_start for piece_start, _ in pieces]
+        self.ends[first:last] = [piece_end for _, piece_end in pieces]
+
+    def release(self, start: int, end: int, windows: List[Interval]) -> None:
+        """Give [start, end) back, clipped to the opening windows and merged with its free neighbours."""
+        for window_start, window_end in windows:
+            piece_start, piece_end = max(start, window_start), min(end, window_end)
+            if piece_start < piece_end:
+                self._insert(piece_start, piece_end)
+
+    def _insert(self, start: int, end: int) -> None:
+        first = bisect_left(self.ends, start)
+        last = bisect_right(self.starts, end)
+        if first < last:
+            start = min(start, self.starts[first])
+            end = max(end, self.ends[last - 1])
+        self.starts[first:last] = [start]
+        self.ends[first:last] = [end]
+
+
+def store_key(court: Court, day: date) -> str:
+    """Opening hours are part of the key, editing a court starts a fresh store."""
+    return f"free_intervals:{court.id}:{court.open}-{court.close}:{day.isoformat()}"
+
+
+def version_key(key: str) -> str:
+    return f"{key}:version"
+
+
+@contextmanager
+def _lock(key: str, timeout: int = 5):
+    """Serialize read-modify-write updates of a court/day across processes."""
+    lock_key = f"{key}:lock"
+    deadline = _time.monotonic() + timeout
+    while not cache.add(lock_key, 1, timeout):
+        if _time.monotonic() > deadline:
+            raise TimeoutError(f"Could not lock {key}")
+        _time.sleep(0.005)
+    try:
+        yield
+    finally:
+        cache.delete(lock_key)
+
+
+def _timeout() -> int:
+    return getattr(settings, "FREE_INTERVAL_STORE_TIMEOUT", 60 * 60 * 24 * 7)
+
+
+def get_many(courts: List[Court], dates: List[date]) -> Tuple[Dict[Tuple[int, date], List[Interval]],
+                                                             Dict[Tuple[int, date], str]]:
+    """
+    Stored free intervals of every (court, date) pair that has been built, in one round trip.
+
+    Every court/day has a version that each booking update replaces, stored intervals are only valid
+    under the version they were written with.
+
+    :return: The valid free intervals keyed by (court_id, date) and the versions of all pairs, to pass to set_many.
+    """
+    keys = {store_key(court, day): (court.id, day) for court in courts for day in dates}
+    cached = cache.get_many([*keys, *map(version_key, keys)])
+
+    found = {}
+    versions = {}
+    for key, pair in keys.items():
+        versions[pair] = cached.get(version_key(key))
+        entry = cached.get(key)
+        if entry is not None and entry["version"] == versions[pair]:
+            found[pair] = entry["intervals"]
+    return found, versions
+
+
+def set_many(courts: Dict[int, Court], free: Dict[Tuple[int, date], List[Interval]],
+             versions: Dict[Tuple[int, date], str]) -> None:
+    """
+    Store free intervals computed from the bookings table under the versions get_many returned before
+    the bookings were read. A booking committed in between has replaced the version, so the write-back
+    reads as a miss and is computed again instead of overwriting the booking's update.
+    """
+    cache.set_many({
+        store_key(courts[court_id], day): {"version": versions[(court_id, day)], "intervals": intervals}
+        for (court_id, day), intervals in free.items()
+    }, _timeout())
+
+
+def _update(court: Court, start_time: datetime, end_time: datetime, update) -> None:
+    for day, start_minute, end_minute in split_by_day(start_time.astimezone(timezone.utc),
+                                                      end_time.astimezone(timezone.utc)):
+        key = store_key(court, day)
+        with _lock(key):
+            cached = cache.get_many([key, version_key(key)])
+            version = uuid.uuid4().hex
+            # Kept twice as long as the intervals, so a late write-back under the previous version expires first
+            cache.set(version_key(key), version, 2 * _timeout())
+
+            entry = cached.get(key)
+            if entry is None or entry["version"] != cached.get(version_key(key)):
+                # Not built or outdated, the next read computes it from the bookings table
+                continue
+            free = FreeIntervals(entry["intervals"])
+            update(free, start_minute, end_minute)
+            cache.set(key, {"version": version, "intervals": free.as_list()}, _timeout())
+
+
+def occupy_booking(court: Court, start_time: datetime, end_time: datetime) -> None:
+    """Remove a new booking from the stored free intervals of every day it covers, once it is committed."""
+    transaction.on_commit(lambda: _update(court, start_time, end_time, FreeIntervals.occupy))
+
+
+def release_booking(court: Court, windows: List[Interval], start_time: datetime, end_time: datetime) -> None:
+    """Give a cancelled or moved booking back to the stored free intervals of every day it covered, once committed."""
+    transaction.on_commit(lambda: _update(
+        court, start_time, end_time,
+        lambda free, start_minute, end_minute: free.release(start_minute, end_minute, windows)
+    ))
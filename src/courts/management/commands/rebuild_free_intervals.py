@@ -0,0 +1,56 @@
+from datetime import date, timedelta
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from courts.models import Court
+from courts.availability import compute_free_intervals, date_range
+from courts import free_interval_store
+
+
+class Command(BaseCommand):
+    help = "Rebuild the per court/day free interval store from the bookings table"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--start", type=date.fromisoformat,
+                            help="First date to rebuild (YYYY-MM-DD), defaults to today")
+        parser.add_argument("--days", type=int, default=30,
+                            help="Number of days to rebuild")
+        parser.add_argument("--court", type=int, action="append", dest="courts",
+                            help="Only rebuild this court id, may be repeated")
+        parser.add_argument("--verify", action="store_true",
+                            help="Compare the store with a full recomputation instead of rebuilding it")
+
+    def handle(self, *args, **options):
+        if options["days"] < 1:
+            raise CommandError("--days must be at least 1")
+
+        courts = Court.objects.all()
+        if options["courts"]:
+            courts = courts.filter(id__in=options["courts"])
+        courts = list(courts)
+
+        start = options["start"] or timezone.now().date()
+        dates = date_range(start, start + timedelta(days=options["days"] - 1))
+        # Read before the bookings, a booking committed during the rebuild wins over it
+        stored, versions = free_interval_store.get_many(courts, dates)
+        computed = compute_free_intervals(courts, dates)
+        courts_by_id = {court.id: court for court in courts}
+
+        if not options["verify"]:
+            free_interval_store.set_many(courts_by_id, computed, versions)
+            self.stdout.write(self.style.SUCCESS(
+                f"Rebuilt {len(computed)} court days for {len(courts)} courts"
+            ))
+            return
+
+        mismatches = 0
+        for (court_id, day), intervals in computed.items():
+            if (court_id, day) in stored and stored[(court_id, day)] != intervals:
+                mismatches += 1
+                self.stdout.write(
+                    f"Court {court_id} on {day}: stored {stored[(court_id, day)]}, expected {intervals}"
+                )
+
+        if mismatches:
+            raise CommandError(f"{mismatches} of {len(stored)} stored court days differ from the bookings table")
+        self.stdout.write(self.style.SUCCESS(f"{len(stored)} stored court days match the bookings table"))
@@ -1,6 +1,8 @@
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
 from rest_framework import serializers
 
 from bookings.serializers import BookedSerializer
+from .availability import MAX_AVAILABILITY_DAYS, MAX_STREAM_DAYS
 from .models import Court
 
 class CourtListSerializer(serializers.ModelSerializer):
@@ -14,4 +16,48 @@ class CourtSerializer(serializers.ModelSerializer):
     booked = BookedSerializer(source="bookings", many=True)
     class Meta:
         model = Court
-        fields = ["court_id", "name", "location", "open", "close", "booked"]
\ No newline at end of file
+        fields = ["court_id", "name", "location", "open", "close", "booked"]
+
+class CourtsAvailabilityQuerySerializer(serializers.Serializer):
+    max_days = MAX_AVAILABILITY_DAYS
+
+    court_ids = serializers.ListField(child=serializers.UUIDField(), allow_empty=False)
+    date_from = serializers.DateField()
+    date_to = serializers.DateField()
+    min_duration = serializers.IntegerField(min_value=0, default=0)
+    timezone = serializers.CharField(default="UTC")
+
+    def validate_timezone(self, value):
+        try:
+            ZoneInfo(value)
+        except (ZoneInfoNotFoundError, ValueError):
+            raise serializers.ValidationError(f"Unknown timezone {value}")
+        return value
+
+    def validate(self, data):
+        if data["date_from"] > data["date_to"]:
+            raise serializers.ValidationError("date_from must be earlier than date_to")
+        if (data["date_to"] - data["date_from"]).days >= self.max_days:
+            raise serializers.ValidationError(f"date_from to date_to covers at most {self.max_days} days")
+        return data
+
+
+class CourtsAvailabilityStreamQuerySerializer(CourtsAvailabilityQuerySerializer):
+    max_days = MAX_STREAM_DAYS
+
+
+class CourtSlotSerializer(serializers.Serializer):
+    date = serializers.DateField()
+    day = serializers.CharField()
+    start_time = serializers.TimeField()
+    end_time = serializers.TimeField()
+
+
+class CourtAvailabilitySerializer(serializers.Serializer):
+    court_id = serializers.UUIDField(source="court.court_id")
+    name = serializers.CharField(source="court.name")
+    slots = CourtSlotSerializer(many=True)
+
+
+class CourtSlotStreamSerializer(CourtSlotSerializer):
+    court_id = serializers.UUIDField(source="court.court_id")
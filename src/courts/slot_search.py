@@ -0,0 +1,132 @@
+import heapq
+import math
+from bisect import bisect_left, bisect_right
+from collections import defaultdict
+from datetime import date, datetime, timedelta, timezone
+from itertools import islice
+from typing import Iterable, Iterator, List, Tuple
+
+from bookings.models import Booking
+from bookings.services import BookingService
+from courts.availability import court_windows
+from courts.models import Court
+from utils.common.availability_engine import free_intervals, merge_intervals, split_by_day
+from utils.common.day_boundaries import day_boundaries
+
+# Days of bookings loaded per query as the search moves forward
+SEARCH_CHUNK_DAYS = 7
+
+# How far ahead of `after` the search looks before giving up
+SEARCH_HORIZON_DAYS = 60
+
+
+class BookingIndex:
+    """
+    Sorted booking intervals of several courts, loaded from the bookings table chunk_days at a time
+    as the search moves forward, so a search that ends early only reads the first chunk.
+    Bookings of a court do not overlap, so both their starts and ends are sorted and the bookings
+    touching a day are found with bisect.
+    """
+
+    def __init__(self, court_ids: Iterable[int], start: date, chunk_days: int = SEARCH_CHUNK_DAYS):
+        self.court_ids = list(court_ids)
+        self.start = start
+        self.loaded_until = start
+        self.chunk_days = chunk_days
+        self.starts = defaultdict(list)
+        self.ends = defaultdict(list)
+
+    def _load_until(self, day: date) -> None:
+        while self.loaded_until <= day:
+            first_chunk = self.loaded_until == self.start
+            chunk_start = day_boundaries(self.loaded_until, "UTC").utc_start
+            self.loaded_until += timedelta(days=self.chunk_days)
+            chunk_end = day_boundaries(self.loaded_until, "UTC").utc_start
+
+            rows = Booking.objects.filter(court_id__in=self.court_ids, start_time__lt=chunk_end)
+            if first_chunk:
+                # Also bookings running into the first day
+                rows = rows.filter(end_time__gt=chunk_start)
+            else:
+                rows = rows.filter(start_time__gte=chunk_start)
+
+            for court_id, start_time, end_time in rows.order_by("start_time").values_list(
+                    "court_id", "start_time", "end_time"):
+                self.starts[court_id].append(start_time)
+                self.ends[court_id].append(end_time)
+
+    def day_bookings(self, court_id: int, day: date) -> List[Tuple[int, int]]:
+        """Booked minute intervals of a court on a UTC day."""
+        self._load_until(day)
+        bounds = day_boundaries(day, "UTC")
+        starts, ends = self.starts[court_id], self.ends[court_id]
+        first = bisect_right(ends, bounds.utc_start)
+        last = bisect_left(starts, bounds.utc_end)
+        return merge_intervals(
+            (start_minute, end_minute)
+            for start_time, end_time in zip(starts[first:last], ends[first:last])
+            for piece_day, start_minute, end_minute in split_by_day(start_time.astimezone(timezone.utc),
+                                                                    end_time.astimezone(timezone.utc))
+            if piece_day == day
+        )
+
+
+def court_fits(court: Court, index: BookingIndex, after: datetime, duration_minutes: int,
+               horizon_days: int = SEARCH_HORIZON_DAYS) -> Iterator[Tuple[datetime, int, datetime, Court]]:
+    """
+    Lazily yield (start, court id, end, court) for the earliest fitting slot of every free interval
+    of a court, in time order from `after`.
+    Slots follow the opening hours rule of BookingService, so every slot returned can be booked.
+    """
+    windows = court_windows(court)
+    if not windows:
+        return
+    # Bookings may not start on the opening minute
+    earliest_minute = windows[0][0] + 1
+    after_day = after.date()
+    after_minute = math.ceil((after - day_boundaries(after_day, "UTC").utc_start).total_seconds() / 60)
+
+    for offset in range(horizon_days):
+        day = after_day + timedelta(days=offset)
+        day_start = day_boundaries(day, "UTC").utc_start
+        for start, end in free_intervals(windows, index.day_bookings(court.id, day)):
+            start = max(start, earliest_minute)
+            if day == after_day:
+                start = max(start, after_minute)
+            if end - start < duration_minutes:
+                continue
+            slot_start = day_start + timedelta(minutes=start)
+            slot_end = slot_start + timedelta(minutes=duration_minutes)
+            if BookingService.within_opening_hours(court, slot_start, slot_end):
+                yield slot_start, court.id, slot_end, court
+
+
+def next_available_slots(courts: Iterable[Court], duration: int, after: datetime, limit: int = 5,
+                         horizon_days: int = SEARCH_HORIZON_DAYS) -> List[dict]:
+    """
+    The first `limit` slots of `duration` hours starting at or after `after` on any of the courts,
+    earliest first and by court id on ties. At most one slot is returned per free interval.
+
+    Every court gets a lazy generator of its fitting slots and the generators are merged on a heap,
+    so the search stops reading bookings as soon as `limit` slots are found.
+
+    :param courts: The courts to search.
+    :param duration: Slot length in hours.
+    :param after: Earliest start, naive datetimes are taken as UTC. Times in the past are moved to now.
+    :param limit: Number of slots to return.
+    :param horizon_days: Number of days after `after` to search.
+    :return: A list of {"court", "start_time", "end_time"} dicts.
+    """
+    courts = list(courts)
+    if not courts or limit < 1:
+        return []
+    if after.tzinfo is None:
+        after = after.replace(tzinfo=timezone.utc)
+    after = max(after.astimezone(timezone.utc), datetime.now(timezone.utc))
+
+    index = BookingIndex([court.id for court in courts], after.date())
+    fits = heapq.merge(*(court_fits(court, index, after, duration * 60, horizon_days) for court in courts))
+    return [
+        dict(court=court, start_time=start_time, end_time=end_time)
+        for start_time, _, end_time, court in islice(fits, limit)
+    ]
@@ -1,15 +1,30 @@
+import json
 from django.urls import reverse
-from datetime import time
+from io import StringIO
+from datetime import date, datetime, time, timedelta
 from django.utils import timezone
 from django.contrib.auth.models import User
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import transaction
+from django.core.management import call_command, CommandError
 from rest_framework import status
 from rest_framework_simplejwt.tokens import RefreshToken
-from rest_framework.test import APITestCase
+from rest_framework.test import APITestCase, APIRequestFactory, force_authenticate
+from graphql_jwt.testcases import JSONWebTokenTestCase
 
 
 from accounts.models import Account
 from bookings.models import Booking
+from bookings.services import BookingService
 from .models import court
+from .availability import MAX_AVAILABILITY_DAYS, courts_availability, iter_courts_availability
+from . import availability_cache
+from .availability_cache import AvailabilityCacheStats
+from . import free_interval_store
+from .free_interval_store import FreeIntervals, store_key, version_key
+from .slot_search import next_available_slots
+from .views import CourtsViewSet
 
 
 class CourtsViewSetTestCase(APITestCase):
@@ -86,6 +101,407 @@ class CourtsViewSetTestCase(APITestCase):
 
         self.assertIn("start_time",booked)
         self.assertIn("end_time",booked)
-     
 
 
+class CourtsAvailabilityTestCase(JSONWebTokenTestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create_user(email="test@email.com",
+                                                        password="Test_password1")
+        cls.account = Account.objects.create(user=cls.user,
+                                             first_name="first",
+                                             last_name="last")
+
+        cls.courts = [court.Court.objects.create(name=f"Test court {i}",
+                                                 location="Test location",
+                                                 open=time(8,0),
+                                                 close=time(16,0))
+                      for i in range(3)]
+
+        cls.date_from = date(2030, 1, 1)
+        cls.date_to = cls.date_from + timedelta(days=30)
+
+        bookings = []
+        for i in range(31):
+            day = cls.date_from + timedelta(days=i)
+            bookings.append(Booking(court=cls.courts[0],
+                                    account=cls.account,
+                                    start_time=timezone.make_aware(datetime.combine(day, time(10))),
+                                    end_time=timezone.make_aware(datetime.combine(day, time(12))),
+                                    duration=2))
+        bookings.append(Booking(court=cls.courts[1],
+                                account=cls.account,
+                                start_time=timezone.make_aware(datetime.combine(cls.date_from, time(8))),
+                                end_time=timezone.make_aware(datetime.combine(cls.date_from, time(15))),
+                                duration=7))
+        Booking.objects.bulk_create(bookings)
+
+    def setUp(self) -> None:
+        cache.clear()
+        AvailabilityCacheStats.reset()
+
+    def test_courts_availability(self):
+        with self.assertNumQueries(2):
+            availability = courts_availability(court.Court.objects.filter(id__in=[c.id for c in self.courts]),
+                                               self.date_from,
+                                               self.date_to)
+
+        self.assertEqual([item["court"] for item in availability], self.courts)
+
+        first, second, third = [item["slots"] for item in availability]
+        self.assertEqual(len(first), 62)
+        self.assertEqual((first[0]["start_time"], first[0]["end_time"]), (time(8), time(10)))
+        self.assertEqual((first[1]["start_time"], first[1]["end_time"]), (time(12), time(16)))
+        self.assertEqual((second[0]["start_time"], second[0]["end_time"]), (time(15), time(16)))
+        self.assertEqual(len(second), 31)
+        self.assertEqual(len(third), 31)
+
+    def test_cache(self):
+        courts_availability(self.courts, self.date_from, self.date_to, buffer_minutes=10)
+        self.assertEqual(AvailabilityCacheStats.as_dict()["misses"], 93)
+
+        with self.subTest("Served from the cache"):
+            with self.assertNumQueries(0):
+                availability = courts_availability(self.courts, self.date_from, self.date_to, buffer_minutes=10)
+            self.assertEqual(AvailabilityCacheStats.as_dict()["hits"], 93)
+            self.assertEqual(len(availability[0]["slots"]), 62)
+            self.assertEqual(availability[0]["slots"][1]["start_time"], time(12, 10))
+
+        with self.subTest("Other variants are computed separately"):
+            courts_availability(self.courts, self.date_from, self.date_to, buffer_minutes=10, timezone="Africa/Lagos")
+            self.assertEqual(AvailabilityCacheStats.as_dict()["misses"], 186)
+
+        with self.subTest("Bookings invalidate their court and day"):
+            day = self.date_from + timedelta(days=10)
+            with self.captureOnCommitCallbacks(execute=True):
+                Booking.objects.create(court=self.courts[2],
+                                       account=self.account,
+                                       start_time=timezone.make_aware(datetime.combine(day, time(9))),
+                                       end_time=timezone.make_aware(datetime.combine(day, time(10))),
+                                       duration=1)
+            AvailabilityCacheStats.reset()
+
+            with self.assertNumQueries(1):
+                availability = courts_availability(self.courts, self.date_from, self.date_to, buffer_minutes=10)
+
+            self.assertEqual(AvailabilityCacheStats.as_dict()["misses"], 3)
+            slots = [slot for slot in availability[2]["slots"] if slot["date"] == day]
+            self.assertEqual([(slot["start_time"], slot["end_time"]) for slot in slots],
+                             [(time(8), time(9)), (time(10, 10), time(16))])
+
+    def test_cache_write_back_after_invalidation(self):
+        day = self.date_from + timedelta(days=3)
+        courts = {court.id: court for court in self.courts}
+        found, entries = availability_cache.get_many(self.courts[:1], [day], 10, "UTC")
+        self.assertEqual(found, {})
+
+        # A booking commits between the read of the bookings and the write-back
+        with self.captureOnCommitCallbacks(execute=True):
+            availability_cache.invalidate(self.courts[0].id,
+                                          timezone.make_aware(datetime.combine(day, time(9))),
+                                          timezone.make_aware(datetime.combine(day, time(10))))
+        availability_cache.set_many(courts, {(self.courts[0].id, day): [(480, 960)]}, entries, 10, "UTC")
+
+        found, _ = availability_cache.get_many(self.courts[:1], [day], 10, "UTC")
+        self.assertEqual(found, {})
+
+    def test_free_interval_store(self):
+        courts_availability(self.courts, self.date_from, self.date_to)
+
+        with self.subTest("Served from the store"):
+            with self.assertNumQueries(0):
+                availability = courts_availability(self.courts, self.date_from, self.date_to)
+            self.assertEqual(len(availability[0]["slots"]), 62)
+
+        day = self.date_from + timedelta(days=5)
+        with self.captureOnCommitCallbacks(execute=True):
+            booking = Booking.objects.create(court=self.courts[0],
+                                             account=self.account,
+                                             start_time=timezone.make_aware(datetime.combine(day, time(13))),
+                                             end_time=timezone.make_aware(datetime.combine(day, time(14))),
+                                             duration=1)
+
+        with self.subTest("Bookings split the stored intervals"):
+            with self.assertNumQueries(0):
+                availability = courts_availability(self.courts[:1], day, day)
+            self.assertEqual([(slot["start_time"], slot["end_time"]) for slot in availability[0]["slots"]],
+                             [(time(8), time(10)), (time(12), time(13)), (time(14), time(16))])
+
+        with self.subTest("Cancellations merge them back"):
+            with self.captureOnCommitCallbacks(execute=True):
+                booking.delete()
+            availability = courts_availability(self.courts[:1], day, day)
+            self.assertEqual([(slot["start_time"], slot["end_time"]) for slot in availability[0]["slots"]],
+                             [(time(8), time(10)), (time(12), time(16))])
+
+        with self.subTest("Store matches a full recomputation"):
+            output = StringIO()
+            call_command("rebuild_free_intervals", "--verify", "--start", str(self.date_from), "--days", "31",
+                         stdout=output)
+            self.assertIn("93 stored court days match", output.getvalue())
+
+        with self.subTest("Drift is reported"):
+            key = store_key(self.courts[1], day)
+            cache.set(key, {"version": cache.get(version_key(key)), "intervals": [(480, 600)]})
+            with self.assertRaises(CommandError):
+                call_command("rebuild_free_intervals", "--verify", "--start", str(self.date_from), stdout=StringIO())
+
+            call_command("rebuild_free_intervals", "--start", str(self.date_from), stdout=StringIO())
+            call_command("rebuild_free_intervals", "--verify", "--start", str(self.date_from), stdout=StringIO())
+
+    def test_free_interval_store_write_back(self):
+        day = self.date_from + timedelta(days=7)
+        courts = {court.id: court for court in self.courts}
+        start_time = timezone.make_aware(datetime.combine(day, time(13)))
+        end_time = timezone.make_aware(datetime.combine(day, time(14)))
+        courts_availability(self.courts[:1], day, day)
+
+        with self.subTest("Rolled back bookings leave the store alone"):
+            with self.captureOnCommitCallbacks(execute=True) as callbacks, self.assertRaises(RuntimeError), \
+                    transaction.atomic():
+                free_interval_store.occupy_booking(self.courts[0], start_time, end_time)
+                raise RuntimeError()
+            self.assertEqual(callbacks, [])
+            self.assertEqual(free_interval_store.get_many(self.courts[:1], [day])[0][(self.courts[0].id, day)],
+                             [(480, 600), (720, 960)])
+
+        with self.subTest("Write-backs older than a booking are not served"):
+            cache.clear()
+            found, versions = free_interval_store.get_many(self.courts[:1], [day])
+            self.assertEqual(found, {})
+            # A booking commits between the read of the bookings and the write-back
+            with self.captureOnCommitCallbacks(execute=True):
+                free_interval_store.occupy_booking(self.courts[0], start_time, end_time)
+            free_interval_store.set_many(courts, {(self.courts[0].id, day): [(480, 600), (720, 960)]}, versions)
+
+            self.assertEqual(free_interval_store.get_many(self.courts[:1], [day])[0], {})
+            availability = courts_availability(self.courts[:1], day, day)
+            self.assertEqual([(slot["start_time"], slot["end_time"]) for slot in availability[0]["slots"]],
+                             [(time(8), time(10)), (time(12), time(16))])
+
+    def test_free_intervals(self):
+        free = FreeIntervals([(480, 600), (720, 960)])
+
+        free.occupy(500, 540)
+        self.assertEqual(free.as_list(), [(480, 500), (540, 600), (720, 960)])
+
+        free.occupy(560, 800)
+        self.assertEqual(free.as_list(), [(480, 500), (540, 560), (800, 960)])
+
+        free.release(500, 540, [(480, 960)])
+        self.assertEqual(free.as_list(), [(480, 560), (800, 960)])
+
+        free.release(0, 1440, [(480, 960)])
+        self.assertEqual(free.as_list(), [(480, 960)])
+
+    def test_min_duration(self):
+        availability = courts_availability(self.courts, self.date_from, self.date_from, min_duration=3)
+
+        self.assertEqual([len(item["slots"]) for item in availability], [1, 0, 1])
+
+    def test_graphql_query(self):
+        query = """
+            query CourtsAvailability($courtIds:[UUID]!, $dateFrom:Date!, $dateTo:Date!){
+                courtsAvailability(courtIds:$courtIds, dateFrom:$dateFrom, dateTo:$dateTo, minDuration:1){
+                    data{
+                        court{
+                            name
+                        }
+                        slots{
+                            date
+                            startTime
+                            endTime
+                        }
+                    }
+                }
+            }
+        """
+        vars = {"courtIds": [str(self.courts[0].court_id), str(self.courts[1].court_id)],
+                "dateFrom": str(self.date_from),
+                "dateTo": str(self.date_from)}
+
+        response = self.client.execute(query, vars)
+
+        self.assertIsNone(response.errors)
+        data = response.data["courtsAvailability"]["data"]
+        self.assertEqual(len(data), 2)
+        self.assertEqual(data[0]["court"]["name"], self.courts[0].name)
+        self.assertEqual(data[0]["slots"][0], {"date": "2030-01-01", "startTime": "08:00:00", "endTime": "10:00:00"})
+        self.assertEqual(data[1]["slots"], [{"date": "2030-01-01", "startTime": "15:00:00", "endTime": "16:00:00"}])
+
+        vars["dateTo"] = str(self.date_from + timedelta(days=MAX_AVAILABILITY_DAYS))
+        response = self.client.execute(query, vars)
+        self.assertIsNone(response.data["courtsAvailability"]["data"])
+
+    def test_rest_action(self):
+        view = CourtsViewSet.as_view({"get": "availability"})
+        request = APIRequestFactory().get("/courts/availability", {
+            "court_ids": [str(self.courts[0].court_id), str(self.courts[2].court_id)],
+            "date_from": str(self.date_from),
+            "date_to": str(self.date_from)
+        })
+        force_authenticate(request, user=self.user)
+
+        response = view(request)
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.data), 2)
+        self.assertEqual(response.data[0]["court_id"], str(self.courts[0].court_id))
+        self.assertEqual(len(response.data[0]["slots"]), 2)
+        self.assertEqual(response.data[1]["slots"][0]["start_time"], "08:00:00")
+
+        request = APIRequestFactory().get("/courts/availability", {
+            "court_ids": [str(self.courts[0].court_id)],
+            "date_from": str(self.date_from),
+            "date_to": str(self.date_from + timedelta(days=MAX_AVAILABILITY_DAYS))
+        })
+        force_authenticate(request, user=self.user)
+        self.assertEqual(view(request).status_code, status.HTTP_400_BAD_REQUEST)
+
+
+    def test_iter_courts_availability(self):
+        slots = iter_courts_availability(self.courts, self.date_from, self.date_to, chunk_days=7)
+
+        with self.assertNumQueries(1):
+            first = next(slots)
+        self.assertEqual((first["court"], first["date"], first["start_time"]), (self.courts[0], self.date_from, time(8)))
+
+        rest = list(slots)
+        self.assertEqual(len(rest) + 1, 62 + 31 + 31)
+        self.assertEqual([(slot["court"], slot["start_time"]) for slot in rest[:4]],
+                         [(self.courts[0], time(12)), (self.courts[1], time(15)),
+                          (self.courts[2], time(8)), (self.courts[0], time(8))])
+
+        streamed = sorted((slot["court"].id, slot["date"], slot["start_time"]) for slot in [first] + rest)
+        listed = sorted((item["court"].id, slot["date"], slot["start_time"])
+                        for item in courts_availability(self.courts, self.date_from, self.date_to)
+                        for slot in item["slots"])
+        self.assertEqual(streamed, listed)
+
+    def test_graphql_connection(self):
+        query = """
+            query CourtsAvailabilitySlots($courtIds:[UUID]!, $dateFrom:Date!, $dateTo:Date!, $after:String){
+                courtsAvailabilitySlots(courtIds:$courtIds, dateFrom:$dateFrom, dateTo:$dateTo, first:3, after:$after){
+                    data{
+                        edges{
+                            node{
+                                court{
+                                    name
+                                }
+                                date
+                                startTime
+                            }
+                        }
+                        pageInfo{
+                            hasNextPage
+                            endCursor
+                        }
+                    }
+                }
+            }
+        """
+        vars = {"courtIds": [str(court.court_id) for court in self.courts],
+                "dateFrom": str(self.date_from),
+                "dateTo": str(self.date_from + timedelta(days=1)),
+                "after": None}
+
+        nodes = []
+        pages = 0
+        while True:
+            response = self.client.execute(query, vars)
+            self.assertIsNone(response.errors)
+            data = response.data["courtsAvailabilitySlots"]["data"]
+            nodes.extend(edge["node"] for edge in data["edges"])
+            pages += 1
+            if not data["pageInfo"]["hasNextPage"]:
+                break
+            vars["after"] = data["pageInfo"]["endCursor"]
+
+        self.assertEqual(pages, 3)
+        self.assertEqual(len(nodes), 8)
+        self.assertEqual(nodes[4], {"court": {"name": self.courts[0].name}, "date": "2030-01-02", "startTime": "08:00:00"})
+
+        vars["after"] = "not a cursor"
+        response = self.client.execute(query, vars)
+        self.assertIsNone(response.data["courtsAvailabilitySlots"]["data"])
+
+    def test_rest_stream(self):
+        view = CourtsViewSet.as_view({"get": "availability_stream"})
+        request = APIRequestFactory().get("/courts/availability/stream", {
+            "court_ids": [str(self.courts[0].court_id), str(self.courts[2].court_id)],
+            "date_from": str(self.date_from),
+            "date_to": str(self.date_to)
+        })
+        force_authenticate(request, user=self.user)
+
+        response = view(request)
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response["Content-Type"], "application/x-ndjson")
+        lines = b"".join(response.streaming_content).decode().splitlines()
+        self.assertEqual(len(lines), 62 + 31)
+        self.assertEqual(json.loads(lines[0]), {"court_id": str(self.courts[0].court_id),
+                                                "date": "2030-01-01",
+                                                "day": "Tuesday",
+                                                "start_time": "08:00:00",
+                                                "end_time": "10:00:00"})
+
+    def test_next_available_slots(self):
+        after = timezone.make_aware(datetime.combine(self.date_from, time(7)))
+        with self.assertNumQueries(1):
+            slots = next_available_slots(self.courts, 2, after, limit=3)
+
+        self.assertEqual([(slot["court"], slot["start_time"].time(), slot["end_time"].time()) for slot in slots],
+                         [(self.courts[2], time(8, 1), time(10, 1)),
+                          (self.courts[0], time(12), time(14)),
+                          (self.courts[1], time(8, 1), time(10, 1))])
+
+        with self.subTest("Every slot can be booked"):
+            for slot in slots:
+                BookingService.validate(slot["court"], slot["start_time"], slot["end_time"])
+
+        with self.subTest("Starts after the given time"):
+            after = timezone.make_aware(datetime.combine(self.date_from, time(9, 30)))
+            slots = next_available_slots(self.courts, 3, after, limit=3)
+            self.assertEqual([(slot["court"], slot["start_time"]) for slot in slots],
+                             [(self.courts[2], after),
+                              (self.courts[0], after.replace(hour=12, minute=0)),
+                              (self.courts[1], after.replace(hour=8, minute=1) + timedelta(days=1))])
+
+        with self.subTest("Gives up after the horizon"):
+            self.assertEqual(next_available_slots(self.courts, 9, after, horizon_days=3), [])
+
+        with self.subTest("Past times start from now"):
+            now = timezone.now()
+            slots = next_available_slots(self.courts, 1, timezone.make_aware(datetime(2000, 1, 1)), limit=3)
+            self.assertEqual(len(slots), 3)
+            self.assertTrue(all(slot["start_time"] >= now for slot in slots))
+
+    def test_graphql_next_available_slots(self):
+        query = """
+            query NextAvailableSlots($courtIds:[UUID], $after:DateTime){
+                nextAvailableSlots(duration:7, after:$after, courtIds:$courtIds, limit:2){
+                    data{
+                        court{
+                            name
+                        }
+                        startTime
+                        endTime
+                    }
+                }
+            }
+        """
+        vars = {"courtIds": [str(self.courts[0].court_id), str(self.courts[1].court_id)],
+                "after": timezone.make_aware(datetime.combine(self.date_from, time(0))).isoformat()}
+
+        response = self.client.execute(query, vars)
+
+        self.assertIsNone(response.errors)
+        data = response.data["nextAvailableSlots"]["data"]
+        self.assertEqual(data, [{"court": {"name": self.courts[1].name},
+                                 "startTime": "2030-01-02T08:01:00+00:00",
+                                 "endTime": "2030-01-02T15:01:00+00:00"},
+                                {"court": {"name": self.courts[1].name},
+                                 "startTime": "2030-01-03T08:01:00+00:00",
+                                 "endTime": "2030-01-03T15:01:00+00:00"}])
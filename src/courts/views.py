@@ -1,8 +1,14 @@
+import json
+
+from django.http import StreamingHttpResponse
 from rest_framework.viewsets import GenericViewSet
 from rest_framework.mixins import ListModelMixin,RetrieveModelMixin
+from rest_framework.decorators import action
+from rest_framework.response import Response
 from drf_spectacular.utils import extend_schema
 
 from .models import court
+from .availability import courts_availability, iter_courts_availability
 
 from . import serializers
 
@@ -35,4 +41,54 @@ class CourtsViewSet(GenericViewSet,
     )
     def retrieve(self, request, *args, **kwargs):
         return super().retrieve(request, *args, **kwargs)
+    
+
+    @extend_schema(
+        parameters=[serializers.CourtsAvailabilityQuerySerializer],
+        responses=serializers.CourtAvailabilitySerializer(many=True),
+        summary="Free slots of several courts",
+    )
+    @action(["GET"], detail=False, url_path="availability")
+    def availability(self, request, *args, **kwargs):
+        data = self.availability_params(request)
+        courts = self.get_queryset().filter(court_id__in=data["court_ids"])
+        availability = courts_availability(courts,
+                                           data["date_from"],
+                                           data["date_to"],
+                                           data["min_duration"],
+                                           timezone=data["timezone"])
+
+        serializer = serializers.CourtAvailabilitySerializer(availability, many=True)
+        return Response(serializer.data)
+
+
+    @extend_schema(
+        parameters=[serializers.CourtsAvailabilityQuerySerializer],
+        responses={(200, "application/x-ndjson"): serializers.CourtSlotStreamSerializer},
+        summary="Stream free slots of several courts, one JSON object per line",
+    )
+    @action(["GET"], detail=False, url_path="availability/stream")
+    def availability_stream(self, request, *args, **kwargs):
+        data = self.availability_params(request, serializers.CourtsAvailabilityStreamQuerySerializer)
+        courts = self.get_queryset().filter(court_id__in=data["court_ids"])
+        slots = iter_courts_availability(courts,
+                                         data["date_from"],
+                                         data["date_to"],
+                                         data["min_duration"],
+                                         timezone=data["timezone"])
+
+        lines = (json.dumps(serializers.CourtSlotStreamSerializer(slot).data) + "\n" for slot in slots)
+        return StreamingHttpResponse(lines, content_type="application/x-ndjson")
+
 
+    def availability_params(self, request, serializer_class=serializers.CourtsAvailabilityQuerySerializer):
+        params = request.query_params
+        serializer = serializer_class(data={
+            "court_ids": params.getlist("court_ids"),
+            "date_from": params.get("date_from"),
+            "date_to": params.get("date_to"),
+            "min_duration": params.get("min_duration", 0),
+            "timezone": params.get("timezone", "UTC")
+        })
+        serializer.is_valid(raise_exception=True)
+        return serializer.validated_data
@@ -51,6 +51,7 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.postgres',
     'graphene_django',
     'rest_framework',
     'corsheaders',
@@ -258,4 +259,28 @@ AUTHENTICATION_BACKENDS = [
 ]
 
 # CORS HEADERS
-CORS_ALLOW_ALL_ORIGINS = True
\ No newline at end of file
+CORS_ALLOW_ALL_ORIGINS = True
+
+# Availability
+# Date ranges at least this long are computed with the numpy kernel when numpy is installed
+AVAILABILITY_NUMPY_MIN_DAYS = 90
+# Seconds a court/day availability entry is kept in the cache, bookings invalidate it earlier
+AVAILABILITY_CACHE_TIMEOUT = 60 * 15
+# Seconds a court's bookings are kept in the in-process conflict index before they are reloaded
+CONFLICT_INDEX_TTL = 60
+# Seconds a rejection of the conflict index is trusted, older courts are reloaded to confirm it
+CONFLICT_INDEX_FRESH = 5
+# Courts kept in the in-process conflict index, least recently checked ones are dropped first
+CONFLICT_INDEX_MAX_COURTS = 1024
+# Route WebSocket bookings of the same court through one ordered worker that batch-inserts the winners
+BOOKING_PIPELINE = os.environ.get("BOOKING_PIPELINE","False") == "True"
+# Most requests of a court decided and inserted together by the booking pipeline
+BOOKING_PIPELINE_BATCH_SIZE = 100
+# Longest a client may hold a slot during checkout before it is free again
+SLOT_HOLD_SECONDS = 90
+# Milliseconds booking events of a court are buffered and sent as one frame, 0 sends each event on its own
+BOOKING_EVENT_TICK_MS = int(os.environ.get("BOOKING_EVENT_TICK_MS", "0"))
+# Seconds between log lines of the event coalescing counters, 0 turns them off
+BOOKING_EVENT_STATS_SECONDS = 300
+# Booking events kept per court for clients resuming with a cursor, older ones are trimmed
+EVENT_STREAM_MAXLEN = 1000
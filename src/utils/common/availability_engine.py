@@ -0,0 +1,115 @@
+from datetime import date, datetime, time, timedelta
+from typing import Iterable, Iterator, List, Tuple
+
+DAY_MINUTES = 24 * 60
+
+Interval = Tuple[int, int]
+
+
+def time_to_minute(value: time) -> int:
+    """
+    Convert a time of day to minutes since midnight.
+    Seconds are truncated, except for 23:59:59 which is treated as the end of the day.
+    """
+    if value.hour == 23 and value.minute == 59 and value.second == 59:
+        return DAY_MINUTES
+    return value.hour * 60 + value.minute
+
+
+def minute_to_time(minute: int) -> time:
+    """
+    Convert minutes since midnight back to a time of day.
+    The end of the day is rendered as 23:59:59.
+    """
+    if minute >= DAY_MINUTES:
+        return time(23, 59, 59)
+    return time(minute // 60, minute % 60)
+
+
+def format_minute(minute: int) -> str:
+    """Format minutes since midnight as HH:mm:ss."""
+    if minute >= DAY_MINUTES:
+        return "23:59:59"
+    return f"{minute // 60:02d}:{minute % 60:02d}:00"
+
+
+def to_intervals(slots: Iterable[Tuple[time, time]]) -> List[Interval]:
+    """
+    Convert (start, end) time pairs to sorted, merged minute intervals.
+    Empty and inverted slots are dropped.
+    """
+    return merge_intervals(
+        (time_to_minute(start), time_to_minute(end)) for start, end in slots
+    )
+
+
+def merge_intervals(intervals: Iterable[Interval]) -> List[Interval]:
+    """Sort minute intervals and merge the ones that overlap or touch."""
+    merged = []
+    for start, end in sorted(intervals):
+        if start >= end:
+            continue
+        if merged and start <= merged[-1][1]:
+            if end > merged[-1][1]:
+                merged[-1] = (merged[-1][0], end)
+            continue
+        merged.append((start, end))
+    return merged
+
+
+def free_intervals(
+        windows: List[Interval],
+        bookings: List[Interval],
+        buffer_minutes: int = 0,
+) -> List[Interval]:
+    """
+    Subtract booked intervals from availability windows in a single merge sweep.
+
+    Args:
+    - windows: Sorted, non-overlapping availability intervals in minutes.
+    - bookings: Booked intervals in minutes, in any order.
+    - buffer_minutes: Minutes kept free after every booking before the slot can be used again.
+    Returns:
+        Sorted list of free (start_minute, end_minute) intervals.
+    """
+    if buffer_minutes:
+        bookings = [(start, end + buffer_minutes) for start, end in bookings]
+    bookings = merge_intervals(bookings)
+
+    free = []
+    j, total = 0, len(bookings)
+    for window_start, window_end in windows:
+        cursor = window_start
+        while j < total and bookings[j][1] <= cursor:
+            j += 1
+        while j < total and bookings[j][0] < window_end:
+            booked_start, booked_end = bookings[j]
+            if booked_start > cursor:
+                free.append((cursor, booked_start))
+            if booked_end > cursor:
+                cursor = booked_end
+            if cursor >= window_end:
+                break
+            j += 1
+        if cursor < window_end:
+            free.append((cursor, window_end))
+    return free
+
+
+def split_by_day(start: datetime, end: datetime) -> Iterator[Tuple[date, int, int]]:
+    """
+    Split a datetime range into (date, start_minute, end_minute) pieces, one per calendar day it touches.
+    Start minutes are rounded down and end minutes up, so partial minutes count as booked.
+    """
+    day = start.date()
+    while True:
+        day_start = datetime.combine(day, time.min, tzinfo=start.tzinfo)
+        if day_start >= end:
+            return
+        piece_start = max(start, day_start) - day_start
+        piece_end = min(end, day_start + timedelta(days=1)) - day_start
+        start_minute = int(piece_start.total_seconds()) // 60
+        end_minute = -(-int(piece_end.total_seconds()) // 60)
+        if start_minute < end_minute:
+            yield day, start_minute, end_minute
+        day += timedelta(days=1)
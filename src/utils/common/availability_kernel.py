@@ -0,0 +1,67 @@
+from typing import List
+
+from django.conf import settings
+
+from utils.common.availability_engine import DAY_MINUTES, Interval
+
+try:
+    import numpy as np
+except ImportError:  # numpy is optional, the pure Python sweep is used without it
+    np = None
+
+
+def use_numpy_kernel(days: int) -> bool:
+    """Whether a range of this many days should go through the vectorized kernel."""
+    threshold = getattr(settings, "AVAILABILITY_NUMPY_MIN_DAYS", 90)
+    return np is not None and threshold is not None and days >= threshold
+
+
+def _minute_mask(day_intervals: List[List[Interval]], buffer_minutes: int = 0):
+    """
+    Encode per-day minute intervals as a (days, DAY_MINUTES) boolean mask.
+    Each interval adds +1 at its start and -1 at its end, a cumulative sum gives the coverage.
+    """
+    days = len(day_intervals)
+    rows, starts, ends = [], [], []
+    for row, intervals in enumerate(day_intervals):
+        for start, end in intervals:
+            rows.append(row)
+            starts.append(start)
+            ends.append(end + buffer_minutes)
+
+    deltas = np.zeros((days, DAY_MINUTES + 1), dtype=np.int32)
+    if rows:
+        rows = np.asarray(rows, dtype=np.int64)
+        starts = np.clip(np.asarray(starts, dtype=np.int64), 0, DAY_MINUTES)
+        ends = np.clip(np.asarray(ends, dtype=np.int64), 0, DAY_MINUTES)
+        valid = starts < ends
+        np.add.at(deltas, (rows[valid], starts[valid]), 1)
+        np.add.at(deltas, (rows[valid], ends[valid]), -1)
+    return np.cumsum(deltas, axis=1)[:, :DAY_MINUTES] > 0
+
+
+def free_intervals_by_day(
+        day_windows: List[List[Interval]],
+        day_bookings: List[List[Interval]],
+        buffer_minutes: int = 0,
+) -> List[List[Interval]]:
+    """
+    Vectorized counterpart of availability_engine.free_intervals for many days at once.
+    Returns the same free intervals as running the sweep on every (windows, bookings) pair.
+    """
+    days = len(day_windows)
+    if not days:
+        return []
+
+    free = _minute_mask(day_windows) & ~_minute_mask(day_bookings, buffer_minutes)
+
+    padded = np.zeros((days, DAY_MINUTES + 2), dtype=np.int8)
+    padded[:, 1:-1] = free
+    edges = np.diff(padded, axis=1)
+    start_rows, start_minutes = np.nonzero(edges == 1)
+    _, end_minutes = np.nonzero(edges == -1)
+
+    result = [[] for _ in range(days)]
+    for row, start, end in zip(start_rows.tolist(), start_minutes.tolist(), end_minutes.tolist()):
+        result[row].append((start, end))
+    return result
@@ -1,13 +1,20 @@
 # BEGIN: 7d8f6a4c7b3e
 import calendar
 import datetime
+from collections import defaultdict
 from datetime import time, date as _date, timedelta
-from typing import Dict, List, Tuple, Union
+from typing import Dict, List, Sequence, Tuple, Union
+from zoneinfo import ZoneInfo
 
 import pendulum
-from django.db.models import Q
 
 from user.models import ProfessionalProfile
+from utils.common.availability_engine import (free_intervals, format_minute, merge_intervals, minute_to_time,
+                                              split_by_day, time_to_minute, to_intervals)
+from utils.common.availability_kernel import free_intervals_by_day, use_numpy_kernel
+from utils.common.availability_template import AvailabilityTemplate
+from utils.common.day_boundaries import day_boundaries
+from utils.common.slots import DaySlots, Slot, SlotList
 from utils.enums import CalendarStatusChoices, AvailabilityTimeFrameChoices
 
 
@@ -64,120 +71,24 @@ class Availability:
             )
         if not availability_slots:
             return []
-        if not booked_slots:
-            # If no booked slots, return availability slots as is
-            return cls.format_output_list(availability_slots, date=date)
 
-        date_with_timezone = pendulum.datetime(
-            date.year, date.month, date.day
-        ).in_timezone(timezone)
-
-        start_of_day = date_with_timezone.start_of("day")
-        end_of_day = start_of_day.add(days=1).subtract(seconds=1)
-
-        availability_slots = [
-            (
-                pendulum.Time(start.hour, start.minute, start.second),
-                pendulum.Time(end.hour, end.minute, end.second),
-            )
-            for start, end in availability_slots
-        ]
-        booked_slots = [
-            (
-                pendulum.Time(start.hour, start.minute, start.second),
-                pendulum.Time(end.hour, end.minute, end.second),
+        bounds = day_boundaries(date, timezone)
+
+        free = free_intervals(
+            to_intervals(availability_slots),
+            to_intervals(booked_slots),
+            buffer_minutes,
+        )
+        return [
+            dict(
+                date=bounds.iso_date,
+                day=bounds.weekday,
+                start_time=format_minute(start),
+                end_time=format_minute(end),
             )
-            for start, end in booked_slots
+            for start, end in free
         ]
 
-        booked_slots.sort(key=lambda x: x[0])
-        availability_slots.sort(key=lambda x: x[0])
-
-        free_slots = []
-        available_slots = []
-
-        effective_buffer = lambda: buffer_minutes if len(available_slots) else 0
-
-        # Handle case when the first booked slot starts after the beginning of the day
-        if booked_slots[0][0] > start_of_day.time():
-            free_slots.append(
-                dict(start_time=start_of_day.time(), end_time=booked_slots[0][0])
-            )
-
-        # Check and append free slots between booked slots
-        for i in range(len(booked_slots) - 1):
-            start, end = booked_slots[i][0], booked_slots[i][1]
-            next_start, next_end = booked_slots[i + 1][0], booked_slots[i + 1][1]
-
-            if next_start > end:
-                free_slots.append(
-                    dict(
-                        start_time=end,
-                        end_time=next_start,
-                    )
-                )
-
-        # Handle case when the last booked slot ends before the end of the day
-        if booked_slots[-1][1] < end_of_day.time():
-            free_slots.append(
-                dict(start_time=booked_slots[-1][1], end_time=end_of_day.time())
-            )
-
-        # Check if free slots are within the availability slots
-        for free_start, free_end in [
-            (item["start_time"], item["end_time"]) for item in free_slots
-        ]:
-            for avail_start, avail_end in availability_slots:
-                if free_end < avail_start:
-                    # Starts outside the availability slot
-                    continue
-
-                if (
-                        free_start <= avail_start
-                        and free_end <= avail_end
-                        and free_end != avail_start
-                ):
-                    # Runs into an availability slot, truncate the start
-                    available_slots.append(
-                        dict(
-                            date=date_with_timezone.format("YYYY-MM-DD"),
-                            day=date_with_timezone.format("dddd"),
-                            start_time=avail_start.add(
-                                minutes=effective_buffer()
-                            ).format("HH:mm:ss"),
-                            end_time=free_end.format("HH:mm:ss"),
-                        )
-                    )
-                    continue
-
-                if free_start >= avail_start and free_end <= avail_end:
-                    # Starts and ends within availability slot, append to available slots as is
-                    available_slots.append(
-                        dict(
-                            date=date_with_timezone.format("YYYY-MM-DD"),
-                            day=date_with_timezone.format("dddd"),
-                            start_time=free_start.add(
-                                minutes=effective_buffer()
-                            ).format("HH:mm:ss"),
-                            end_time=free_end.format("HH:mm:ss"),
-                        )
-                    )
-                    continue
-
-                if (
-                        not free_start >= avail_end
-                        and free_start >= avail_start <= free_end
-                        and avail_end <= free_end
-                ):
-                    # Start in availability and ends outside availability slot, truncate the end
-                    available_slots.append(dict(
-                        date=date_with_timezone.format('YYYY-MM-DD'),
-                        day=date_with_timezone.format('dddd'),
-                        start_time=free_start.add(minutes=effective_buffer()).format('HH:mm:ss'),
-                        end_time=avail_end.format('HH:mm:ss')
-                    ))
-        return available_slots
-
     @classmethod
     def get_professional_availability_slots(cls,
                                             professional,
@@ -186,11 +97,11 @@ class Availability:
                                             date: datetime.date = None,
                                             time_frame: AvailabilityTimeFrameChoices = None,
                                             timezone: str = "Africa/Accra",
-                                            buffer_minutes: int = 1) -> List[
-        Dict[str, Union[datetime.date, str, time, time]]]:
+                                            buffer_minutes: int = 1) -> Sequence[Slot]:
 
         filtered_booked_slots = professional.calendar.all()
-        availability_slots = professional.availability.all()
+        availability_slots = AvailabilityTemplate.for_queryset(f"professional:{professional.pk}",
+                                                               professional.availability.all())
         dates = cls.dates(date, time_frame, week, month)
 
         booked_slots = filtered_booked_slots.filter(
@@ -198,7 +109,8 @@ class Availability:
             start_time__gte=dates[0]
         ).order_by('start_time')
 
-        available_slots = cls.days_available(dates, booked_slots, availability_slots, timezone, buffer_minutes)
+        available_slots = cls.days_available(dates, booked_slots, availability_slots, timezone, buffer_minutes,
+                                             bulk=True)
 
         return available_slots
 
@@ -265,39 +177,22 @@ class Availability:
 
 
     @classmethod
-    def days_available(cls, dates, booked_slots, availability_slots, timezone, buffer_minutes):
+    def days_available(cls, dates, booked_slots, availability_slots, timezone, buffer_minutes, bulk=False):
+        if bulk:
+            return cls.bulk_days_available(dates, booked_slots, availability_slots, timezone, buffer_minutes)
+
         available_slots = []
         if not availability_slots:
             return available_slots
 
+        template = cls.availability_template(availability_slots)
         for date in dates:
-            new_availability_slots = []
-            date_with_timezone = pendulum.datetime(date.year, date.month, date.day).in_timezone(timezone)
-            start_of_day = date_with_timezone.start_of('day')
-            end_of_day = start_of_day.add(days=1).subtract(seconds=1)
-
-
-            availability_slot = availability_slots.filter(
-                Q(day=date.strftime('%A').upper()) | Q(date__month=date.month, date__day=date.day),
-
-            )
-
-            for availability in availability_slot:
-                if availability.day and availability.day == date.strftime('%A').upper():
-                    new_availability_slots.append(
-                        (date, availability.opening_time, availability.closing_time))
-
-                if availability.date:
-                    new_availability_slots.append(
-                        (pendulum.datetime(availability.date.year, availability.date.month, availability.date.day).in_timezone(timezone), availability.opening_time, availability.closing_time))
-
-
-            slot_available = [(pendulum.Time(start.hour, start.minute, start.second),
-                               pendulum.Time(end.hour, end.minute, end.second)) for day, start, end in
-                              new_availability_slots]
-
-            slot_available.sort(key=lambda x: x[0])
+            bounds = day_boundaries(date, timezone)
+            start_of_day = datetime.datetime.combine(date, time.min)
+            end_of_day = datetime.datetime.combine(date, time(23, 59, 59))
 
+            slot_available = template.windows(date)
+            new_availability_slots = [(date, minute_to_time(start), minute_to_time(end)) for start, end in slot_available]
             free_slots = []
             effective_buffer = lambda: buffer_minutes if len(available_slots) else 0
 
@@ -307,12 +202,9 @@ class Availability:
                 for date, opening, closing in new_availability_slots:
 
                     available_slots.append(
-                        dict(
-                            date=datetime.date(date.year, date.month, date.day),
-                            day=date.strftime('%A'),
-                            start_time=opening,
-                            end_time=closing
-                        )
+                        Slot(datetime.date(date.year, date.month, date.day),
+                             time_to_minute(opening),
+                             time_to_minute(closing))
                     )
             # Handle case when the first booked slot starts after the beginning of the day
             else:
@@ -320,9 +212,8 @@ class Availability:
                     start_time__date=date
                 ).order_by('start_time').values_list("start_time", "end_time")
 
-                slots_booked = [(pendulum.Time(start.hour, start.minute, start.second),
-                                 pendulum.Time(end.hour, end.minute, end.second)) for start, end in
-                                [(start_time.time(), end_time.time()) for start_time, end_time in booking_slot]]
+                slots_booked = [(time_to_minute(start_time.time()), time_to_minute(end_time.time()))
+                                for start_time, end_time in booking_slot]
 
                 slots_booked.sort(key=lambda x: x[0])
 
@@ -331,30 +222,91 @@ class Availability:
                 available_slots.extend(available)
 
             # Check if free slots are within the availability slots
-            get_available_slots=cls.free_slot_availability( free_slots, slot_available, date_with_timezone, effective_buffer)
+            get_available_slots=cls.free_slot_availability( free_slots, slot_available, bounds, effective_buffer)
             available_slots.extend(get_available_slots)
         return available_slots
 
 
+    @classmethod
+    def bulk_days_available(cls, dates, booked_slots, availability_slots, timezone, buffer_minutes):
+        """
+        Same slots as days_available, but loads every availability row and every booking
+        for the whole range in one query each, groups them into per-day buckets in memory and
+        runs the interval sweep once per bucket.
+        Querysets, plain iterables of rows and compiled AvailabilityTemplates are all accepted.
+        Ranges of AVAILABILITY_NUMPY_MIN_DAYS days or more go through the numpy kernel when it is installed.
+        """
+        if not dates:
+            return []
+
+        template = cls.availability_template(availability_slots)
+        if not template:
+            return []
+        day_bookings = cls.bucket_bookings(dates, booked_slots, timezone)
+
+        windows = template.expand(dates)
+        bookings = [merge_intervals(day_bookings.get(date, [])) for date in dates]
+
+        if use_numpy_kernel(len(dates)):
+            free_by_day = free_intervals_by_day(windows, bookings, buffer_minutes)
+        else:
+            free_by_day = [
+                free_intervals(day_windows, bookings_of_day, buffer_minutes)
+                for day_windows, bookings_of_day in zip(windows, bookings)
+            ]
+
+        return SlotList(DaySlots(date, free) for date, free in zip(dates, free_by_day))
+
+    @classmethod
+    def availability_template(cls, availability_slots):
+        """Compile availability rows into a template, querysets and plain iterables of rows are both accepted."""
+        if isinstance(availability_slots, AvailabilityTemplate):
+            return availability_slots
+        if hasattr(availability_slots, "values_list"):
+            rows = availability_slots.values_list("day", "date", "opening_time", "closing_time")
+        else:
+            rows = [(availability.day, availability.date, availability.opening_time, availability.closing_time)
+                    for availability in availability_slots]
+        return AvailabilityTemplate.from_rows(rows)
+
+    @classmethod
+    def bucket_bookings(cls, dates, booked_slots, timezone="UTC"):
+        """
+        Group booked (start_time, end_time) datetimes into per-date minute intervals on the local clock of
+        the timezone. A booking crossing local midnight counts on both days, naive datetimes are taken as local.
+        """
+        tz = ZoneInfo(timezone)
+        if hasattr(booked_slots, "values_list"):
+            booked_slots = booked_slots.filter(
+                start_time__lt=day_boundaries(max(dates), timezone).utc_end,
+                end_time__gt=day_boundaries(min(dates), timezone).utc_start
+            ).values_list("start_time", "end_time")
+
+        wanted = set(dates)
+        day_bookings = defaultdict(list)
+        for start_time, end_time in booked_slots:
+            if start_time.tzinfo is not None:
+                start_time, end_time = start_time.astimezone(tz), end_time.astimezone(tz)
+            for day, start_minute, end_minute in split_by_day(start_time, end_time):
+                if day in wanted:
+                    day_bookings[day].append((start_minute, end_minute))
+        return day_bookings
+
     @classmethod
     def booking_free_period(cls, slots_booked, new_availability_slots, start_of_day, end_of_day):
         available_slots=[]
         free_slots=[]
+        day = datetime.date(start_of_day.year, start_of_day.month, start_of_day.day)
+        day_start, day_end = time_to_minute(start_of_day.time()), time_to_minute(end_of_day.time())
         if not slots_booked:
             for date, opening, closing in new_availability_slots:
                 available_slots.append(
-                    dict(
-                        date=datetime.date(date.year, date.month, date.day),
-                        day=date.strftime('%A'),
-                        start_time=opening,
-                        end_time=closing
-                    )
+                    Slot(datetime.date(date.year, date.month, date.day),
+                         time_to_minute(opening),
+                         time_to_minute(closing))
                 )
-        if slots_booked != [] and slots_booked[0][0] > start_of_day.time():
-            free_slots.append(dict(
-                start_time=start_of_day.time(),
-                end_time=slots_booked[0][0]
-            ))
+        if slots_booked != [] and slots_booked[0][0] > day_start:
+            free_slots.append(Slot(day, day_start, slots_booked[0][0]))
 
         # Check and append free slots between booked slots
 
@@ -364,23 +316,17 @@ class Availability:
                 start, end = slots_booked[i][0], slots_booked[i][1]
                 next_start, next_end = slots_booked[i + 1][0], slots_booked[i + 1][1]
                 if next_start > end:
-                    free_slots.append(dict(
-                        start_time=end,
-                        end_time=next_start,
-                    ))
+                    free_slots.append(Slot(day, end, next_start))
 
         # Handle case when the last booked slot ends before the end of the day
-        if slots_booked != [] and slots_booked[-1][1] < end_of_day.time():
-            free_slots.append(dict(
-                start_time=slots_booked[-1][1],
-                end_time=end_of_day.time()
-            ))
+        if slots_booked != [] and slots_booked[-1][1] < day_end:
+            free_slots.append(Slot(day, slots_booked[-1][1], day_end))
         return available_slots, free_slots
 
     @classmethod
-    def free_slot_availability(cls, free_slots, slot_available,date_with_timezone,effective_buffer):
+    def free_slot_availability(cls, free_slots, slot_available,bounds,effective_buffer):
         available_slots=[]
-        for free_start, free_end in [(item["start_time"], item["end_time"]) for item in free_slots]:
+        for free_start, free_end in [(slot.start, slot.end) for slot in free_slots]:
             for avail_start, avail_end in slot_available:
                 if free_end < avail_start:
                     # Starts outside the availability slot
@@ -388,49 +334,29 @@ class Availability:
 
                 if free_start <= avail_start and free_end <= avail_end and free_end != avail_start:
                     # Runs into an availability slot, truncate the start
-                    # [(Time(10, 30, 30), Time(22, 30, 30))]
-                    # [(Time(19, 30, 30), Time(22, 30, 30))]
-
-                    available_slots.append(dict(
-                        date=datetime.date(date_with_timezone.year, date_with_timezone.month, date_with_timezone.day),
-                        day=date_with_timezone.format('dddd'),
-                        start_time=avail_start.add(minutes=effective_buffer()),
-                        end_time=free_end
-                    ))
+                    # [(10:30, 22:30)]
+                    # [(19:30, 22:30)]
+
+                    available_slots.append(Slot(bounds.date, avail_start + effective_buffer(), free_end))
                     continue
 
                 if free_start >= avail_start and free_end <= avail_end:
                     # Starts and ends within availability slot, append to available slots as is
-                    # [(Time(19, 30, 30), Time(20, 30, 30))]
-                    # [(Time(10, 30, 30), Time(22, 30, 30))]
-                    available_slots.append(dict(
-                        date=datetime.date(date_with_timezone.year, date_with_timezone.month, date_with_timezone.day),
-                        day=date_with_timezone.format('dddd'),
-                        start_time=free_start.add(minutes=effective_buffer()),
-                        end_time=free_end
-                    ))
+                    # [(19:30, 20:30)]
+                    # [(10:30, 22:30)]
+                    available_slots.append(Slot(bounds.date, free_start + effective_buffer(), free_end))
                     continue
 
                 if not free_start >= avail_end and free_start >= avail_start and avail_start <= free_end and avail_end <= free_end:
                     # Start in availability and ends outside availability slot, truncate the end
-                    # [(Time(19, 30, 30), Time(20, 30, 30))]
-                    # [(Time(17, 30, 30), Time(18, 30, 30))]
+                    # [(19:30, 20:30)]
+                    # [(17:30, 18:30)]
 
-                    available_slots.append(dict(
-                        date=datetime.date(date_with_timezone.year, date_with_timezone.month, date_with_timezone.day),
-                        day=date_with_timezone.format('dddd'),
-                        start_time=free_start.add(minutes=effective_buffer()),
-                        end_time=avail_end
-                    ))
+                    available_slots.append(Slot(bounds.date, free_start + effective_buffer(), avail_end))
 
                 if not free_start >= avail_end and free_start <= avail_start <= free_end and avail_end <= free_end:
                     # Start before in availability and ends before availability
-                    # [(Time(8, 30, 30), Time(23, 30, 30))]
-                    # [(Time(10, 30, 30), Time(22, 30, 30))]
-                    available_slots.append(dict(
-                        date=datetime.date(date_with_timezone.year, date_with_timezone.month, date_with_timezone.day),
-                        day=date_with_timezone.format('dddd'),
-                        start_time=avail_start,
-                        end_time=avail_end
-                    ))
+                    # [(08:30, 23:30)]
+                    # [(10:30, 22:30)]
+                    available_slots.append(Slot(bounds.date, avail_start, avail_end))
         return available_slots
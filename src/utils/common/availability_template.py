@@ -0,0 +1,98 @@
+from datetime import date, time
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from django.conf import settings
+from django.core.cache import cache
+from django.contrib.postgres.aggregates import StringAgg
+from django.db.models import Count, TextField, Value
+from django.db.models.functions import MD5, Cast, Concat
+
+from utils.common.availability_engine import Interval, merge_intervals, time_to_minute
+
+WEEKDAYS = ["MONDAY", "TUESDAY", "WEDNESDAY", "THURSDAY", "FRIDAY", "SATURDAY", "SUNDAY"]
+WEEKDAY_INDEX = {day: index for index, day in enumerate(WEEKDAYS)}
+
+# Fields of an availability row hashed into the version stamp
+VERSION_FIELDS = ("pk", "day", "date", "opening_time", "closing_time")
+
+
+class AvailabilityTemplate:
+    """
+    Opening windows compiled from availability rows: one merged window list per weekday plus
+    the windows added on specific dates, indexed by (month, day) because date rows recur every year.
+    Expanding a date range is one lookup per date.
+    """
+    __slots__ = ("weekdays", "overrides", "version", "_combined")
+
+    def __init__(self, weekdays: List[List[Interval]], overrides: Dict[Tuple[int, int], List[Interval]],
+                 version=None):
+        self.weekdays = [merge_intervals(windows) for windows in weekdays]
+        self.overrides = {key: merge_intervals(windows) for key, windows in overrides.items()}
+        self.version = version
+        self._combined = {}
+
+    @classmethod
+    def from_rows(cls, rows: Iterable[Tuple[Optional[str], Optional[date], time, time]],
+                  version=None) -> "AvailabilityTemplate":
+        """Compile (day, date, opening_time, closing_time) rows, a row has a weekday name, a date or both."""
+        weekdays = [[] for _ in WEEKDAYS]
+        overrides = {}
+        for day, on_date, opening, closing in rows:
+            window = (time_to_minute(opening), time_to_minute(closing))
+            if day and day.upper() in WEEKDAY_INDEX:
+                weekdays[WEEKDAY_INDEX[day.upper()]].append(window)
+            if on_date:
+                overrides.setdefault((on_date.month, on_date.day), []).append(window)
+        return cls(weekdays, overrides, version)
+
+    @classmethod
+    def for_queryset(cls, key: str, availability_slots) -> "AvailabilityTemplate":
+        """
+        Compile the availability rows of a queryset once and keep the template in the cache under key.
+        A version stamp of the rows (their count and a hash of their contents) is read on every call and
+        the template is rebuilt when it changes, edits of a row in place included.
+        """
+        version = cls.version_stamp(availability_slots)
+        cache_key = f"availability_template:{key}"
+        template = cache.get(cache_key)
+        if template is None or template.version != version:
+            template = cls.from_rows(
+                availability_slots.values_list("day", "date", "opening_time", "closing_time"), version
+            )
+            cache.set(cache_key, template, getattr(settings, "AVAILABILITY_CACHE_TIMEOUT", 900))
+        return template
+
+    @staticmethod
+    def version_stamp(availability_slots) -> tuple:
+        """(count, md5 of the rows in pk order), computed by the database in one query."""
+        row = []
+        for name in VERSION_FIELDS:
+            row += [Cast(name, output_field=TextField()), Value("|")]
+        stamp = availability_slots.order_by().aggregate(
+            count=Count("pk"),
+            digest=MD5(StringAgg(Concat(*row[:-1], output_field=TextField()), delimiter=";", ordering="pk")),
+        )
+        return stamp["count"], stamp["digest"]
+
+    def __bool__(self):
+        return any(self.weekdays) or bool(self.overrides)
+
+    def windows(self, day: date) -> List[Interval]:
+        """Merged opening windows of a date."""
+        override = (day.month, day.day)
+        if override not in self.overrides:
+            return self.weekdays[day.weekday()]
+        key = (day.weekday(), override)
+        if key not in self._combined:
+            self._combined[key] = merge_intervals(self.weekdays[day.weekday()] + self.overrides[override])
+        return self._combined[key]
+
+    def expand(self, dates: Iterable[date]) -> List[List[Interval]]:
+        return [self.windows(day) for day in dates]
+
+    def __getstate__(self):
+        return self.weekdays, self.overrides, self.version
+
+    def __setstate__(self, state):
+        self.weekdays, self.overrides, self.version = state
+        self._combined = {}
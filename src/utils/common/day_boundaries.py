@@ -0,0 +1,36 @@
+from datetime import date, datetime, time, timedelta, timezone as dt_timezone
+from functools import lru_cache
+from typing import NamedTuple
+from zoneinfo import ZoneInfo
+
+# Roughly 20 timezones over a year of dates
+DAY_BOUNDARIES_CACHE_SIZE = 8192
+
+
+class DayBoundaries(NamedTuple):
+    date: date
+    utc_start: datetime
+    utc_end: datetime
+    weekday: str
+    iso_date: str
+
+
+@lru_cache(maxsize=DAY_BOUNDARIES_CACHE_SIZE)
+def day_boundaries(day: date, timezone: str) -> DayBoundaries:
+    """
+    Resolve a local date once per (date, timezone) pair.
+
+    utc_start is the first instant of the day in the timezone and utc_end the first instant of the next one,
+    both in UTC. Days that gain or lose an hour to DST are 25 or 23 hours long, and a midnight skipped by
+    DST resolves to the first instant that exists on the local clock.
+    """
+    tz = ZoneInfo(timezone)
+    utc_start = datetime.combine(day, time.min, tzinfo=tz).astimezone(dt_timezone.utc)
+    utc_end = datetime.combine(day + timedelta(days=1), time.min, tzinfo=tz).astimezone(dt_timezone.utc)
+    return DayBoundaries(
+        date=day,
+        utc_start=utc_start,
+        utc_end=utc_end,
+        weekday=day.strftime("%A"),
+        iso_date=day.isoformat(),
+    )
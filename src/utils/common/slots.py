@@ -0,0 +1,129 @@
+from array import array
+from bisect import bisect_right
+from collections.abc import Sequence
+from datetime import date, time
+from itertools import accumulate
+from typing import Iterable, Iterator, List, Union
+
+from utils.common.availability_engine import Interval, minute_to_time
+from utils.common.day_boundaries import day_boundaries
+
+
+class Slot:
+    """
+    One free slot as a date and two minute offsets.
+    The day name and the start/end times are derived on access, so building a slot allocates nothing else.
+    Slots can be read like the dicts they replace: slot["start_time"] and dict(**slot) both work.
+    """
+    __slots__ = ("date", "start", "end")
+
+    FIELDS = ("date", "day", "start_time", "end_time")
+
+    def __init__(self, date: date, start: int, end: int):
+        self.date = date
+        self.start = start
+        self.end = end
+
+    @property
+    def day(self) -> str:
+        return day_boundaries(self.date, "UTC").weekday
+
+    @property
+    def start_time(self) -> time:
+        return minute_to_time(self.start)
+
+    @property
+    def end_time(self) -> time:
+        return minute_to_time(self.end)
+
+    def keys(self):
+        return self.FIELDS
+
+    def __getitem__(self, key: str):
+        if key not in self.FIELDS:
+            raise KeyError(key)
+        return getattr(self, key)
+
+    def as_dict(self) -> dict:
+        return {key: getattr(self, key) for key in self.FIELDS}
+
+    def __eq__(self, other):
+        if not isinstance(other, Slot):
+            return NotImplemented
+        return (self.date, self.start, self.end) == (other.date, other.start, other.end)
+
+    def __hash__(self):
+        return hash((self.date, self.start, self.end))
+
+    def __repr__(self):
+        return f"Slot({self.date.isoformat()}, {self.start_time}-{self.end_time})"
+
+
+class DaySlots(Sequence):
+    """The slots of one day, stored as flat start/end minute pairs in an array('i')."""
+    __slots__ = ("date", "minutes")
+
+    def __init__(self, date: date, intervals: Iterable[Interval] = ()):
+        self.date = date
+        self.minutes = array("i")
+        for start, end in intervals:
+            self.minutes.append(start)
+            self.minutes.append(end)
+
+    def append(self, start: int, end: int) -> None:
+        self.minutes.append(start)
+        self.minutes.append(end)
+
+    def __len__(self) -> int:
+        return len(self.minutes) // 2
+
+    def __getitem__(self, index: int) -> Slot:
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("slot index out of range")
+        return Slot(self.date, self.minutes[2 * index], self.minutes[2 * index + 1])
+
+    def __iter__(self) -> Iterator[Slot]:
+        minutes = self.minutes
+        for index in range(0, len(minutes), 2):
+            yield Slot(self.date, minutes[index], minutes[index + 1])
+
+
+class SlotList(Sequence):
+    """
+    Read-only, flat view over the slots of several days.
+    Slot objects are only created while iterating or indexing, the days keep nothing but their minute arrays.
+    """
+
+    def __init__(self, days: Iterable[DaySlots] = ()):
+        self.days = [day for day in days if len(day)]
+        self._offsets = list(accumulate(len(day) for day in self.days))
+
+    def __len__(self) -> int:
+        return self._offsets[-1] if self._offsets else 0
+
+    def __getitem__(self, index: Union[int, slice]) -> Union[Slot, List[Slot]]:
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("slot index out of range")
+        day_index = bisect_right(self._offsets, index)
+        day_offset = self._offsets[day_index - 1] if day_index else 0
+        return self.days[day_index][index - day_offset]
+
+    def __iter__(self) -> Iterator[Slot]:
+        for day in self.days:
+            yield from day
+
+    def __eq__(self, other):
+        if not isinstance(other, Sequence):
+            return NotImplemented
+        return list(self) == list(other)
+
+    __hash__ = None
+
+    def __repr__(self):
+        return f"SlotList({list(self)!r})"
@@ -0,0 +1,304 @@
+import random
+from datetime import date, datetime, time, timedelta, timezone
+from types import SimpleNamespace
+from unittest import skipIf
+from django.core.cache import cache
+from django.db.models import DateField, F, Value
+from django.test import SimpleTestCase, TestCase
+
+from accounts.models import Account, User
+from benchmarks import availability as benchmark
+from bookings.models import Booking
+from courts.models import Court
+from utils.common import availability_engine as engine
+from utils.common import availability_kernel as kernel
+from utils.common.availability_template import AvailabilityTemplate
+from utils.common.day_boundaries import day_boundaries
+from utils.common.slots import DaySlots, Slot, SlotList
+
+
+Availability = benchmark.import_availability()
+
+
+class AvailabilityEngineTestCase(SimpleTestCase):
+
+    def test_time_conversion(self):
+        self.assertEqual(engine.time_to_minute(time(8, 30)), 510)
+        self.assertEqual(engine.time_to_minute(time(23, 59, 59)), engine.DAY_MINUTES)
+        self.assertEqual(engine.minute_to_time(510), time(8, 30))
+        self.assertEqual(engine.format_minute(510), "08:30:00")
+        self.assertEqual(engine.format_minute(engine.DAY_MINUTES), "23:59:59")
+
+    def test_merge_intervals(self):
+        merged = engine.merge_intervals([(600, 660), (480, 540), (540, 570), (650, 700), (900, 900)])
+        self.assertEqual(merged, [(480, 570), (600, 700)])
+
+    def test_free_intervals(self):
+        windows = engine.to_intervals([(time(8), time(12)), (time(12, 30), time(18))])
+        bookings = engine.to_intervals([(time(13), time(14)), (time(10), time(11))])
+
+        with self.subTest("No buffer"):
+            free = engine.free_intervals(windows, bookings)
+            self.assertEqual(free, [(480, 600), (660, 720), (750, 780), (840, 1080)])
+
+        with self.subTest("Buffer after bookings"):
+            free = engine.free_intervals(windows, bookings, buffer_minutes=10)
+            self.assertEqual(free, [(480, 600), (670, 720), (750, 780), (850, 1080)])
+
+    def test_booking_spanning_windows(self):
+        windows = [(480, 600), (660, 720), (780, 840)]
+        bookings = [(500, 700)]
+
+        free = engine.free_intervals(windows, bookings)
+        self.assertEqual(free, [(480, 500), (700, 720), (780, 840)])
+
+    def test_fully_booked(self):
+        windows = [(480, 600)]
+        bookings = [(0, engine.DAY_MINUTES)]
+
+        self.assertEqual(engine.free_intervals(windows, bookings), [])
+
+
+class DayBoundariesTestCase(SimpleTestCase):
+
+    def test_regular_day(self):
+        bounds = day_boundaries(date(2024, 6, 3), "America/New_York")
+        self.assertEqual(bounds.utc_start, datetime(2024, 6, 3, 4, tzinfo=timezone.utc))
+        self.assertEqual(bounds.utc_end, datetime(2024, 6, 4, 4, tzinfo=timezone.utc))
+        self.assertEqual(bounds.weekday, "Monday")
+        self.assertEqual(bounds.iso_date, "2024-06-03")
+
+    def test_dst_transition_days(self):
+        spring = day_boundaries(date(2024, 3, 31), "Europe/London")
+        self.assertEqual(spring.utc_end - spring.utc_start, timedelta(hours=23))
+        autumn = day_boundaries(date(2024, 10, 27), "Europe/London")
+        self.assertEqual(autumn.utc_end - autumn.utc_start, timedelta(hours=25))
+        self.assertEqual(day_boundaries(date(2024, 10, 28), "Europe/London").utc_start, autumn.utc_end)
+
+    def test_skipped_midnight(self):
+        # Santiago moves from 00:00 to 01:00 when DST starts
+        bounds = day_boundaries(date(2024, 9, 8), "America/Santiago")
+        self.assertEqual(bounds.utc_start, datetime(2024, 9, 8, 4, tzinfo=timezone.utc))
+        self.assertEqual(bounds.utc_end - bounds.utc_start, timedelta(hours=23))
+
+    def test_cached(self):
+        day_boundaries.cache_clear()
+        day_boundaries(date(2024, 6, 3), "UTC")
+        day_boundaries(date(2024, 6, 3), "UTC")
+        self.assertEqual(day_boundaries.cache_info().hits, 1)
+
+
+class SlotsTestCase(SimpleTestCase):
+
+    def test_slot(self):
+        slot = Slot(date(2024, 6, 3), 510, engine.DAY_MINUTES)
+
+        self.assertEqual((slot.day, slot.start_time, slot.end_time), ("Monday", time(8, 30), time(23, 59, 59)))
+        self.assertEqual(slot["start_time"], time(8, 30))
+        self.assertEqual(dict(**slot), slot.as_dict())
+        with self.assertRaises(KeyError):
+            slot["start"]
+
+    def test_slot_list(self):
+        first = DaySlots(date(2024, 6, 3), [(480, 600), (720, 960)])
+        second = DaySlots(date(2024, 6, 4))
+        second.append(540, 600)
+        slots = SlotList([first, DaySlots(date(2024, 6, 5)), second])
+
+        self.assertEqual(first.minutes.typecode, "i")
+        self.assertEqual(len(slots), 3)
+        self.assertEqual(slots[2], Slot(date(2024, 6, 4), 540, 600))
+        self.assertEqual(slots[-3], Slot(date(2024, 6, 3), 480, 600))
+        self.assertEqual(slots[1:], [Slot(date(2024, 6, 3), 720, 960), Slot(date(2024, 6, 4), 540, 600)])
+        self.assertEqual(slots, list(first) + list(second))
+        with self.assertRaises(IndexError):
+            slots[3]
+
+
+class AvailabilityTemplateTestCase(TestCase):
+
+    def test_expand(self):
+        template = AvailabilityTemplate.from_rows([
+            ("MONDAY", None, time(8), time(12)),
+            ("MONDAY", None, time(11), time(14)),
+            ("TUESDAY", None, time(9), time(17)),
+            ("HOLIDAY", None, time(9), time(17)),
+            (None, date(2020, 6, 4), time(18), time(20)),
+        ])
+
+        windows = template.expand([date(2024, 6, 3) + timedelta(days=i) for i in range(3)])
+
+        self.assertEqual(windows, [[(480, 840)], [(540, 1020), (1080, 1200)], []])
+        self.assertEqual(template.windows(date(2024, 6, 10)), [(480, 840)])
+        self.assertFalse(AvailabilityTemplate.from_rows([]))
+
+    def test_version_stamp(self):
+        Court.objects.create(name="MONDAY", location="Test location", open=time(8), close=time(16))
+        rows = Court.objects.annotate(day=F("name"), date=Value(None, output_field=DateField()),
+                                      opening_time=F("open"), closing_time=F("close"))
+        stamp = AvailabilityTemplate.version_stamp(rows)
+
+        with self.assertNumQueries(1):
+            self.assertEqual(AvailabilityTemplate.version_stamp(rows), stamp)
+
+        with self.subTest("Edited in place"):
+            Court.objects.update(open=time(9))
+            self.assertNotEqual(AvailabilityTemplate.version_stamp(rows), stamp)
+
+        with self.subTest("Template rebuilt"):
+            cache.clear()
+            self.assertEqual(AvailabilityTemplate.for_queryset("test", rows).windows(date(2024, 6, 3)), [(540, 960)])
+            Court.objects.update(close=time(17))
+            self.assertEqual(AvailabilityTemplate.for_queryset("test", rows).windows(date(2024, 6, 3)), [(540, 1020)])
+
+
+class AvailabilityBenchmarkTestCase(SimpleTestCase):
+
+    def test_synthetic_schedule(self):
+        schedule = benchmark.synthetic_schedule(seed=1, courts=2, days=14, pattern="fragmented", density=0.5)
+
+        self.assertEqual(len(schedule.dates), 14)
+        self.assertEqual(sorted(schedule.bookings), [0, 1])
+        self.assertEqual({row.day for row in schedule.availability}, set(benchmark.WEEKDAYS))
+        for start_time, end_time in schedule.bookings[0]:
+            self.assertEqual(end_time - start_time, timedelta(minutes=30))
+            self.assertTrue(any(opening <= start_time.time() and end_time.time() <= closing
+                                for opening, closing in schedule.windows(start_time.date())))
+
+        # The range crosses the spring DST change
+        self.assertEqual({start_time.utcoffset() for start_time, _ in schedule.bookings[0]},
+                         {timedelta(0), timedelta(hours=1)})
+        self.assertEqual(schedule.bookings,
+                         benchmark.synthetic_schedule(seed=1, courts=2, days=14, pattern="fragmented",
+                                                      density=0.5).bookings)
+
+    def test_run_benchmarks(self):
+        results = benchmark.run_benchmarks(["small"], repeat=1)
+
+        self.assertIn("day_sweep/small/fragmented-0.8", results)
+        self.assertIn("range_sweep/small/fragmented-0.8", results)
+        for entry_point in ["get_availability_slots", "days_available", "free_slot_availability"]:
+            self.assertIn(f"{entry_point}/small/fragmented-0.8", results)
+        self.assertEqual(results["day_sweep/small/fragmented-0.8"]["court_days"], 14)
+
+    def test_compare(self):
+        baseline = {"a": {"median_ms": 10.0}, "b": {"median_ms": 10.0}}
+        results = {"a": {"median_ms": 12.0}, "b": {"median_ms": 13.0}, "c": {"median_ms": 99.0}}
+
+        regressions = benchmark.compare(results, baseline, tolerance=0.25)
+
+        self.assertEqual(len(regressions), 1)
+        self.assertTrue(regressions[0].startswith("b:"))
+
+
+@skipIf(kernel.np is None, "numpy is not installed")
+class AvailabilityKernelTestCase(SimpleTestCase):
+
+    def random_intervals(self, rng, count):
+        return engine.merge_intervals(
+            (start, min(start + rng.randint(15, 240), engine.DAY_MINUTES))
+            for start in (rng.randint(0, engine.DAY_MINUTES - 15) for _ in range(count))
+        )
+
+    def test_matches_sweep(self):
+        rng = random.Random(7)
+        windows = [self.random_intervals(rng, rng.randint(0, 4)) for _ in range(365)]
+        bookings = [self.random_intervals(rng, rng.randint(0, 12)) for _ in range(365)]
+
+        for buffer_minutes in (0, 10):
+            with self.subTest(buffer_minutes=buffer_minutes):
+                expected = [engine.free_intervals(day_windows, day_bookings, buffer_minutes)
+                            for day_windows, day_bookings in zip(windows, bookings)]
+                self.assertEqual(kernel.free_intervals_by_day(windows, bookings, buffer_minutes), expected)
+
+    def test_threshold(self):
+        with self.settings(AVAILABILITY_NUMPY_MIN_DAYS=90):
+            self.assertFalse(kernel.use_numpy_kernel(31))
+            self.assertTrue(kernel.use_numpy_kernel(90))
+        with self.settings(AVAILABILITY_NUMPY_MIN_DAYS=None):
+            self.assertFalse(kernel.use_numpy_kernel(365))
+
+
+class BulkDaysAvailableTestCase(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(email="test@email.com",
+                                            password="Test_password1")
+        cls.account = Account.objects.create(user=cls.user,
+                                             first_name="first",
+                                             last_name="last")
+        cls.court = Court.objects.create(name="Test court",
+                                         location="Test location",
+                                         open=time(8, 0),
+                                         close=time(16, 0))
+
+        cls.dates = [date(2030, 1, 1) + timedelta(days=i) for i in range(31)]
+        Booking.objects.bulk_create(
+            Booking(court=cls.court,
+                    account=cls.account,
+                    start_time=datetime.combine(day, time(10), timezone.utc),
+                    end_time=datetime.combine(day, time(12), timezone.utc),
+                    duration=2)
+            for day in cls.dates
+        )
+
+        weekdays = ["MONDAY", "TUESDAY", "WEDNESDAY", "THURSDAY", "FRIDAY", "SATURDAY", "SUNDAY"]
+        cls.availability = [SimpleNamespace(day=day, date=None, opening_time=time(8), closing_time=time(16))
+                            for day in weekdays]
+        # The availability model lives outside this project, courts named after the weekdays stand in for its
+        # rows so the availability query is a real one
+        Court.objects.bulk_create(Court(name=day, location="Availability", open=time(8), close=time(16))
+                                  for day in weekdays)
+        cls.availability_rows = Court.objects.filter(location="Availability").annotate(
+            day=F("name"), date=Value(None, output_field=DateField()),
+            opening_time=F("open"), closing_time=F("close")
+        )
+
+    def test_constant_queries(self):
+        # One query for the availability rows and one for the bookings, however long the range
+        with self.assertNumQueries(2):
+            slots = Availability.days_available(self.dates,
+                                                Booking.objects.filter(court=self.court),
+                                                self.availability_rows,
+                                                "UTC",
+                                                0,
+                                                bulk=True)
+
+        self.assertEqual(len(slots), 62)
+        self.assertEqual(slots[0]["date"], self.dates[0])
+        self.assertEqual(slots[0]["start_time"], time(8))
+        self.assertEqual(slots[0]["end_time"], time(10))
+        self.assertEqual(slots[1]["start_time"], time(12))
+        self.assertEqual(slots[1]["end_time"], time(16))
+
+    def test_bookings_bucketed_on_the_local_day(self):
+        # 23:00 to midnight UTC is 08:00 to 09:00 of the next day in Tokyo
+        Booking.objects.create(court=self.court,
+                               account=self.account,
+                               start_time=datetime.combine(self.dates[0], time(23), timezone.utc),
+                               end_time=datetime.combine(self.dates[1], time(0), timezone.utc),
+                               duration=1)
+
+        slots = Availability.days_available(self.dates[:2], Booking.objects.filter(court=self.court),
+                                            self.availability, "Asia/Tokyo", 0, bulk=True)
+
+        self.assertEqual([(slot["date"], slot["start_time"], slot["end_time"]) for slot in slots],
+                         [(self.dates[0], time(8), time(16)), (self.dates[1], time(9), time(16))])
+
+    def test_date_override(self):
+        availability = self.availability + [
+            SimpleNamespace(day=None, date=date(2020, 1, 2), opening_time=time(18), closing_time=time(20))
+        ]
+
+        slots = Availability.days_available(self.dates[:2], [], availability, "UTC", 0, bulk=True)
+
+        self.assertEqual([(slot["start_time"], slot["end_time"]) for slot in slots],
+                         [(time(8), time(16)), (time(8), time(16)), (time(18), time(20))])
+
+    def test_template(self):
+        template = Availability.availability_template(self.availability)
+        bookings = Booking.objects.filter(court=self.court)
+
+        self.assertEqual(Availability.days_available(self.dates, bookings, template, "UTC", 0, bulk=True),
+                         Availability.days_available(self.dates, bookings, self.availability, "UTC", 0, bulk=True))